@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Load time and file size of the bulk exports: api/all.json vs api/columnar/all.parquet / all.arrow
+
+Run from the repository root after generate_api.py:
+    python benchmarks/bench_columnar.py [--repeat 3]
+"""
+
+import argparse
+import json
+import time
+import pandas as pd
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+def best_time(load, repeat):
+    """Best wall time of repeat calls, and the number of rows loaded"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = len(load())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, rows
+
+
+def load_json(path):
+    with open(path) as f:
+        return pd.DataFrame(json.load(f))
+
+
+def load_parquet(path):
+    return pd.read_parquet(path)
+
+
+def load_arrow(path):
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def load_parquet_filtered(path):
+    """One river only: row groups whose river_id statistics exclude it are skipped"""
+    first = pq.ParquetFile(path).read_row_group(0, columns=['river_id']).column(0)[0].as_py()
+    return pd.read_parquet(path, filters=[('river_id', '==', first)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare load time and size of the bulk exports')
+    parser.add_argument('--api-dir', default='api', help='generated API directory (default: api)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per format, best time kept (default: 3)')
+    args = parser.parse_args()
+
+    api_dir = Path(args.api_dir)
+    cases = [
+        ('all.json', api_dir / 'all.json', load_json),
+        ('all.parquet', api_dir / 'columnar' / 'all.parquet', load_parquet),
+        ('all.arrow', api_dir / 'columnar' / 'all.arrow', load_arrow),
+        ('all.parquet (1 river)', api_dir / 'columnar' / 'all.parquet', load_parquet_filtered),
+    ]
+
+    print(f"{'format':24} {'size MB':>10} {'load s':>10} {'rows':>10}")
+    for name, path, load in cases:
+        if not path.exists():
+            print(f"{name:24} {'missing':>10}")
+            continue
+        elapsed, rows = best_time(lambda: load(path), args.repeat)
+        print(f"{name:24} {path.stat().st_size / 1e6:10.2f} {elapsed:10.3f} {rows:10}")
+
+
+if __name__ == '__main__':
+    main()
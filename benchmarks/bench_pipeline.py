@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Pipeline scaling benchmark: validate -> build -> generate_api on synthetic datasets
+
+For each size, generates a dataset with benchmarks/synthetic.py in a temporary
+directory and runs the three scripts there as child processes, like a maintainer
+would (the parse cache in data/.cache is created by validate.py and reused by the
+next stages). Each stage is timed (wall and CPU) and its peak resident memory and
+output size (bedload_transport.db, api/) recorded. Results are printed and written
+as JSON with the platform and git revision, so runs can be compared over time.
+    python benchmarks/bench_pipeline.py [--sizes 1e3,1e4,1e5,1e6] [--output bench_pipeline.json]
+    python benchmarks/bench_pipeline.py --sizes 1e7 --rivers 500 --validate-args "--stream"
+"""
+
+import argparse
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from synthetic import SyntheticDataset
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+SCRIPTS_DIR = REPO_DIR / 'scripts'
+
+# Stage name -> (script, output path relative to the working directory)
+STAGES = {
+    'validate': ('validate.py', None),
+    'build': ('build_database.py', 'bedload_transport.db'),
+    'api': ('generate_api.py', 'api'),
+}
+
+
+def tree_size(path):
+    """(bytes, files) of a file or of every file under a directory"""
+    if path.is_file():
+        return path.stat().st_size, 1
+    sizes = [p.stat().st_size for p in path.rglob('*') if p.is_file()]
+    return sum(sizes), len(sizes)
+
+
+def rss_mb(rusage):
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return rusage.ru_maxrss / 1024 / 1024 if sys.platform == 'darwin' else rusage.ru_maxrss / 1024
+
+
+def run_stage(stage, work_dir, extra_args, log):
+    """Run one stage in work_dir; returns its measurements (wall, CPU, peak RSS, output)"""
+    script, output = STAGES[stage]
+    command = [sys.executable, str(SCRIPTS_DIR / script)] + extra_args
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+    # wait4 gives the resource usage of this child alone (RUSAGE_CHILDREN accumulates)
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    result = {
+        'stage': stage,
+        'command': ' '.join([script] + extra_args),
+        'returncode': process.returncode,
+        'seconds': round(time.perf_counter() - start, 3),
+        'cpu_seconds': round(rusage.ru_utime + rusage.ru_stime, 3),
+        'peak_rss_mb': round(rss_mb(rusage), 1),
+    }
+    if output and (work_dir / output).exists():
+        result['output_bytes'], result['output_files'] = tree_size(work_dir / output)
+    return result
+
+
+def run_size(n_measurements, args, stage_args):
+    """Generate one dataset and run the stages on it; returns the run record"""
+    with tempfile.TemporaryDirectory(dir=args.tmp_dir) as tmp:
+        work_dir = Path(tmp)
+        dataset = SyntheticDataset(n_measurements, args.rivers, args.sections_per_river,
+                                   args.campaigns_per_section, args.seed)
+        start = time.perf_counter()
+        counts = dataset.write(work_dir / 'data')
+        run = {
+            'measurements': n_measurements,
+            'rows': counts,
+            'generate_seconds': round(time.perf_counter() - start, 3),
+            'input_bytes': tree_size(work_dir / 'data')[0],
+            'stages': [],
+        }
+        with open(work_dir / 'pipeline.log', 'w') as log:
+            for stage in args.stages:
+                result = run_stage(stage, work_dir, stage_args[stage], log)
+                run['stages'].append(result)
+                if result['returncode'] != 0:
+                    log.flush()
+                    tail = (work_dir / 'pipeline.log').read_text(errors='replace').splitlines()[-15:]
+                    print(f"❌ {stage} failed on {n_measurements:,} measurements:\n   " + '\n   '.join(tail))
+                    break
+        return run
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_run(run):
+    print(f"\n{run['measurements']:,} measurements "
+          f"({run['input_bytes'] / 1e6:,.1f} MB of CSV, generated in {run['generate_seconds']:.1f} s)")
+    for result in run['stages']:
+        output = f"{result['output_bytes'] / 1e6:10,.1f} MB" if 'output_bytes' in result else ' ' * 13
+        rate = run['measurements'] / result['seconds'] if result['seconds'] else 0
+        print(f"  {result['stage']:10} {result['seconds']:9.2f} s  cpu {result['cpu_seconds']:9.2f} s  "
+              f"rss {result['peak_rss_mb']:8,.0f} MB  {output}  {rate:12,.0f} rows/s"
+              + ('' if result['returncode'] == 0 else f"  (exit {result['returncode']})"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time validate / build / generate_api on synthetic datasets')
+    parser.add_argument('--sizes', default='1e3,1e4,1e5',
+                        help='comma-separated numbers of measurements (default: 1e3,1e4,1e5)')
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help=f"comma-separated stages to run, in order (default: {','.join(STAGES)})")
+    parser.add_argument('--rivers', type=int, default=50, help='number of rivers (default: 50)')
+    parser.add_argument('--sections-per-river', type=int, default=4, help='sections per river (default: 4)')
+    parser.add_argument('--campaigns-per-section', type=int, default=10, help='campaigns per section (default: 10)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the generator (default: 0)')
+    for stage, (script, _) in STAGES.items():
+        parser.add_argument(f'--{stage}-args', default='', help=f'extra arguments of {script}, quoted')
+    parser.add_argument('--tmp-dir', help='where the temporary datasets are created (default: system temp)')
+    parser.add_argument('--output', default='bench_pipeline.json',
+                        help='JSON results file (default: bench_pipeline.json)')
+    args = parser.parse_args()
+
+    args.stages = args.stages.split(',')
+    unknown = [stage for stage in args.stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s) {unknown}, choose from {list(STAGES)}")
+    stage_args = {stage: shlex.split(getattr(args, f'{stage}_args')) for stage in STAGES}
+
+    results = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'parameters': {'rivers': args.rivers, 'sections_per_river': args.sections_per_river,
+                       'campaigns_per_section': args.campaigns_per_section, 'seed': args.seed,
+                       'stage_args': stage_args},
+        'runs': [],
+    }
+    for size in args.sizes.split(','):
+        run = run_size(int(float(size)), args, stage_args)
+        results['runs'].append(run)
+        print_run(run)
+        # Rewritten after every size, so a long run that is interrupted keeps its results
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Dashboard-style query load through scripts/queries.py
+
+Builds a database from the CSVs in a temporary directory, then replays a fixed mix of
+queries (each section, each method, the flux-discharge pairs of each river) many
+times from several threads: first with a fresh connection per query and no cache,
+then through a QueryLibrary (connection pool + LRU cache).
+    python benchmarks/bench_queries.py [--data-dir data] [--rounds 20] [--threads 4]
+"""
+
+import argparse
+import contextlib
+import io
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+from build_database import DatabaseBuilder  # noqa: E402
+from queries import QueryLibrary  # noqa: E402
+
+
+def query_mix(db_path):
+    """[(method name, kwargs)] covering every section, method and river once"""
+    conn = sqlite3.connect(db_path)
+    sections = [row[0] for row in conn.execute('SELECT section_id FROM sections')]
+    methods = [row[0] for row in conn.execute('SELECT DISTINCT measurement_method FROM measurements')]
+    rivers = [row[0] for row in conn.execute('SELECT river_id FROM rivers')]
+    conn.close()
+    return ([('measurements_by_section', {'section_id': s}) for s in sections]
+            + [('measurements_by_method', {'method': m}) for m in methods]
+            + [('flux_discharge_pairs', {'river_id': r}) for r in rivers])
+
+
+def replay(make_library, mix, rounds, threads):
+    """Queries per second running the mix rounds times over threads workers"""
+    def run(_):
+        library = make_library()
+        for name, kwargs in mix:
+            getattr(library, name)(**kwargs)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(run, range(rounds)))
+    return rounds * len(mix) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare uncached and pooled + cached dashboard queries')
+    parser.add_argument('--data-dir', default='data', help='directory with the four CSVs (default: data)')
+    parser.add_argument('--rounds', type=int, default=20, help='repetitions of the query mix (default: 20)')
+    parser.add_argument('--threads', type=int, default=4, help='concurrent workers (default: 4)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'bench.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            DatabaseBuilder(db_path).build(args.data_dir)
+        mix = query_mix(db_path)
+
+        # Baseline: a new library per round, no cache, so every query opens a connection
+        uncached = replay(lambda: QueryLibrary(db_path, cache_size=0), mix, args.rounds, args.threads)
+        shared = QueryLibrary(db_path)
+        cached = replay(lambda: shared, mix, args.rounds, args.threads)
+
+        print(f"{len(mix)} queries x {args.rounds} rounds, {args.threads} threads")
+        print(f"{'uncached':10} {uncached:12,.0f} queries/s")
+        print(f"{'cached':10} {cached:12,.0f} queries/s ({cached / uncached:.0f}x)  {shared.cache_info()}")
+        shared.close()
+
+
+if __name__ == '__main__':
+    main()
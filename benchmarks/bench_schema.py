@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Query times of the standard and optimized (--schema optimized) database schemas
+
+Builds both databases from the same CSVs in a temporary directory and times the
+common queries on each: a section over a date range, a method over a date range,
+the per-country summary and the full four-way join.
+    python benchmarks/bench_schema.py [--data-dir data] [--repeat 20]
+"""
+
+import argparse
+import contextlib
+import io
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+from build_database import DatabaseBuilder  # noqa: E402
+
+STANDARD_JOIN = '''
+    measurements m
+    JOIN campaigns c ON c.campaign_id = m.campaign_id
+    JOIN sections s ON s.section_id = c.section_id
+    JOIN rivers r ON r.river_id = s.river_id
+'''
+
+# name -> (standard SQL, optimized SQL); ? parameters are filled by query_parameters()
+QUERIES = {
+    'section + date range': (
+        '''SELECT c.campaign_date, m.bedload_rate_total_kg_s, m.discharge_m3_s
+           FROM campaigns c JOIN measurements m ON m.campaign_id = c.campaign_id
+           WHERE c.section_id = ? AND c.campaign_date BETWEEN ? AND ?''',
+        '''SELECT campaign_date, bedload_rate_total_kg_s, discharge_m3_s
+           FROM measurements_full
+           WHERE section_id = ? AND campaign_date BETWEEN ? AND ?''',
+    ),
+    'method + date range': (
+        '''SELECT COUNT(*), AVG(m.bedload_rate_total_kg_s)
+           FROM measurements m JOIN campaigns c ON c.campaign_id = m.campaign_id
+           WHERE m.measurement_method = ? AND c.campaign_date BETWEEN ? AND ?''',
+        '''SELECT COUNT(*), AVG(bedload_rate_total_kg_s)
+           FROM measurements_full
+           WHERE measurement_method = ? AND campaign_date BETWEEN ? AND ?''',
+    ),
+    'summary by country': (
+        f'''SELECT r.country, COUNT(*), AVG(m.bedload_rate_total_kg_s), COUNT(DISTINCT r.river_id)
+            FROM {STANDARD_JOIN} GROUP BY r.country''',
+        '''SELECT country, COUNT(*), AVG(bedload_rate_total_kg_s), COUNT(DISTINCT river_id)
+           FROM measurements_full GROUP BY country''',
+    ),
+    'full join': (
+        f'SELECT * FROM {STANDARD_JOIN}',
+        'SELECT * FROM measurements_full',
+    ),
+}
+
+
+def build(db_path, data_dir, schema):
+    with contextlib.redirect_stdout(io.StringIO()):
+        DatabaseBuilder(db_path, schema=schema).build(data_dir)
+    return sqlite3.connect(db_path)
+
+
+def query_parameters(conn):
+    """Busiest section and method, and the middle half of the campaign dates"""
+    section = conn.execute('''SELECT c.section_id FROM campaigns c JOIN measurements m USING (campaign_id)
+                              GROUP BY c.section_id ORDER BY COUNT(*) DESC LIMIT 1''').fetchone()[0]
+    method = conn.execute('''SELECT measurement_method FROM measurements
+                             GROUP BY measurement_method ORDER BY COUNT(*) DESC LIMIT 1''').fetchone()[0]
+    dates = [row[0] for row in conn.execute('SELECT campaign_date FROM campaigns ORDER BY campaign_date')]
+    start, end = dates[len(dates) // 4], dates[3 * len(dates) // 4]
+    return {
+        'section + date range': [section, start, end],
+        'method + date range': [method, start, end],
+    }
+
+
+def as_int_date(value):
+    return int(value.replace('-', '')) if isinstance(value, str) and len(value) == 10 and value[4] == '-' else value
+
+
+def best_time(conn, sql, params, repeat):
+    best, rows = None, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = len(conn.execute(sql, params).fetchall())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare query times of the standard and optimized schemas')
+    parser.add_argument('--data-dir', default='data', help='directory with the four CSVs (default: data)')
+    parser.add_argument('--repeat', type=int, default=20, help='runs per query, best time kept (default: 20)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        standard = build(str(Path(tmp) / 'standard.db'), args.data_dir, 'standard')
+        optimized = build(str(Path(tmp) / 'optimized.db'), args.data_dir, 'optimized')
+        parameters = query_parameters(standard)
+
+        for name in ['standard', 'optimized']:
+            print(f"{name:10} database: {(Path(tmp) / f'{name}.db').stat().st_size / 1e6:.1f} MB")
+        print(f"\n{'query':22} {'standard ms':>12} {'optimized ms':>13} {'speedup':>8} {'rows':>8}")
+        for name, (standard_sql, optimized_sql) in QUERIES.items():
+            params = parameters.get(name, [])
+            standard_time, standard_rows = best_time(standard, standard_sql, params, args.repeat)
+            optimized_time, optimized_rows = best_time(optimized, optimized_sql,
+                                                       [as_int_date(p) for p in params], args.repeat)
+            assert standard_rows == optimized_rows, (name, standard_rows, optimized_rows)
+            print(f"{name:22} {standard_time * 1000:12.2f} {optimized_time * 1000:13.2f} "
+                  f"{standard_time / optimized_time:7.1f}x {optimized_rows:8}")
+        standard.close()
+        optimized.close()
+
+
+if __name__ == '__main__':
+    main()
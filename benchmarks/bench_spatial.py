@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Bounding-box and radius queries on sections: R*Tree (sections_rtree) vs plain scan
+
+Builds a throwaway database with the builder's schema and N random sections, then
+times the same random queries through scripts/spatial.py with and without the index:
+    python benchmarks/bench_spatial.py [--sections 200000] [--queries 200]
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+import spatial  # noqa: E402
+from build_database import DatabaseBuilder  # noqa: E402
+
+
+def build_database(db_path, n_sections, rng):
+    """Database with n_sections random sections (land-ish latitudes) and their river"""
+    builder = DatabaseBuilder(db_path)
+    builder.conn = sqlite3.connect(db_path)
+    builder.apply_load_pragmas()
+    builder.create_schema()
+    builder.conn.execute("INSERT INTO rivers (river_id, river_name, country) VALUES ('R', 'River', 'FRA')")
+    latitudes = rng.uniform(-60, 75, n_sections)
+    longitudes = rng.uniform(-180, 180, n_sections)
+    builder.conn.executemany(
+        'INSERT INTO sections (section_id, river_id, section_name, latitude, longitude) VALUES (?, ?, ?, ?, ?)',
+        ((f'S{i:07d}', 'R', f'Section {i}', lat, lon)
+         for i, (lat, lon) in enumerate(zip(latitudes.tolist(), longitudes.tolist())))
+    )
+    builder.create_indexes()
+    builder.conn.commit()
+    return builder.conn
+
+
+def time_queries(queries, run):
+    """Total time of run(query) over all queries, and the number of sections returned"""
+    start = time.perf_counter()
+    hits = sum(len(run(query)) for query in queries)
+    return time.perf_counter() - start, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare R*Tree and full-scan spatial queries on sections')
+    parser.add_argument('--sections', type=int, default=200000, help='number of sections (default: 200000)')
+    parser.add_argument('--queries', type=int, default=200, help='queries per case (default: 200)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_database(str(Path(tmp) / 'bench.db'), args.sections, rng)
+
+        # Boxes of about 2 x 2 degrees (a large catchment) and 50 km radii
+        centers = list(zip(rng.uniform(-55, 70, args.queries).tolist(), rng.uniform(-175, 175, args.queries).tolist()))
+        boxes = [(lat - 1, lon - 1, lat + 1, lon + 1) for lat, lon in centers]
+        cases = [
+            ('bbox 2x2 deg', boxes, lambda box, index: spatial.sections_in_bbox(conn, *box, use_index=index)),
+            ('radius 50 km', centers,
+             lambda point, index: spatial.sections_within_radius(conn, *point, 50, use_index=index)),
+        ]
+
+        print(f"{args.sections} sections, {args.queries} queries per case")
+        print(f"{'query':16} {'scan ms/q':>10} {'rtree ms/q':>11} {'speedup':>8} {'hits':>8}")
+        for name, queries, run in cases:
+            scan_time, scan_hits = time_queries(queries, lambda q: run(q, False))
+            rtree_time, rtree_hits = time_queries(queries, lambda q: run(q, True))
+            assert scan_hits == rtree_hits, (scan_hits, rtree_hits)
+            print(f"{name:16} {scan_time / len(queries) * 1000:10.2f} {rtree_time / len(queries) * 1000:11.2f} "
+                  f"{scan_time / rtree_time:7.1f}x {rtree_hits:8}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Load test of the local API server (scripts/serve_api.py): requests/s and latency
+
+Without --url, builds a database from the CSVs in a temporary directory and starts
+the server on a free port; then keeps --concurrency keep-alive connections busy with
+a mix of endpoints (tables, pages, shards, summaries) and reports throughput and
+p50 / p99 latency. --conditional replays each request with the ETag it got, to
+measure the 304 Not Modified path.
+    python benchmarks/load_test.py [--requests 5000] [--concurrency 32] [--conditional]
+    python benchmarks/load_test.py --url http://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / 'scripts'
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from build_database import DatabaseBuilder  # noqa: E402
+
+PATHS = [
+    '/api/rivers.json',
+    '/api/sections.json',
+    '/api/stats.json',
+    '/api/summary_by_river.json',
+    '/api/summary_by_method.json',
+    '/api/all.json?limit=100',
+    '/api/measurements.json?limit=500&fields=measurement_id,discharge_m3_s,bedload_rate_total_kg_s',
+    '/api/all.json?measurement_method=passive_acoustic&limit=200',
+]
+
+
+async def request(reader, writer, host, path, etag=None):
+    """(status, ETag) of one GET on a keep-alive connection"""
+    head = f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept-Encoding: gzip\r\n'
+    if etag:
+        head += f'If-None-Match: {etag}\r\n'
+    writer.write((head + '\r\n').encode('latin-1'))
+    await writer.drain()
+
+    lines = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    headers = {}
+    for line in lines[1:]:
+        field, _, value = line.partition(':')
+        if field:
+            headers[field.strip().lower()] = value.strip()
+    await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(lines[0].split(' ')[1]), headers.get('etag')
+
+
+async def worker(url, paths, n_requests, conditional, latencies, statuses):
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    etags = {}
+    try:
+        for i in range(n_requests):
+            path = paths[i % len(paths)]
+            start = time.perf_counter()
+            status, etag = await request(reader, writer, parts.netloc, path, etags.get(path) if conditional else None)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+            etags[path] = etag or etags.get(path)
+    finally:
+        writer.close()
+
+
+async def run(url, paths, n_requests, concurrency, conditional):
+    latencies, statuses = [], Counter()
+    per_worker = max(1, n_requests // concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(url, paths[i % len(paths):] + paths[:i % len(paths)], per_worker,
+                                  conditional, latencies, statuses)
+                           for i in range(concurrency)))
+    return time.perf_counter() - start, np.array(latencies), statuses
+
+
+@contextlib.contextmanager
+def local_server(data_dir):
+    """URL of a server started on a database built from data_dir, in a temporary directory"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'bench.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            DatabaseBuilder(db_path).build(data_dir)
+        process = subprocess.Popen([sys.executable, str(SCRIPTS_DIR / 'serve_api.py'), '--db', db_path, '--port', '0'],
+                                   stdout=subprocess.PIPE, text=True)
+        try:
+            line = process.stdout.readline()  # "Serving ... on http://host:port/api/index.json"
+            yield line.split(' on ')[1].split('/api/')[0]
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of scripts/serve_api.py')
+    parser.add_argument('--url', help='running server (default: start one on --data-dir)')
+    parser.add_argument('--data-dir', default='data', help='directory with the four CSVs (default: data)')
+    parser.add_argument('--requests', type=int, default=5000, help='total requests (default: 5000)')
+    parser.add_argument('--concurrency', type=int, default=32, help='concurrent connections (default: 32)')
+    parser.add_argument('--conditional', action='store_true', help='send If-None-Match with the last ETag')
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        url = args.url or stack.enter_context(local_server(args.data_dir))
+        # Warm-up: summaries are computed once per database generation
+        asyncio.run(run(url, PATHS, len(PATHS), 1, False))
+        elapsed, latencies, statuses = asyncio.run(
+            run(url, PATHS, args.requests, args.concurrency, args.conditional))
+
+    print(f"{len(latencies)} requests, {args.concurrency} connections, statuses {dict(statuses)}")
+    print(f"{len(latencies) / elapsed:,.0f} requests/s")
+    print(f"latency p50 {np.percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p99 {np.percentile(latencies, 99) * 1000:.1f} ms, max {latencies.max() * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
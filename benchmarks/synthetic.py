@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator: the four CSVs at any size, for benchmarks
+
+Writes rivers / sections / campaigns / measurements.csv with the columns of
+scripts/dataset.py SCHEMA and values that pass validate.py: each campaign uses one
+measurement method and fills that method's specific columns only, discharge is
+lognormal around a section mean scaled by the watershed area, bedload follows a
+per-section power law of discharge (qs = a Q^b, b in 1.3-2.5) with lognormal scatter,
+and grain sizes keep d10 < d50 < d84. The fan-out (rivers, sections per river,
+campaigns per section) is configurable; measurements are spread over the campaigns
+and written in chunks, so 10^7 rows need bounded memory.
+    python benchmarks/synthetic.py --measurements 1000000 --out /tmp/synthetic/data
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+from dataset import METHOD_COLUMNS, SCHEMA  # noqa: E402
+
+# Rows generated and written per chunk of measurements.csv
+CHUNK_SIZE = 500000
+
+COUNTRIES = ['FRA', 'CHE', 'ITA', 'AUT', 'DEU', 'USA', 'CAN', 'NZL', 'JPN', 'CHL']
+MORPHOLOGIES = ['pool-riffle', 'plane-bed', 'braided', 'meandering', 'wandering', 'step-pool']
+PROVIDERS = [('EDYTEM', 'contact@edytem.example.org'), ('EPFL - LHE', 'lhe@epfl.example.ch'),
+             ('USGS', 'water@usgs.example.gov'), ('INRAE', 'hydro@inrae.example.fr'),
+             ('BOKU', 'iwa@boku.example.at')]
+DISCHARGE_SOURCES = ['hydrometric_station', 'adcp_measurement', 'rating_curve', 'current_meter', 'model']
+
+# Share of campaigns per method
+METHOD_WEIGHTS = {
+    'passive_acoustic': 0.35,
+    'active_acoustic': 0.20,
+    'physical_sampler': 0.35,
+    'dune_tracking': 0.10,
+}
+
+# Values drawn for the method-specific text columns
+METHOD_CHOICES = {
+    'acoustic_hydrophone_type': ['HTI-96-MIN', 'HTI-99-HF', 'Aquarian H2a'],
+    'acoustic_recorder_type': ['SM3BAT', 'SM4BAT', 'RTSYS EA-SDA14'],
+    'acoustic_calibration': ['Nasr_2023', 'Le_Guern_2024', 'other'],
+    'adcp_type': ['RiverRay', 'StreamPro', 'RiverPro', 'M9'],
+    'adcp_equation_type': ['Rio_Matic_2020', 'Wright_McEwan_2008', 'Rennie_2017'],
+    'sampler_type': ['Helley-Smith 76mm', 'Helley-Smith 152mm', 'Toutle River 305mm', 'BLH-84'],
+    'dune_survey_method': ['bathymetry', 'photogrammetry'],
+    'dune_echosounder_type': ['multibeam', 'single_beam'],
+    'dune_equation_type': ['Simons_1965', 'Yalin_1977', 'van_den_Berg_1987'],
+}
+
+
+def pick(rng, values, n):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), n)]
+
+
+def blank(values, keep):
+    """Object array with None where keep is False (written as empty CSV fields)"""
+    out = np.full(len(keep), None, dtype=object)
+    out[keep] = values[keep]
+    return out
+
+
+def nullable(values, keep, integer=False):
+    """Nullable column: values where keep, missing elsewhere (integers written without '.0')"""
+    column = pd.array(np.where(keep, values, np.nan), dtype='Float64')
+    return column.round().astype('Int64') if integer else column
+
+
+class SyntheticDataset:
+    """Parameters and per-level attributes of one synthetic dataset"""
+
+    def __init__(self, measurements, rivers=50, sections_per_river=4, campaigns_per_section=10, seed=0):
+        self.n_measurements = measurements
+        self.n_rivers = rivers
+        self.n_sections = rivers * sections_per_river
+        self.n_campaigns = self.n_sections * campaigns_per_section
+        self.sections_per_river = sections_per_river
+        self.campaigns_per_section = campaigns_per_section
+        self.rng = np.random.default_rng(seed)
+
+    def rivers(self):
+        rng, n = self.rng, self.n_rivers
+        self.river_ids = np.array([f'SYN_R{i:05d}' for i in range(n)], dtype=object)
+        self.watershed = np.round(rng.lognormal(np.log(2000), 1.5, n), 1)
+        return pd.DataFrame({
+            'river_id': self.river_ids,
+            'river_name': [f'Synthetic river {i}' for i in range(n)],
+            'country': pick(rng, COUNTRIES, n),
+            'watershed_area_km2': self.watershed,
+            'notes': blank(np.full(n, 'Synthetic benchmark data', dtype=object), rng.random(n) < 0.5),
+        })
+
+    def sections(self):
+        rng, n = self.rng, self.n_sections
+        river = np.repeat(np.arange(self.n_rivers), self.sections_per_river)
+        rank = np.tile(np.arange(self.sections_per_river), self.n_rivers)
+        self.section_ids = np.array([f'{self.river_ids[r]}_S{k + 1:02d}' for r, k in zip(river, rank)], dtype=object)
+        # Each river gets a random centre, its sections are scattered around it
+        centre_lat = rng.uniform(-50, 65, self.n_rivers)
+        centre_lon = rng.uniform(-170, 175, self.n_rivers)
+        area = self.watershed[river]
+        width = np.round(np.clip(0.8 * area ** 0.4 * rng.lognormal(0, 0.3, n), 2, 800), 1)
+        self.width = width
+        # Mean discharge grows with the watershed area, d50 is a reach property
+        self.mean_discharge = 0.02 * area ** 0.9 * rng.lognormal(0, 0.4, n)
+        self.d50 = np.clip(rng.lognormal(np.log(20), 0.8, n), 0.2, 250)
+        self.rating_a = rng.lognormal(np.log(0.1), 1.0, n)
+        self.rating_b = rng.uniform(1.3, 2.5, n)
+        return pd.DataFrame({
+            'section_id': self.section_ids,
+            'river_id': self.river_ids[river],
+            'section_name': [f'Reach {k + 1}' for k in rank],
+            'latitude': np.round(np.clip(centre_lat[river] + rng.normal(0, 0.2, n), -90, 90), 4),
+            'longitude': np.round(np.clip(centre_lon[river] + rng.normal(0, 0.2, n), -180, 180), 4),
+            'elevation_m': np.round(rng.uniform(5, 2500, n)),
+            'bankfull_width_m': width,
+            'channel_slope': np.round(np.clip(rng.lognormal(np.log(0.005), 0.9, n), 1e-5, 0.2), 5),
+            'morphology_type': pick(rng, MORPHOLOGIES, n),
+            'notes': None,
+        })
+
+    def campaigns(self):
+        rng, n = self.rng, self.n_campaigns
+        self.campaign_section = np.repeat(np.arange(self.n_sections), self.campaigns_per_section)
+        self.campaign_ids = np.array([f'SYN_C{i:07d}' for i in range(n)], dtype=object)
+        self.campaign_method = rng.choice(len(METHOD_WEIGHTS), n, p=list(METHOD_WEIGHTS.values()))
+        # Flow regime of the campaign relative to the section mean (floods, baseflow)
+        self.campaign_flow = rng.lognormal(0, 0.8, n)
+        days = rng.integers(0, (pd.Timestamp('2025-12-31') - pd.Timestamp('2000-01-01')).days, n)
+        provider = rng.integers(0, len(PROVIDERS), n)
+        return pd.DataFrame({
+            'campaign_id': self.campaign_ids,
+            'section_id': self.section_ids[self.campaign_section],
+            'campaign_date': (pd.Timestamp('2000-01-01') + pd.to_timedelta(days, 'D')).strftime('%Y-%m-%d'),
+            'data_provider': [PROVIDERS[p][0] for p in provider],
+            'contact_email': [PROVIDERS[p][1] for p in provider],
+            'reference': blank(np.array([f'doi:10.5555/syn.{i}' for i in range(n)], dtype=object),
+                               rng.random(n) < 0.3),
+            'notes': None,
+        })
+
+    def campaign_counts(self):
+        """Measurements per campaign, n_measurements in total"""
+        return self.rng.multinomial(self.n_measurements, np.full(self.n_campaigns, 1 / self.n_campaigns))
+
+    def measurements(self, first_id, campaign):
+        """Measurements of the campaigns at indices campaign (one row each)"""
+        rng, n = self.rng, len(campaign)
+        section = self.campaign_section[campaign]
+        method = np.asarray(list(METHOD_WEIGHTS), dtype=object)[self.campaign_method[campaign]]
+
+        discharge = self.mean_discharge[section] * self.campaign_flow[campaign] * rng.lognormal(0, 0.15, n)
+        relative = discharge / self.mean_discharge[section]
+        bedload = self.rating_a[section] * relative ** self.rating_b[section] * rng.lognormal(0, 0.5, n)
+        # Hydraulic geometry: depth ~ Q^0.4, velocity from continuity
+        depth = np.clip(0.25 * discharge ** 0.4, 0.05, None)
+        velocity = discharge / (depth * self.width[section])
+        d50 = self.d50[section] * rng.lognormal(0, 0.1, n)
+        source = pick(rng, DISCHARGE_SOURCES, n)
+        station = source == 'hydrometric_station'
+
+        df = pd.DataFrame({
+            'measurement_id': [f'SYN_M{i:09d}' for i in range(first_id, first_id + n)],
+            'campaign_id': self.campaign_ids[campaign],
+            'measurement_method': method,
+            'bedload_rate_total_kg_s': np.round(bedload, 6),
+            'discharge_m3_s': np.round(discharge, 3),
+            'discharge_source': source,
+            'discharge_station_code': blank(np.char.add('SYN', (section % 9000 + 1000).astype(str)).astype(object),
+                                            station),
+            'discharge_station_name': blank(np.full(n, 'Synthetic gauge', dtype=object), station),
+            'd50_mm': np.round(d50, 2),
+            'd84_mm': np.round(d50 * rng.uniform(1.8, 3.0, n), 2),
+            'd10_mm': nullable(np.round(d50 * rng.uniform(0.15, 0.4, n), 2), rng.random(n) < 0.8),
+            'water_depth_mean_m': np.round(depth, 3),
+            'flow_velocity_mean_m_s': np.round(velocity, 3),
+        })
+
+        for name, columns in METHOD_COLUMNS.items():
+            rows = method == name
+            for col in columns:
+                if col in METHOD_CHOICES:
+                    df[col] = blank(pick(rng, METHOD_CHOICES[col], n), rows)
+        other = df['acoustic_calibration'].to_numpy() == 'other'
+        df['acoustic_sensitivity_db'] = nullable(rng.uniform(-200, -160, n), method == 'passive_acoustic', True)
+        df['acoustic_calibration_a'] = nullable(np.round(rng.lognormal(np.log(0.0015), 0.3, n), 6), other)
+        df['acoustic_calibration_b'] = nullable(np.round(rng.uniform(1.2, 2.2, n), 3), other)
+        df['adcp_measurement_duration_s'] = nullable(rng.choice([300, 450, 600, 900], n).astype(float),
+                                                     method == 'active_acoustic', True)
+        df['dune_interval_hours'] = nullable(rng.choice([6, 12, 24, 48], n).astype(float),
+                                             method == 'dune_tracking', True)
+        return df[list(SCHEMA['measurements'])]
+
+    def write(self, out_dir, chunk_size=CHUNK_SIZE):
+        """Write the four CSVs into out_dir; returns {table: rows}"""
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        counts = {}
+        for table in ['rivers', 'sections', 'campaigns']:
+            df = getattr(self, table)()
+            df[list(SCHEMA[table])].to_csv(out_dir / f'{table}.csv', index=False)
+            counts[table] = len(df)
+
+        campaign_of = np.repeat(np.arange(self.n_campaigns, dtype=np.int32), self.campaign_counts())
+        with open(out_dir / 'measurements.csv', 'w', newline='') as f:
+            f.write(','.join(SCHEMA['measurements']) + '\n')
+            for start in range(0, self.n_measurements, chunk_size):
+                chunk = self.measurements(start + 1, campaign_of[start:start + chunk_size])
+                chunk.to_csv(f, index=False, header=False)
+        counts['measurements'] = self.n_measurements
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic dataset (the four CSVs) for benchmarks')
+    parser.add_argument('--measurements', type=float, default=1e5, help='number of measurements (default: 1e5)')
+    parser.add_argument('--rivers', type=int, default=50, help='number of rivers (default: 50)')
+    parser.add_argument('--sections-per-river', type=int, default=4, help='sections per river (default: 4)')
+    parser.add_argument('--campaigns-per-section', type=int, default=10, help='campaigns per section (default: 10)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'measurements generated per chunk (default: {CHUNK_SIZE})')
+    parser.add_argument('--out', required=True, help='output directory (e.g. /tmp/synthetic/data)')
+    args = parser.parse_args()
+
+    dataset = SyntheticDataset(int(args.measurements), args.rivers, args.sections_per_river,
+                               args.campaigns_per_section, args.seed)
+    counts = dataset.write(args.out, args.chunk_size)
+    print(', '.join(f'{rows:,} {table}' for table, rows in counts.items()) + f' written to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
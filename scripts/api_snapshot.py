@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Snapshot of the last generated static API, for incremental regeneration
+
+generate_api.py --incremental compares the content hash of every row of the four
+tables with the snapshot saved by the previous run (api/.snapshot.pkl) and derives:
+- the all.json / measurements.json records that are unchanged, and are copied from
+  the current files (the snapshot keeps the byte offset of every record) instead of
+  being serialized again,
+- the by_country / by_river / by_section shards that hold a changed, added or removed
+  row, under its old or its new key; the other shards are left untouched,
+- the tables that changed, for the whole-table files and the columnar exports.
+Summaries, stats, tiles and the filter index are cheap to recompute from the cube and
+are rewritten only when their content changed (see JsonWriter).
+
+A snapshot is only used when it was saved by the same code, pandas version, output
+options and CSV columns, together with the manifest.json on disk; otherwise the run
+is a full one. Keys are compared through their 64-bit hashes: tables with missing or
+duplicated keys (or a hash collision) also fall back to a full run.
+"""
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset import TABLES, row_hashes
+
+SNAPSHOT_NAME = '.snapshot.pkl'
+
+# Bump when the snapshot layout changes
+SNAPSHOT_VERSION = 1
+
+# Modules whose code shapes the generated files
+SOURCE_FILES = ['generate_api.py', 'json_writer.py', 'dataset.py', 'rollup.py', 'tiles.py',
+                'columnar_export.py', 'api_snapshot.py', 'hydraulics.py',
+                'rating_curves.py']
+
+TABLE_KEYS = {
+    'rivers': 'river_id',
+    'sections': 'section_id',
+    'campaigns': 'campaign_id',
+    'measurements': 'measurement_id',
+}
+
+# Parent key column of the joined rows (all.json) for each parent table
+PARENT_COLUMNS = {
+    'campaigns': 'campaign_id',
+    'sections': 'section_id',
+    'rivers': 'river_id',
+}
+
+
+def key_hashes(series):
+    """64-bit hashes of key values"""
+    return pd.util.hash_array(series.to_numpy(dtype=object), categorize=False)
+
+
+def signature(tables, options, columnar):
+    """Everything that shapes the output besides the row contents"""
+    code = hashlib.sha256()
+    for name in SOURCE_FILES:
+        code.update((Path(__file__).parent / name).read_bytes())
+    return {
+        'version': SNAPSHOT_VERSION,
+        'code': code.hexdigest(),
+        'pandas': pd.__version__,
+        'options': (options.compact, options.gzip, options.brotli, options.omit_null),
+        'columnar': columnar,
+        'columns': {table: list(df.columns) for table, df in tables.items()},
+    }
+
+
+def table_hashes(tables):
+    """{table: Series of row hashes indexed by key hash}, None for a table whose keys are
+    missing or not unique"""
+    hashes = {}
+    for table in TABLES:
+        df = tables[table]
+        keys = df[TABLE_KEYS[table]]
+        index = pd.Index(key_hashes(keys))
+        if keys.isna().any() or not index.is_unique:
+            hashes[table] = None
+        else:
+            hashes[table] = pd.Series(row_hashes(df), index=index)
+    return hashes
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_snapshot(api_dir, expected_signature):
+    """(snapshot, None) if a usable snapshot matches the current run, else (None, reason)"""
+    path = Path(api_dir) / SNAPSHOT_NAME
+    if not path.exists():
+        return None, 'no snapshot'
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except Exception as e:
+        return None, f'unreadable snapshot ({e})'
+    if snapshot.get('signature') != expected_signature:
+        return None, 'code, options or columns changed'
+    manifest = Path(api_dir) / 'manifest.json'
+    if not manifest.exists() or file_sha256(manifest) != snapshot['manifest_sha256']:
+        return None, 'manifest.json does not match the snapshot'
+    if any(h is None for h in snapshot['hashes'].values()):
+        return None, 'missing or duplicated keys in the previous data'
+    return snapshot, None
+
+
+def save_snapshot(api_dir, snapshot):
+    """Write the snapshot atomically (a partial file is never left under its name)"""
+    path = Path(api_dir) / SNAPSHOT_NAME
+    temporary = path.with_name(path.name + '.tmp')
+    with open(temporary, 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+
+class ChangeSet:
+    """What changed since a snapshot; with snapshot=None every table, record and shard
+    counts as changed (full run)"""
+
+    def __init__(self, snapshot, hashes, full_data, shard_columns):
+        self.snapshot = snapshot
+        self.full = (snapshot is None or any(h is None for h in hashes.values())
+                     or len(full_data) != len(hashes['measurements']))
+        self.changed_tables = set(TABLES)
+        self.sources = {}
+        self.touched = {}
+        self.all_shards = True
+        if self.full:
+            return
+
+        old_hashes = snapshot['hashes']
+        dirty_keys = {}
+        self.changed_tables = set()
+        for table in TABLES:
+            old, new = old_hashes[table], hashes[table]
+            positions = old.index.get_indexer(new.index)
+            same = positions >= 0
+            same[same] = old.to_numpy()[positions[same]] == new.to_numpy()[same]
+            # Added, changed or removed rows, or the same rows in another order
+            if len(old) != len(new) or not np.array_equal(positions, np.arange(len(old))) or not same.all():
+                self.changed_tables.add(table)
+            # Records of <table>.json: reused when their own row did not change
+            self.sources[table] = np.where(same, positions, -1)
+            # Keys whose row was added, changed or removed
+            dirty_keys[table] = new.index[~same].union(old.index.difference(new.index[same]))
+
+        # all.json: also its campaign, section and river rows (a removed parent counts too)
+        reuse_all = self.sources['measurements'] >= 0
+        for table, column in PARENT_COLUMNS.items():
+            if len(dirty_keys[table]):
+                reuse_all &= ~np.isin(key_hashes(full_data[column].astype(object)), dirty_keys[table].to_numpy())
+        source = np.where(reuse_all, self.sources['measurements'], -1)
+        self.sources['all'] = source
+
+        # Shards holding a row that is new, changed or gone, under its new and its old key.
+        # If unchanged rows changed order, every shard's row order may have changed.
+        reused = source[source >= 0]
+        self.all_shards = bool(np.any(np.diff(reused) <= 0))
+        old_dirty = np.ones(len(old_hashes['measurements']), dtype=bool)
+        old_dirty[reused] = False
+        old_keys = snapshot['shard_keys']
+        for column in shard_columns:
+            new_keys = full_data.loc[~reuse_all, column].dropna().astype(str)
+            removed_keys = old_keys.loc[old_dirty, column].dropna().astype(str)
+            self.touched[column] = set(new_keys) | set(removed_keys)
+
+    def table_changed(self, table):
+        return table in self.changed_tables
+
+    def any_changed(self):
+        return bool(self.changed_tables)
+
+    def shard_touched(self, column, key):
+        return self.full or self.all_shards or str(key) in self.touched[column]
+
+    def old_entry(self, *path):
+        """Manifest entry of the previous run (e.g. old_entry('shards', 'by_river', key)), or None"""
+        if self.full:
+            return None
+        entry = self.snapshot['manifest']
+        for part in path:
+            if not isinstance(entry, dict) or part not in entry:
+                return None
+            entry = entry[part]
+        return entry
+
+    def reuse(self, name, path):
+        """(source, record ends) to copy the unchanged records of endpoint name (all,
+        rivers...) from its current file at path, or None when it must be serialized entirely"""
+        ends = None if self.full else self.snapshot['record_ends'].get(name)
+        entry = self.old_entry('endpoints', name)
+        if ends is None or entry is None or not path.exists() or path.stat().st_size != entry['bytes']:
+            return None
+        return self.sources[name], ends
+
+
+def unchanged(snapshot, hashes):
+    """Whether no row was added, changed or removed since the snapshot"""
+    return all(hashes[table] is not None and hashes[table].equals(snapshot['hashes'][table]) for table in TABLES)
@@ -4,16 +4,150 @@ Build SQLite database from CSV files
 Creates bedload_transport.db with proper schema and relationships
 """
 
+import argparse
+import os
 import sqlite3
+import sys
+import time
+import uuid
 import pandas as pd
+from datetime import datetime, timezone
 from pathlib import Path
-import sys
+
+from dataset import (DATE_COLUMNS, METHOD_COLUMNS, SCHEMA, iter_table_chunks, plain_frame, read_table,
+                     row_hashes)
+from profiling import NULL_PROFILER, add_profile_arguments, peak_memory_mb, profiler_from_args
+import hydraulics
+import rating_curves
+
+# Tables in hierarchical (parent before child) order, with their primary key
+TABLE_KEYS = {
+    'rivers': 'river_id',
+    'sections': 'section_id',
+    'campaigns': 'campaign_id',
+    'measurements': 'measurement_id',
+}
+
+# Rows per executemany batch when streaming CSVs into SQLite
+CHUNK_SIZE = 50000
+
+# Page cache used during the bulk load (KiB)
+LOAD_CACHE_KB = 200000
+
+# Checkpoint of the old database before a build is published over it: attempts, base
+# delay between them (seconds, growing linearly) and busy timeout of each attempt
+PUBLISH_RETRIES = 5
+PUBLISH_RETRY_DELAY = 0.2
+PUBLISH_BUSY_TIMEOUT = 2.0
+
+# Free-text fields in the search_index FTS5 table: table -> {index column: table column}.
+# Rows are keyed by source rowid * len(SEARCH_SOURCES) + position of the table here.
+SEARCH_SOURCES = {
+    'rivers': {'name': 'river_name', 'notes': 'notes'},
+    'sections': {'name': 'section_name', 'notes': 'notes'},
+    'campaigns': {'data_provider': 'data_provider', 'reference': 'reference', 'notes': 'notes'},
+}
+SEARCH_COLUMNS = ['name', 'data_provider', 'reference', 'notes']
+
+# Optimized schema (--schema optimized): enumerations are stored as ids of small lookup
+# tables and dates as YYYYMMDD integers. Column -> (lookup table, id column)
+LOOKUPS = {
+    'country': ('countries', 'country_id'),
+    'measurement_method': ('measurement_methods', 'method_id'),
+    'discharge_source': ('discharge_sources', 'discharge_source_id'),
+}
+
+
+def sql_rows(df):
+    """Rows of a typed DataFrame as plain tuples, with missing values mapped to None"""
+    df = plain_frame(df)
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+
+# Sparse layout (--layout sparse): the method-specific columns of measurements live in
+# one side table per method, holding only the rows where one of them is filled
+SIDE_TABLES = {method: f'measurements_{method}' for method in METHOD_COLUMNS}
+
+
+def method_column_definitions():
+    """SQL definitions of the method-specific measurement columns, in METHOD_COLUMNS order"""
+    return [f"{col} {'REAL' if str(SCHEMA['measurements'][col]).startswith('float') else 'TEXT'}"
+            for cols in METHOD_COLUMNS.values() for col in cols]
+
+
+def date_to_int(series):
+    """datetime64 column as YYYYMMDD integers (missing dates stay missing)"""
+    return (series.dt.year * 10000 + series.dt.month * 100 + series.dt.day).astype('Int64')
+
+
+def search_values(table, alias):
+    """SQL values of the search_index row of a source row (alias: table name, or new in triggers)"""
+    code = list(SEARCH_SOURCES).index(table)
+    return ', '.join([f'{alias}.rowid * {len(SEARCH_SOURCES)} + {code}', f"'{table}'", f'{alias}.{TABLE_KEYS[table]}']
+                     + [f'{alias}.{col}' for col in SEARCH_SOURCES[table].values()])
+
+
+def build_path(db_path):
+    """Temporary file a full build is written to, next to db_path so that publishing it
+    is a rename within the same directory"""
+    db_file = Path(db_path)
+    return db_file.with_name(f'.{db_file.name}.building')
+
+
+def remove_database_file(path):
+    """Delete a database file and its journal / WAL siblings, if present"""
+    for suffix in ['', '-journal', '-wal', '-shm']:
+        Path(f'{path}{suffix}').unlink(missing_ok=True)
+
+
+def fsync_path(path):
+    """Flush a file (or directory entry) to disk; directories cannot be synced on Windows"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def read_build_info(conn):
+    """{key: value} of the build_info table ({} for a database built without one)"""
+    try:
+        return dict(conn.execute('SELECT key, value FROM build_info'))
+    except sqlite3.OperationalError:
+        return {}
+
+
+def database_generation(db_path):
+    """Generation of the database currently at db_path: a new token for every build and
+    incremental update, None if the file is missing or predates build_info"""
+    if not Path(db_path).exists():
+        return None
+    conn = sqlite3.connect(f'{Path(db_path).resolve().as_uri()}?mode=ro', uri=True)
+    try:
+        return read_build_info(conn).get('generation')
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        conn.close()
+
 
 class DatabaseBuilder:
     """Builds SQLite database from validated CSV files"""
     
-    def __init__(self, db_path='bedload_transport.db'):
+    def __init__(self, db_path='bedload_transport.db', loader='bulk', chunk_size=CHUNK_SIZE, schema='standard',
+                 layout='wide', profiler=NULL_PROFILER):
         self.db_path = db_path
+        self.loader = loader
+        self.chunk_size = chunk_size
+        self.schema = schema
+        self.layout = layout
+        self.profiler = profiler
+        self.lookup_ids = {}
         self.conn = None
         
     def create_schema(self):
@@ -64,8 +198,10 @@ class DatabaseBuilder:
             )
         ''')
         
-        # MEASUREMENTS table
-        cursor.execute('''
+        # MEASUREMENTS table (method-specific columns inline, or in side tables when sparse)
+        method_columns = '' if self.layout == 'sparse' else ''.join(
+            f'\n                {definition},' for definition in method_column_definitions())
+        cursor.execute(f'''
             CREATE TABLE IF NOT EXISTS measurements (
                 measurement_id TEXT PRIMARY KEY,
                 campaign_id TEXT NOT NULL,
@@ -79,93 +215,658 @@ class DatabaseBuilder:
                 d84_mm REAL,
                 d10_mm REAL,
                 water_depth_mean_m REAL,
-                flow_velocity_mean_m_s REAL,
-                acoustic_hydrophone_type TEXT,
-                acoustic_recorder_type TEXT,
-                acoustic_sensitivity_db REAL,
-                acoustic_calibration TEXT,
-                acoustic_calibration_a REAL,
-                acoustic_calibration_b REAL,
-                adcp_type TEXT,
-                adcp_equation_type TEXT,
-                adcp_measurement_duration_s REAL,
-                sampler_type TEXT,
-                dune_survey_method TEXT,
-                dune_echosounder_type TEXT,
-                dune_equation_type TEXT,
-                dune_interval_hours REAL,
+                flow_velocity_mean_m_s REAL,{method_columns}
                 FOREIGN KEY (campaign_id) REFERENCES campaigns(campaign_id)
             )
         ''')
+        if self.layout == 'sparse':
+            self.create_side_tables()
         
-        # Create indexes for faster queries
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sections_river ON sections(river_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_campaigns_section ON campaigns(section_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_measurements_campaign ON measurements(campaign_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_measurements_method ON measurements(measurement_method)')
+        # ROW_HASHES table - content hash of every loaded row, used by --incremental
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS row_hashes (
+                table_name TEXT NOT NULL,
+                row_key TEXT NOT NULL,
+                row_hash INTEGER NOT NULL,
+                PRIMARY KEY (table_name, row_key)
+            ) WITHOUT ROWID
+        ''')
         
         self.conn.commit()
         print("  ✓ Schema created")
         
-    def load_rivers(self, csv_path):
-        """Load rivers from CSV into database"""
-        print(f"\n📋 Loading {csv_path}...")
+    def create_side_tables(self, strict=False):
+        """Sparse layout: one table per method for its specific columns, and the
+        measurements_wide view rejoining them (computed when queried, never stored)"""
+        definitions = dict(zip([col for cols in METHOD_COLUMNS.values() for col in cols],
+                               method_column_definitions()))
+        joins = []
+        for method, side_table in SIDE_TABLES.items():
+            columns = ''.join(f',\n                {definitions[col]}' for col in METHOD_COLUMNS[method])
+            self.conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {side_table} (
+                    measurement_id TEXT PRIMARY KEY REFERENCES measurements(measurement_id){columns}
+                ) WITHOUT ROWID{', STRICT' if strict else ''}
+            ''')
+            joins.append(f'LEFT JOIN {side_table} USING (measurement_id)')
         
-        df = pd.read_csv(csv_path)
+        method_columns = ', '.join(col for cols in METHOD_COLUMNS.values() for col in cols)
+        self.conn.execute(f'''
+            CREATE VIEW IF NOT EXISTS measurements_wide AS
+            SELECT measurements.*, {method_columns}
+            FROM measurements {' '.join(joins)}
+        ''')
         
-        # Replace NaN with None for SQL
-        df = df.where(pd.notnull(df), None)
+    def side_tables(self, table):
+        """Side tables holding part of the rows of a table (measurements in the sparse layout)"""
+        return list(SIDE_TABLES.values()) if table == 'measurements' and self.layout == 'sparse' else []
         
-        # Insert into database
-        df.to_sql('rivers', self.conn, if_exists='append', index=False)
+    def storage_frames(self, table, df):
+        """[(SQL table, frame)] where the rows of df are stored: the table itself, plus in the
+        sparse layout one side table per method with only the rows that have a value there"""
+        if not self.side_tables(table):
+            return [(table, df)]
+        method_columns = {col for cols in METHOD_COLUMNS.values() for col in cols}
+        frames = [(table, df[[col for col in df.columns if col not in method_columns]])]
+        for method, side_table in SIDE_TABLES.items():
+            columns = [col for col in METHOD_COLUMNS[method] if col in df.columns]
+            filled = df[columns].notna().any(axis=1)
+            frames.append((side_table, df.loc[filled, ['measurement_id'] + columns]))
+        return frames
         
-        print(f"  ✓ Loaded {len(df)} rivers")
+    def create_optimized_schema(self):
+        """Create the optimized schema: STRICT tables, lookup tables for the enumerations
+        and integer (YYYYMMDD) dates. Table and column names are those of create_schema,
+        except for the *_id columns replacing the looked-up values."""
+        print("\n📦 Creating database schema (optimized)...")
         
-    def load_sections(self, csv_path):
-        """Load sections from CSV into database"""
-        print(f"\n📋 Loading {csv_path}...")
+        cursor = self.conn.cursor()
+        
+        # Lookup tables
+        for column, (lookup, id_column) in LOOKUPS.items():
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {lookup} (
+                    {id_column} INTEGER PRIMARY KEY,
+                    {column} TEXT NOT NULL UNIQUE
+                ) STRICT
+            ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rivers (
+                river_id TEXT PRIMARY KEY,
+                river_name TEXT NOT NULL,
+                country_id INTEGER NOT NULL REFERENCES countries(country_id),
+                watershed_area_km2 REAL,
+                notes TEXT
+            ) STRICT
+        ''')
         
-        df = pd.read_csv(csv_path)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sections (
+                section_id TEXT PRIMARY KEY,
+                river_id TEXT NOT NULL REFERENCES rivers(river_id),
+                section_name TEXT NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                elevation_m REAL,
+                bankfull_width_m REAL,
+                channel_slope REAL,
+                morphology_type TEXT,
+                notes TEXT
+            ) STRICT
+        ''')
         
-        # Replace NaN with None
-        df = df.where(pd.notnull(df), None)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS campaigns (
+                campaign_id TEXT PRIMARY KEY,
+                section_id TEXT NOT NULL REFERENCES sections(section_id),
+                campaign_date INTEGER NOT NULL,
+                data_provider TEXT,
+                contact_email TEXT,
+                reference TEXT,
+                notes TEXT
+            ) STRICT
+        ''')
         
-        # Insert into database
-        df.to_sql('sections', self.conn, if_exists='append', index=False)
+        method_columns = '' if self.layout == 'sparse' else ''.join(
+            f',\n                {definition}' for definition in method_column_definitions())
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS measurements (
+                measurement_id TEXT PRIMARY KEY,
+                campaign_id TEXT NOT NULL REFERENCES campaigns(campaign_id),
+                method_id INTEGER NOT NULL REFERENCES measurement_methods(method_id),
+                bedload_rate_total_kg_s REAL NOT NULL,
+                discharge_m3_s REAL,
+                discharge_source_id INTEGER REFERENCES discharge_sources(discharge_source_id),
+                discharge_station_code TEXT,
+                discharge_station_name TEXT,
+                d50_mm REAL,
+                d84_mm REAL,
+                d10_mm REAL,
+                water_depth_mean_m REAL,
+                flow_velocity_mean_m_s REAL{method_columns}
+            ) STRICT
+        ''')
+        if self.layout == 'sparse':
+            self.create_side_tables(strict=True)
         
-        print(f"  ✓ Loaded {len(df)} sections")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS row_hashes (
+                table_name TEXT NOT NULL,
+                row_key TEXT NOT NULL,
+                row_hash INTEGER NOT NULL,
+                PRIMARY KEY (table_name, row_key)
+            ) STRICT, WITHOUT ROWID
+        ''')
         
-    def load_campaigns(self, csv_path):
-        """Load campaigns from CSV into database"""
-        print(f"\n📋 Loading {csv_path}...")
+        self.conn.commit()
+        print("  ✓ Schema created")
+        
+    def lookup_id_series(self, column, series):
+        """Ids of the values of an enumerated column, adding unseen values to its lookup table"""
+        lookup, id_column = LOOKUPS[column]
+        ids = self.lookup_ids.setdefault(column, {})
+        values = series.astype(object)
+        for value in values.dropna().unique():
+            if value not in ids:
+                cursor = self.conn.execute(f'INSERT INTO {lookup} ({column}) VALUES (?)', (value,))
+                ids[value] = cursor.lastrowid
+        return values.map(ids).astype('Int64')
+        
+    def encode_chunk(self, table, chunk):
+        """Chunk in the optimized schema's representation (lookup ids, integer dates)"""
+        columns = {}
+        for col in chunk.columns:
+            if col in LOOKUPS:
+                columns[LOOKUPS[col][1]] = self.lookup_id_series(col, chunk[col])
+            elif col in DATE_COLUMNS.get(table, []):
+                columns[col] = date_to_int(chunk[col])
+            else:
+                columns[col] = chunk[col]
+        return pd.DataFrame(columns, index=chunk.index)
+        
+    def refresh_measurements_full(self):
+        """Rebuild measurements_full, the materialized four-way join with decoded
+        enumerations (optimized schema), index it and refresh the planner statistics"""
+        print("\n🧱 Refreshing measurements_full...")
+        start = time.perf_counter()
+        
+        decoded = {id_column: (lookup, column) for column, (lookup, id_column) in LOOKUPS.items()}
+        definitions, expressions, joins = [], [], []
+        sources = [('measurements', 'm'), ('campaigns', 'c'), ('sections', 's'), ('rivers', 'r')]
+        for i, side_table in enumerate(self.side_tables('measurements')):
+            sources.insert(1 + i, (side_table, f'x{i}'))
+            joins.append(f'LEFT JOIN {side_table} x{i} ON x{i}.measurement_id = m.measurement_id')
+        # Derived hydraulic columns last, as in all.json
+        sources.append(('measurement_hydraulics', 'h'))
+        joins.append('LEFT JOIN measurement_hydraulics h ON h.measurement_id = m.measurement_id')
+        for table, alias in sources:
+            for _, col, col_type, *_ in self.conn.execute(f'PRAGMA table_info({table})').fetchall():
+                name = f'{table[:-1]}_notes' if col == 'notes' else col
+                if col in decoded:
+                    lookup, name = decoded[col]
+                    joins.append(f'LEFT JOIN {lookup} ON {lookup}.{col} = {alias}.{col}')
+                    expression = f'{lookup}.{name}'
+                    col_type = 'TEXT'
+                else:
+                    expression = f'{alias}.{col}'
+                if name in [d.split()[0] for d in definitions]:
+                    continue  # join key already taken from the child table
+                definitions.append(f'{name} {col_type}' + (' PRIMARY KEY' if name == 'measurement_id' else ''))
+                expressions.append(expression)
+        
+        self.conn.execute('DROP TABLE IF EXISTS measurements_full')
+        self.conn.execute(f'CREATE TABLE measurements_full ({", ".join(definitions)}) STRICT')
+        self.conn.execute(f'''
+            INSERT INTO measurements_full
+            SELECT {", ".join(expressions)}
+            FROM measurements m
+            LEFT JOIN campaigns c ON c.campaign_id = m.campaign_id
+            LEFT JOIN sections s ON s.section_id = c.section_id
+            LEFT JOIN rivers r ON r.river_id = s.river_id
+            {" ".join(joins)}
+        ''')
+        
+        # Covering indexes for the common access paths: a section or a method over a date range
+        self.conn.execute('''CREATE INDEX idx_full_section_date ON measurements_full
+                             (section_id, campaign_date, bedload_rate_total_kg_s, discharge_m3_s)''')
+        self.conn.execute('''CREATE INDEX idx_full_method_date ON measurements_full
+                             (measurement_method, campaign_date, bedload_rate_total_kg_s, discharge_m3_s)''')
+        self.conn.execute('ANALYZE')
+        
+        n_rows = self.conn.execute('SELECT COUNT(*) FROM measurements_full').fetchone()[0]
+        print(f"  ✓ {n_rows} rows materialized and analyzed in {time.perf_counter() - start:.2f} s")
+        
+    def refresh_hydraulics(self, measurement_ids=None):
+        """Recompute measurement_hydraulics, the derived hydraulic columns of every measurement
+        (hydraulics.py), from its own values and its section's: one vectorized pass per chunk
+        of the join, streamed like the CSV loads. With measurement_ids, only the rows of these
+        measurements are deleted and recomputed (deleted measurements just lose theirs).
+        Returns the number of rows computed."""
+        print("\n🌊 Deriving hydraulic quantities...")
+        start = time.perf_counter()
+        
+        columns = ''.join(f',\n                {col} REAL' for col in hydraulics.COLUMNS)
+        self.conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS measurement_hydraulics (
+                measurement_id TEXT PRIMARY KEY REFERENCES measurements(measurement_id){columns}
+            ) WITHOUT ROWID{', STRICT' if self.schema == 'optimized' else ''}
+        ''')
+        if measurement_ids is None:
+            self.conn.execute('DELETE FROM measurement_hydraulics')
+            where = ''
+        else:
+            self.fill_key_table('hydraulics_keys', measurement_ids)
+            self.conn.execute('DELETE FROM measurement_hydraulics '
+                              'WHERE measurement_id IN (SELECT key FROM temp.hydraulics_keys)')
+            where = 'WHERE m.measurement_id IN (SELECT key FROM temp.hydraulics_keys)'
         
-        df = pd.read_csv(csv_path)
+        output_columns = ['measurement_id'] + hydraulics.COLUMNS
+        insert_sql = (f'INSERT INTO measurement_hydraulics ({", ".join(output_columns)}) '
+                      f'VALUES ({", ".join("?" for _ in output_columns)})')
+        chunks = pd.read_sql_query(f'''
+            SELECT m.measurement_id, m.bedload_rate_total_kg_s, m.water_depth_mean_m, m.d50_mm,
+                   s.bankfull_width_m, s.channel_slope
+            FROM measurements m
+            LEFT JOIN campaigns c ON c.campaign_id = m.campaign_id
+            LEFT JOIN sections s ON s.section_id = c.section_id
+            {where}
+        ''', self.conn, chunksize=self.chunk_size)
+        n_rows = 0
+        for chunk in chunks:
+            derived = hydraulics.derive(chunk)
+            derived.insert(0, 'measurement_id', chunk['measurement_id'])
+            self.conn.executemany(insert_sql, sql_rows(derived))
+            n_rows += len(chunk)
         
-        # Replace NaN with None
-        df = df.where(pd.notnull(df), None)
+        print(f"  ✓ {n_rows} measurements in {time.perf_counter() - start:.2f} s")
+        return n_rows
         
-        # Insert into database
-        df.to_sql('campaigns', self.conn, if_exists='append', index=False)
+    def fill_key_table(self, name, keys):
+        """(Re)fill the temporary one-column table temp.<name> with keys, to select by
+        them in SQL whatever their number"""
+        self.conn.execute(f'CREATE TEMP TABLE IF NOT EXISTS {name} (key TEXT PRIMARY KEY)')
+        self.conn.execute(f'DELETE FROM temp.{name}')
+        self.conn.executemany(f'INSERT OR IGNORE INTO temp.{name} (key) VALUES (?)', [(k,) for k in keys])
         
-        print(f"  ✓ Loaded {len(df)} campaigns")
+    def changed_values(self, table, changed_df, columns):
+        """Keys of the updated rows of a table where one of these columns differs from the
+        stored value (read before the update is applied)"""
+        key = TABLE_KEYS[table]
+        if len(changed_df) == 0:
+            return set()
+        new = plain_frame(changed_df[[key] + columns]).set_index(key)
+        stored = pd.read_sql_query(f'SELECT {key}, {", ".join(columns)} FROM {table}', self.conn, index_col=key)
+        stored = stored.reindex(new.index)
+        same = (new == stored) | (new.isna() & stored.isna())
+        return set(new.index[~same.all(axis=1)])
         
-    def load_measurements(self, csv_path):
-        """Load measurements from CSV into database"""
+    def hydraulics_changes(self, diffs):
+        """What an incremental update changes among the inputs of measurement_hydraulics:
+        {table: keys} of the inserted, updated and deleted measurements, of the campaigns
+        added, removed or moved to another section, and of the sections added, removed or
+        with another width or slope. Called before the update is applied."""
+        changes = {}
+        for table, columns in [('measurements', None), ('campaigns', ['section_id']),
+                               ('sections', ['bankfull_width_m', 'channel_slope'])]:
+            key = TABLE_KEYS[table]
+            new_df, changed_df, deleted = diffs[table]
+            changed = set(changed_df[key]) if columns is None else self.changed_values(table, changed_df, columns)
+            changes[table] = set(new_df[key]) | changed | set(deleted)
+        return changes
+        
+    def hydraulics_dependents(self, changes):
+        """Measurement ids whose derived hydraulics must be recomputed (or dropped) after the
+        update described by hydraulics_changes has been applied"""
+        self.fill_key_table('changed_campaigns', changes['campaigns'])
+        self.fill_key_table('changed_sections', changes['sections'])
+        dependents = {row[0] for row in self.conn.execute('''
+            SELECT m.measurement_id FROM measurements m
+            LEFT JOIN campaigns c ON c.campaign_id = m.campaign_id
+            WHERE m.campaign_id IN (SELECT key FROM temp.changed_campaigns)
+               OR c.section_id IN (SELECT key FROM temp.changed_sections)
+        ''')}
+        return dependents | changes['measurements']
+        
+    def refresh_rating_curves(self, data_path, campaign_ids=None):
+        """Refill rating_curves, the Qs = a Q^b fits per section, river and method
+        (rating_curves.py), and return the number of curves
+        
+        The sums are kept per campaign and method in rating_curve_cells, accumulated over
+        the measurements chunk by chunk. With campaign_ids, only the cells of these
+        campaigns are recomputed. The cells are then merged per section, river and method
+        through the current campaigns and sections, and the groups whose data changed
+        since the cached fits are refitted in one batch.
+        """
+        print("\n📈 Fitting rating curves...")
+        start = time.perf_counter()
+        
+        strict = ', STRICT' if self.schema == 'optimized' else ''
+        self.conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS rating_curves (
+                scope TEXT NOT NULL,
+                group_id TEXT NOT NULL,
+                n INTEGER NOT NULL,
+                {', '.join(f'{col} REAL' for col in rating_curves.CURVE_COLUMNS[3:])},
+                PRIMARY KEY (scope, group_id)
+            ) WITHOUT ROWID{strict}
+        ''')
+        sums = [col for col in rating_curves.MERGE if col not in ('n', 'data_hash')]
+        self.conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS rating_curve_cells (
+                campaign_id TEXT,
+                measurement_method TEXT,
+                n INTEGER NOT NULL,
+                {', '.join(f'{col} REAL' for col in sums)},
+                data_hash INTEGER NOT NULL
+            ){strict}
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_rating_curve_cells_campaign '
+                          'ON rating_curve_cells(campaign_id)')
+        
+        if campaign_ids is None:
+            self.conn.execute('DELETE FROM rating_curve_cells')
+            campaigns = ''
+        else:
+            self.fill_key_table('rating_curve_keys', campaign_ids)
+            self.conn.execute('DELETE FROM rating_curve_cells '
+                              'WHERE campaign_id IN (SELECT key FROM temp.rating_curve_keys)')
+            campaigns = 'AND m.campaign_id IN (SELECT key FROM temp.rating_curve_keys)'
+        
+        optimized = self.schema == 'optimized'
+        chunks = pd.read_sql_query(f'''
+            SELECT m.campaign_id, {'mm' if optimized else 'm'}.measurement_method,
+                   m.discharge_m3_s, m.bedload_rate_total_kg_s
+            FROM measurements m
+            {'LEFT JOIN measurement_methods mm ON mm.method_id = m.method_id' if optimized else ''}
+            WHERE m.discharge_m3_s > 0 AND m.bedload_rate_total_kg_s > 0 {campaigns}
+        ''', self.conn, chunksize=self.chunk_size)
+        cells = rating_curves.merge_statistics([rating_curves.cell_statistics(chunk) for chunk in chunks],
+                                               rating_curves.CELL_COLUMNS)
+        # The hash is an unsigned sum mod 2^64, stored as the signed integer of the same bits
+        cells['data_hash'] = cells['data_hash'].to_numpy(dtype='uint64').view('int64')
+        self.conn.executemany(
+            f'INSERT INTO rating_curve_cells ({", ".join(cells.columns)}) '
+            f'VALUES ({", ".join("?" for _ in cells.columns)})',
+            sql_rows(cells)
+        )
+        
+        cells = pd.read_sql_query('''
+            SELECT k.*, s.section_id, s.river_id
+            FROM rating_curve_cells k
+            LEFT JOIN campaigns c ON c.campaign_id = k.campaign_id
+            LEFT JOIN sections s ON s.section_id = c.section_id
+        ''', self.conn)
+        cells['data_hash'] = cells['data_hash'].to_numpy(dtype='int64').view('uint64')
+        stats = rating_curves.scope_statistics(cells)
+        curves, refitted = rating_curves.fit_cached(stats, rating_curves.cache_path(data_path))
+        self.conn.execute('DELETE FROM rating_curves')
+        self.conn.executemany(
+            f'INSERT INTO rating_curves ({", ".join(curves.columns)}) '
+            f'VALUES ({", ".join("?" for _ in curves.columns)})',
+            sql_rows(curves)
+        )
+        
+        print(f"  ✓ {len(curves)} curves ({refitted} groups refitted) in {time.perf_counter() - start:.2f} s")
+        return len(curves)
+        
+    def rating_curve_campaigns(self, diffs):
+        """Campaigns whose rating_curve_cells an incremental update changes: those of the
+        inserted, updated and deleted measurements, before and after the update (called
+        before it is applied)"""
+        new_df, changed_df, deleted = diffs['measurements']
+        campaigns = set(new_df['campaign_id'].dropna()) | set(changed_df['campaign_id'].dropna())
+        self.fill_key_table('rating_curve_keys', set(changed_df['measurement_id']) | set(deleted))
+        campaigns |= {row[0] for row in self.conn.execute(
+            'SELECT DISTINCT campaign_id FROM measurements '
+            'WHERE measurement_id IN (SELECT key FROM temp.rating_curve_keys)')}
+        return campaigns
+        
+    def create_indexes(self):
+        """Create indexes for faster queries (after loading, so they are built in one pass)"""
+        print("\n🔎 Creating indexes...")
+        
+        cursor = self.conn.cursor()
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sections_river ON sections(river_id)')
+        if self.schema == 'optimized':
+            # Covering indexes: section + date -> campaigns, campaign / method -> measurements
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_campaigns_section_date '
+                           'ON campaigns(section_id, campaign_date, campaign_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_measurements_campaign '
+                           'ON measurements(campaign_id, method_id, bedload_rate_total_kg_s)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_measurements_method '
+                           'ON measurements(method_id, campaign_id, bedload_rate_total_kg_s)')
+        else:
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_campaigns_section ON campaigns(section_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_measurements_campaign ON measurements(campaign_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_measurements_method ON measurements(measurement_method)')
+        
+        print("  ✓ Indexes created")
+        
+        if self.create_spatial_index():
+            print("  ✓ R*Tree spatial index on section coordinates")
+        else:
+            print("  ⚠️  SQLite built without R*Tree support: spatial queries will scan sections")
+        if self.create_search_index():
+            print("  ✓ FTS5 full-text index on names, notes, providers and references")
+        else:
+            print("  ⚠️  SQLite built without FTS5 support: no full-text search index")
+        
+    def create_spatial_index(self):
+        """Create and fill the R*Tree over section coordinates, kept in sync by triggers
+        
+        Entries are keyed by sections.rowid. Returns False if SQLite lacks the R*Tree module.
+        """
+        try:
+            self.conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS sections_rtree USING rtree(
+                    id, min_lat, max_lat, min_lon, max_lon
+                )
+            ''')
+        except sqlite3.OperationalError:
+            return False
+        
+        self.conn.execute('DELETE FROM sections_rtree')
+        self.conn.execute('''
+            INSERT INTO sections_rtree (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT rowid, latitude, latitude, longitude, longitude FROM sections
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ''')
+        
+        # Incremental updates go through plain INSERT / UPDATE / DELETE on sections
+        for statement in [
+            '''CREATE TRIGGER IF NOT EXISTS sections_rtree_insert AFTER INSERT ON sections
+               WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+                   INSERT INTO sections_rtree VALUES (new.rowid, new.latitude, new.latitude,
+                                                      new.longitude, new.longitude);
+               END''',
+            '''CREATE TRIGGER IF NOT EXISTS sections_rtree_update AFTER UPDATE OF latitude, longitude ON sections
+               BEGIN
+                   DELETE FROM sections_rtree WHERE id = old.rowid;
+                   INSERT INTO sections_rtree SELECT new.rowid, new.latitude, new.latitude,
+                                                     new.longitude, new.longitude
+                   WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+               END''',
+            '''CREATE TRIGGER IF NOT EXISTS sections_rtree_delete AFTER DELETE ON sections BEGIN
+                   DELETE FROM sections_rtree WHERE id = old.rowid;
+               END''',
+        ]:
+            self.conn.execute(statement)
+        return True
+        
+    def create_search_index(self):
+        """Create and fill the FTS5 index over the free-text fields, kept in sync by triggers
+        
+        One index row per source row (see SEARCH_SOURCES), with the table name and
+        primary key stored unindexed. Returns False if SQLite lacks the FTS5 module.
+        """
+        try:
+            self.conn.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                    table_name UNINDEXED, row_key UNINDEXED, {', '.join(SEARCH_COLUMNS)},
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError:
+            return False
+        
+        self.conn.execute('DELETE FROM search_index')
+        n_sources = len(SEARCH_SOURCES)
+        for code, (table, fields) in enumerate(SEARCH_SOURCES.items()):
+            columns = ', '.join(['rowid', 'table_name', 'row_key'] + list(fields))
+            self.conn.execute(f'INSERT INTO search_index ({columns}) '
+                              f'SELECT {search_values(table, table)} FROM {table}')
+            
+            delete = f'DELETE FROM search_index WHERE rowid = old.rowid * {n_sources} + {code};'
+            insert = f'INSERT INTO search_index ({columns}) VALUES ({search_values(table, "new")});'
+            self.conn.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} '
+                              f'BEGIN {insert} END')
+            self.conn.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE ON {table} '
+                              f'BEGIN {delete} {insert} END')
+            self.conn.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} '
+                              f'BEGIN {delete} END')
+        return True
+        
+    def database_bytes(self):
+        """Current size of the database being written (pages x page size)"""
+        page_count = self.conn.execute('PRAGMA page_count').fetchone()[0]
+        return page_count * self.conn.execute('PRAGMA page_size').fetchone()[0]
+        
+    def apply_load_pragmas(self):
+        """Tune SQLite for a one-shot bulk load into a fresh database file"""
+        # The file is rebuilt from scratch on failure, so no rollback journal or fsync is needed
+        self.conn.execute('PRAGMA journal_mode = OFF')
+        self.conn.execute('PRAGMA synchronous = OFF')
+        self.conn.execute(f'PRAGMA cache_size = {-LOAD_CACHE_KB}')
+        self.conn.execute('PRAGMA temp_store = MEMORY')
+        
+    def load_table(self, table, csv_path):
+        """Stream a CSV into its table in fixed-size chunks, returns the number of rows loaded"""
         print(f"\n📋 Loading {csv_path}...")
         
-        df = pd.read_csv(csv_path)
+        start = time.perf_counter()
+        n_rows = 0
+        methods = pd.Series(dtype='int64')
+        
+        if self.loader == 'pandas':
+            # Previous whole-file DataFrame.to_sql path, kept for comparison
+            chunks = [read_table(csv_path, table)]
+        else:
+            chunks = iter_table_chunks(csv_path, self.chunk_size, table)
         
-        # Replace NaN with None
-        df = df.where(pd.notnull(df), None)
+        insert_sql = {}
+        for chunk in chunks:
+            stored = self.encode_chunk(table, chunk) if self.schema == 'optimized' else chunk
+            for sql_table, frame in self.storage_frames(table, stored):
+                if self.loader == 'pandas':
+                    plain_frame(frame).to_sql(sql_table, self.conn, if_exists='append', index=False)
+                    continue
+                if sql_table not in insert_sql:
+                    columns = list(frame.columns)
+                    insert_sql[sql_table] = (f'INSERT INTO {sql_table} ({", ".join(columns)}) '
+                                             f'VALUES ({", ".join("?" for _ in columns)})')
+                self.conn.executemany(insert_sql[sql_table], sql_rows(frame))
+            
+            self.store_hashes(table, chunk)
+            n_rows += len(chunk)
+            if table == 'measurements':
+                counts = chunk['measurement_method'].value_counts()
+                methods = methods.add(counts[counts > 0], fill_value=0)
         
-        # Insert into database
-        df.to_sql('measurements', self.conn, if_exists='append', index=False)
+        elapsed = time.perf_counter() - start
+        rate = n_rows / elapsed if elapsed > 0 else float('inf')
+        print(f"  ✓ Loaded {n_rows} {table} ({rate:,.0f} rows/s)")
         
         # Print method distribution
-        methods = df['measurement_method'].value_counts()
-        print(f"  ✓ Loaded {len(df)} measurements:")
-        for method, count in methods.items():
-            print(f"    - {method}: {count}")
+        for method, count in methods.sort_values(ascending=False).items():
+            print(f"    - {method}: {int(count)}")
+        
+        return n_rows
+        
+    def store_hashes(self, table, df):
+        """Record the content hash of every row of a freshly loaded table"""
+        key = TABLE_KEYS[table]
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO row_hashes (table_name, row_key, row_hash) VALUES (?, ?, ?)',
+            zip([table] * len(df), df[key].tolist(), row_hashes(df).tolist())
+        )
+        
+    def diff_table(self, table, df):
+        """Compare CSV rows against stored hashes: returns (new_df, changed_df, deleted_keys)"""
+        key = TABLE_KEYS[table]
+        
+        duplicated = df[key][df[key].duplicated()]
+        if len(duplicated) > 0:
+            raise ValueError(f"Duplicate {key} in {table}.csv: {duplicated.tolist()}")
+        
+        cursor = self.conn.execute(
+            'SELECT row_key, row_hash FROM row_hashes WHERE table_name = ?', (table,)
+        )
+        stored = dict(cursor.fetchall())
+        
+        hashes = row_hashes(df)
+        keys = df[key].tolist()
+        is_new = [k not in stored for k in keys]
+        is_changed = [not new and stored[k] != h for k, h, new in zip(keys, hashes.tolist(), is_new)]
+        deleted = sorted(set(stored) - set(keys))
+        
+        return df[is_new], df[is_changed], deleted
+        
+    def apply_diff(self, table, new_df, changed_df):
+        """Upsert new and changed rows of a table and refresh their hashes"""
+        upserts = pd.concat([new_df, changed_df])
+        if len(upserts) == 0:
+            return
+        
+        key = TABLE_KEYS[table]
+        # Side rows are replaced rather than upserted: an update may have emptied them
+        for side_table in self.side_tables(table):
+            self.conn.executemany(f'DELETE FROM {side_table} WHERE {key} = ?', [(k,) for k in upserts[key]])
+        
+        for sql_table, frame in self.storage_frames(table, upserts):
+            columns = list(frame.columns)
+            placeholders = ', '.join('?' for _ in columns)
+            updates = ', '.join(f'{col} = excluded.{col}' for col in columns if col != key)
+            self.conn.executemany(
+                f'INSERT INTO {sql_table} ({", ".join(columns)}) VALUES ({placeholders}) '
+                f'ON CONFLICT({key}) DO UPDATE SET {updates}',
+                sql_rows(frame)
+            )
+        self.store_hashes(table, upserts)
+        
+    def delete_rows(self, table, keys):
+        """Delete rows of a table (and their hashes) by primary key"""
+        key = TABLE_KEYS[table]
+        for sql_table in self.side_tables(table) + [table]:
+            self.conn.executemany(f'DELETE FROM {sql_table} WHERE {key} = ?', [(k,) for k in keys])
+        self.conn.executemany(
+            'DELETE FROM row_hashes WHERE table_name = ? AND row_key = ?',
+            [(table, k) for k in keys]
+        )
+        
+    def can_update_incrementally(self, data_path):
+        """Check the existing database has row hashes and the same columns as the CSVs"""
+        if not Path(self.db_path).exists():
+            return False
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if 'row_hashes' not in tables:
+                return False
+            if (SIDE_TABLES['passive_acoustic'] in tables) != (self.layout == 'sparse'):
+                return False
+            for table in TABLE_KEYS:
+                db_cols = set()
+                for sql_table in [table] + self.side_tables(table):
+                    db_cols |= {row[1] for row in conn.execute(f'PRAGMA table_info({sql_table})')}
+                csv_cols = set(pd.read_csv(data_path / f'{table}.csv', nrows=0).columns)
+                if not csv_cols <= db_cols:
+                    return False
+        finally:
+            conn.close()
+        
+        return True
         
     def print_statistics(self):
         """Print database statistics"""
@@ -183,9 +884,10 @@ class DatabaseBuilder:
             print(f"{table.upper():15s}: {count:5d} records")
         
         # Method distribution
-        cursor.execute("""
+        optimized = self.schema == 'optimized'
+        cursor.execute(f"""
             SELECT measurement_method, COUNT(*) as count 
-            FROM measurements 
+            FROM {'measurements JOIN measurement_methods USING (method_id)' if optimized else 'measurements'}
             GROUP BY measurement_method
             ORDER BY count DESC
         """)
@@ -195,9 +897,9 @@ class DatabaseBuilder:
             print(f"  {row[0]:20s}: {row[1]:5d}")
         
         # Countries
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT country, COUNT(*) as count 
-            FROM rivers 
+            FROM {'rivers JOIN countries USING (country_id)' if optimized else 'rivers'}
             GROUP BY country
             ORDER BY count DESC
         """)
@@ -225,45 +927,291 @@ class DatabaseBuilder:
         print("BUILDING BEDLOAD TRANSPORT DATABASE")
         print("="*60)
         
-        # Delete existing database
+        # Build into a temporary file: the existing database stays in place, readable,
+        # until the new one has passed its checks and is renamed over it
         db_file = Path(self.db_path)
-        if db_file.exists():
-            print(f"\n🗑️  Removing existing database: {self.db_path}")
-            db_file.unlink()
-        
-        # Connect to database
-        self.conn = sqlite3.connect(self.db_path)
+        building = build_path(self.db_path)
+        remove_database_file(building)
+        self.conn = sqlite3.connect(building)
         
         try:
+            start = time.perf_counter()
+            self.apply_load_pragmas()
+            
             # Create schema
-            self.create_schema()
+            with self.profiler.stage('schema'):
+                if self.schema == 'optimized':
+                    self.create_optimized_schema()
+                else:
+                    self.create_schema()
+            
+            # Load data in hierarchical order, in a single transaction
+            row_counts = {}
+            for table in TABLE_KEYS:
+                with self.profiler.stage(f'load {table}') as stage:
+                    size_before = self.database_bytes()
+                    row_counts[table] = self.load_table(table, data_path / f'{table}.csv')
+                    stage.add(rows=row_counts[table], bytes_written=self.database_bytes() - size_before)
+            n_rows = sum(row_counts.values())
+            with self.profiler.stage('indexes') as stage:
+                size_before = self.database_bytes()
+                self.create_indexes()
+                stage.add(bytes_written=self.database_bytes() - size_before)
+            with self.profiler.stage('hydraulics') as stage:
+                size_before = self.database_bytes()
+                n_derived = self.refresh_hydraulics()
+                stage.add(rows=n_derived, bytes_written=self.database_bytes() - size_before)
+            with self.profiler.stage('rating curves') as stage:
+                stage.add(rows=self.refresh_rating_curves(data_path))
+            if self.schema == 'optimized':
+                with self.profiler.stage('measurements_full') as stage:
+                    size_before = self.database_bytes()
+                    self.refresh_measurements_full()
+                    stage.add(rows=row_counts['measurements'], bytes_written=self.database_bytes() - size_before)
+            with self.profiler.stage('commit'):
+                self.conn.commit()
+            
+            elapsed = time.perf_counter() - start
+            print(f"\n⏱️  Loaded {n_rows} rows in {elapsed:.2f} s "
+                  f"({n_rows / elapsed:,.0f} rows/s, loader: {self.loader}, layout: {self.layout})")
+            peak = peak_memory_mb()
+            if peak is not None:
+                print(f"   Peak memory: {peak:.1f} MB")
             
-            # Load data in hierarchical order
-            self.load_rivers(data_path / 'rivers.csv')
-            self.load_sections(data_path / 'sections.csv')
-            self.load_campaigns(data_path / 'campaigns.csv')
-            self.load_measurements(data_path / 'measurements.csv')
+            with self.profiler.stage('check') as stage:
+                self.check_build(row_counts)
+                stage.add(rows=n_rows)
+            self.write_build_info('built_at')
+            self.conn.commit()
+            # Published in WAL mode: readers never block, nor wait for an incremental update
+            self.conn.execute('PRAGMA journal_mode = WAL')
             
             # Print statistics
             self.print_statistics()
+            self.conn.close()
+            self.conn = None
+            with self.profiler.stage('publish') as stage:
+                self.publish(building)
+                stage.add(bytes_written=db_file.stat().st_size)
             
             print(f"\n✅ Database built successfully: {self.db_path}")
             print(f"   Size: {db_file.stat().st_size / 1024:.1f} KB")
             
         except Exception as e:
             print(f"\n❌ ERROR building database: {e}")
+            print(f"   {self.db_path} was left unchanged")
             import traceback
             traceback.print_exc()
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+            remove_database_file(building)
             sys.exit(1)
         
         finally:
             if self.conn:
                 self.conn.close()
+    
+    def check_build(self, row_counts):
+        """Integrity and row-count checks of a freshly built database, before it is published"""
+        print("\n🩺 Checking the new database...")
+        problems = []
+        result = [row[0] for row in self.conn.execute('PRAGMA integrity_check')]
+        if result != ['ok']:
+            problems.append(f"integrity_check: {'; '.join(result[:5])}")
+        
+        # The R*Tree and FTS5 tables are missing when SQLite lacks their module
+        tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        expected = dict(row_counts)
+        if 'sections_rtree' in tables:
+            # Sections without coordinates have no entry
+            expected['sections_rtree'] = self.conn.execute(
+                'SELECT COUNT(*) FROM sections WHERE latitude IS NOT NULL AND longitude IS NOT NULL').fetchone()[0]
+        expected['measurement_hydraulics'] = row_counts['measurements']
+        if self.schema == 'optimized':
+            expected['measurements_full'] = row_counts['measurements']
+        for table, n_rows in expected.items():
+            actual = self.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            if actual != n_rows:
+                problems.append(f'{table} has {actual} rows, {n_rows} expected')
+        if 'search_index' in tables:
+            try:
+                self.conn.execute("INSERT INTO search_index(search_index) VALUES ('integrity-check')")
+            except sqlite3.DatabaseError as e:
+                problems.append(f'search_index: {e}')
+        
+        if problems:
+            raise RuntimeError(f"checks failed: {', '.join(problems)}")
+        print(f"  ✓ Integrity check passed, row counts match ({sum(row_counts.values())} rows)")
+        
+    def write_build_info(self, timestamp_key):
+        """Record a new generation in build_info, with the time (built_at or updated_at),
+        schema, layout and row counts; readers compare generations to know they must reopen"""
+        self.conn.execute('CREATE TABLE IF NOT EXISTS build_info (key TEXT PRIMARY KEY, value TEXT)')
+        info = {
+            'generation': uuid.uuid4().hex,
+            timestamp_key: datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'schema': self.schema,
+            'layout': self.layout,
+        }
+        for table in TABLE_KEYS:
+            info[f'rows_{table}'] = self.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        self.conn.executemany('INSERT OR REPLACE INTO build_info (key, value) VALUES (?, ?)',
+                              [(key, str(value)) for key, value in info.items()])
+        
+    def publish(self, building):
+        """Rename the checked build over db_path
+        
+        The rename itself is atomic: a reader opening db_path gets either the old file or
+        the new one, never a partial one. The old database's WAL is first checkpointed and
+        truncated, so the -wal name the new file inherits is empty; if readers keep that
+        from completing, publishing is aborted and the old database stays in place.
+        Connections left open across the rename still see the old file and must reopen
+        it (queries.GenerationWatcher tells them when).
+        """
+        db_file = Path(self.db_path)
+        fsync_path(building)
+        if db_file.exists():
+            self.checkpoint_old_database(db_file)
+        os.replace(building, db_file)
+        fsync_path(db_file.parent)
+        
+    def checkpoint_old_database(self, db_file):
+        """Fold the WAL of the database about to be replaced back into it and truncate it,
+        retrying while readers hold it; raises RuntimeError if it stays busy"""
+        conn = sqlite3.connect(db_file, timeout=PUBLISH_BUSY_TIMEOUT)
+        try:
+            for attempt in range(PUBLISH_RETRIES):
+                busy, log_frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+                # A database not in WAL mode reports (0, -1, -1): nothing to fold back
+                if not busy and log_frames == checkpointed:
+                    return
+                time.sleep(PUBLISH_RETRY_DELAY * (attempt + 1))
+        finally:
+            conn.close()
+        raise RuntimeError(f"readers kept {db_file}-wal busy during {PUBLISH_RETRIES} checkpoint "
+                           f"attempts ({checkpointed}/{log_frames} frames checkpointed): not published")
+
+    def build_incremental(self, data_dir='data'):
+        """Update an existing database in place, touching only rows whose content changed"""
+        data_path = Path(data_dir)
+        
+        if self.schema == 'optimized':
+            # measurements_full and the lookup ids are rebuilt as a whole
+            print("ℹ️  --incremental is not supported with the optimized schema - running a full build")
+            self.build(data_dir)
+            return
+        
+        if not self.can_update_incrementally(data_path):
+            print("ℹ️  No compatible database to update incrementally - running a full build")
+            self.build(data_dir)
+            return
+        
+        print("="*60)
+        print("UPDATING BEDLOAD TRANSPORT DATABASE (incremental)")
+        print("="*60)
+        
+        start = time.perf_counter()
+        self.conn = sqlite3.connect(self.db_path)
+        # WAL: readers keep their snapshot while the update is written (and databases
+        # built before WAL publishing switch to it)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        
+        try:
+            # Diff every table before writing anything
+            diffs = {}
+            for table in TABLE_KEYS:
+                with self.profiler.stage(f'diff {table}') as stage:
+                    df = read_table(data_path / f'{table}.csv', table)
+                    diffs[table] = self.diff_table(table, df)
+                    stage.add(rows=len(df))
+            
+            # Compared with the stored rows before they are overwritten
+            hydraulics_changes = self.hydraulics_changes(diffs)
+            rating_curve_campaigns = self.rating_curve_campaigns(diffs)
+            
+            # Single transaction: deletions child-first, upserts parent-first
+            with self.profiler.stage('apply changes') as stage:
+                for table in reversed(list(TABLE_KEYS)):
+                    self.delete_rows(table, diffs[table][2])
+                for table in TABLE_KEYS:
+                    self.apply_diff(table, diffs[table][0], diffs[table][1])
+                # Counted from the diffs: total_changes also includes the key-table inserts
+                changed_rows = sum(len(new_df) + len(changed_df) + len(deleted)
+                                   for new_df, changed_df, deleted in diffs.values())
+                stage.add(rows=changed_rows)
+            
+            # Databases built before the spatial and search indexes existed get them now
+            existing = {row[0] for row in self.conn.execute('SELECT name FROM sqlite_master')}
+            if 'sections_rtree' not in existing:
+                self.create_spatial_index()
+            if 'search_index' not in existing:
+                self.create_search_index()
+            # Derived columns depend on the measurement and its section: only the measurements
+            # whose inputs changed are recomputed (all of them for databases built before
+            # the table existed)
+            if 'measurement_hydraulics' not in existing:
+                with self.profiler.stage('hydraulics') as stage:
+                    stage.add(rows=self.refresh_hydraulics())
+            elif any(hydraulics_changes.values()):
+                with self.profiler.stage('hydraulics') as stage:
+                    stage.add(rows=self.refresh_hydraulics(self.hydraulics_dependents(hydraulics_changes)))
+            # Only the sums of the campaigns whose measurements changed are recomputed; the
+            # curves are regrouped from the stored sums (campaigns and sections may have moved)
+            if 'rating_curve_cells' not in existing:
+                with self.profiler.stage('rating curves') as stage:
+                    stage.add(rows=self.refresh_rating_curves(data_path))
+            elif changed_rows:
+                with self.profiler.stage('rating curves') as stage:
+                    stage.add(rows=self.refresh_rating_curves(data_path, rating_curve_campaigns))
+            # New generation only if something changed, so readers' caches stay valid otherwise
+            derived = {'measurement_hydraulics', 'rating_curve_cells', 'build_info'}
+            if changed_rows or not derived <= existing:
+                self.write_build_info('updated_at')
+            self.conn.commit()
+            
+            print("\n📝 Changes applied:")
+            for table, (new_df, changed_df, deleted) in diffs.items():
+                print(f"  {table:15s}: +{len(new_df)} inserted, ~{len(changed_df)} updated, -{len(deleted)} deleted")
+            
+            print(f"\n✅ Database updated in {time.perf_counter() - start:.2f} s: {self.db_path}")
+            
+        except Exception as e:
+            self.conn.rollback()
+            print(f"\n❌ ERROR updating database (no changes written): {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
+        
+        finally:
+            self.conn.close()
 
 def main():
     """Main function"""
-    builder = DatabaseBuilder('bedload_transport.db')
-    builder.build('data')
+    parser = argparse.ArgumentParser(description='Build SQLite database from CSV files')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only insert/update/delete rows whose content changed since the last build')
+    parser.add_argument('--loader', choices=['bulk', 'pandas'], default='bulk',
+                        help='bulk: chunked executemany (default); pandas: whole-file DataFrame.to_sql')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'rows per insert batch for the bulk loader (default: {CHUNK_SIZE})')
+    parser.add_argument('--schema', choices=['standard', 'optimized'], default='standard',
+                        help='optimized: STRICT tables, lookup tables, integer dates, covering indexes '
+                             'and a materialized measurements_full join')
+    parser.add_argument('--layout', choices=['wide', 'sparse'], default='wide',
+                        help='sparse: method-specific measurement columns in one side table per method, '
+                             'rejoined by the measurements_wide view')
+    add_profile_arguments(parser, 'build_profile.json')
+    args = parser.parse_args()
+    profiler, trace_path = profiler_from_args(args, 'build_database', 'build_profile.json')
+    
+    builder = DatabaseBuilder('bedload_transport.db', loader=args.loader, chunk_size=args.chunk_size,
+                              schema=args.schema, layout=args.layout, profiler=profiler)
+    if args.incremental:
+        builder.build_incremental('data')
+    else:
+        builder.build('data')
+    profiler.finish(trace_path)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Columnar exports (Parquet and Arrow IPC) of the joined dataset and the base tables
+
+Written to api/columnar/ by generate_api.py when pyarrow is installed
+(pip install pyarrow). Low-cardinality text columns are dictionary encoded and the
+rows are sorted by river_id, section_id and campaign_date, so the row-group
+statistics let readers skip whole row groups when filtering on those columns.
+
+Files are written under a temporary name and renamed when complete; a file whose new
+content is identical to the one on disk is left untouched, as json_writer.py does.
+"""
+
+import hashlib
+import os
+import pandas as pd
+
+from dataset import widen_float32
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+    pq = None
+
+COLUMNAR_DIR = 'columnar'
+
+# Rows per Parquet row group
+ROW_GROUP_SIZE = 131072
+
+# Sort order of the exported rows (columns missing from a table are skipped)
+SORT_COLUMNS = ['river_id', 'section_id', 'campaign_date', 'campaign_id', 'measurement_id']
+
+# Text columns stored as dictionaries (few distinct values, repeated on many rows)
+DICTIONARY_COLUMNS = [
+    'country', 'river_id', 'river_name', 'section_id', 'section_name', 'morphology_type',
+    'campaign_id', 'data_provider', 'contact_email', 'reference',
+    'measurement_method', 'discharge_source', 'discharge_station_code', 'discharge_station_name',
+    'acoustic_hydrophone_type', 'acoustic_recorder_type', 'acoustic_calibration',
+    'adcp_type', 'adcp_equation_type', 'sampler_type',
+    'dune_survey_method', 'dune_echosounder_type', 'dune_equation_type',
+]
+
+
+def available():
+    return pa is not None
+
+
+def arrow_table(df):
+    """Sorted Arrow table of a typed frame: dictionary-encoded text, date32 dates, float64 values"""
+    sort_columns = [col for col in SORT_COLUMNS if col in df.columns]
+    df = df.sort_values(sort_columns, kind='stable', na_position='last') if sort_columns else df
+
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == 'float32':
+            series = widen_float32(series)
+        elif col in DICTIONARY_COLUMNS and not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype('category')
+        columns[col] = series
+
+    table = pa.Table.from_pandas(pd.DataFrame(columns), preserve_index=False)
+
+    # Calendar dates, not nanosecond timestamps
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.date32()))
+    return table
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def publish(tmp_path, path, relative_path, rows):
+    """Move a completely written temporary file to path, unless path already holds the
+    same bytes (then left untouched), and return its manifest entry"""
+    size = tmp_path.stat().st_size
+    digest = file_digest(tmp_path)
+    if path.exists() and path.stat().st_size == size and file_digest(path) == digest:
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    return {'path': relative_path, 'rows': rows, 'bytes': size, 'sha256': digest}
+
+
+def write_columnar(api_dir, frames):
+    """Write {name: typed DataFrame} as api/columnar/<name>.parquet and <name>.arrow
+
+    Returns {name: {'parquet': entry, 'arrow': entry}} for the manifest.
+    """
+    out_dir = api_dir / COLUMNAR_DIR
+    out_dir.mkdir(exist_ok=True)
+
+    entries = {}
+    for name, df in frames.items():
+        table = arrow_table(df)
+        entries[name] = {}
+        for kind in ['parquet', 'arrow']:
+            path = out_dir / f'{name}.{kind}'
+            tmp_path = path.with_name(f'.{path.name}.tmp')
+            try:
+                if kind == 'parquet':
+                    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE, compression='zstd',
+                                   use_dictionary=[col for col in table.column_names
+                                                   if col in DICTIONARY_COLUMNS],
+                                   write_statistics=True)
+                else:
+                    # Arrow IPC file, uncompressed so readers can memory-map it
+                    with pa.OSFile(str(tmp_path), 'wb') as sink:
+                        with pa.ipc.new_file(sink, table.schema) as writer:
+                            writer.write_table(table, max_chunksize=ROW_GROUP_SIZE)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+            entries[name][kind] = publish(tmp_path, path, f'{COLUMNAR_DIR}/{name}.{kind}', table.num_rows)
+    return entries
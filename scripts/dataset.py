@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Typed loader for the database CSV files, shared by validate.py, build_database.py
+and generate_api.py
+
+Every table is parsed with an explicit dtype schema and the parsed frame is kept in a
+binary cache (data/.cache/<table>.pkl), invalidated by the CSV modification time and
+size, so a validate -> build -> publish run parses each file only once.
+"""
+
+import io
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+TABLES = ['rivers', 'sections', 'campaigns', 'measurements']
+
+# Bump when SCHEMA changes so stale caches are ignored
+SCHEMA_VERSION = 1
+
+CACHE_DIR_NAME = '.cache'
+
+# Explicit dtypes. float32 is only used for descriptive values with few significant
+# digits (areas, elevations, widths, durations); measured quantities stay float64.
+SCHEMA = {
+    'rivers': {
+        'river_id': str,
+        'river_name': str,
+        'country': 'category',
+        'watershed_area_km2': 'float32',
+        'notes': str,
+    },
+    'sections': {
+        'section_id': str,
+        'river_id': str,
+        'section_name': str,
+        'latitude': 'float64',
+        'longitude': 'float64',
+        'elevation_m': 'float32',
+        'bankfull_width_m': 'float32',
+        'channel_slope': 'float64',
+        'morphology_type': 'category',
+        'notes': str,
+    },
+    'campaigns': {
+        'campaign_id': str,
+        'section_id': str,
+        'campaign_date': str,
+        'data_provider': str,
+        'contact_email': str,
+        'reference': str,
+        'notes': str,
+    },
+    'measurements': {
+        'measurement_id': str,
+        'campaign_id': str,
+        'measurement_method': 'category',
+        'bedload_rate_total_kg_s': 'float64',
+        'discharge_m3_s': 'float64',
+        'discharge_source': 'category',
+        'discharge_station_code': str,
+        'discharge_station_name': str,
+        'd50_mm': 'float64',
+        'd84_mm': 'float64',
+        'd10_mm': 'float64',
+        'water_depth_mean_m': 'float64',
+        'flow_velocity_mean_m_s': 'float64',
+        'acoustic_hydrophone_type': 'category',
+        'acoustic_recorder_type': 'category',
+        'acoustic_sensitivity_db': 'float32',
+        'acoustic_calibration': 'category',
+        'acoustic_calibration_a': 'float64',
+        'acoustic_calibration_b': 'float64',
+        'adcp_type': 'category',
+        'adcp_equation_type': 'category',
+        'adcp_measurement_duration_s': 'float32',
+        'sampler_type': 'category',
+        'dune_survey_method': 'category',
+        'dune_echosounder_type': 'category',
+        'dune_equation_type': 'category',
+        'dune_interval_hours': 'float32',
+    },
+}
+
+# Method-specific columns of measurements.csv
+METHOD_COLUMNS = {
+    'passive_acoustic': ['acoustic_hydrophone_type', 'acoustic_recorder_type',
+                         'acoustic_sensitivity_db', 'acoustic_calibration',
+                         'acoustic_calibration_a', 'acoustic_calibration_b'],
+    'active_acoustic': ['adcp_type', 'adcp_equation_type', 'adcp_measurement_duration_s'],
+    'physical_sampler': ['sampler_type'],
+    'dune_tracking': ['dune_survey_method', 'dune_echosounder_type',
+                      'dune_equation_type', 'dune_interval_hours'],
+}
+
+# Date columns, stored as YYYY-MM-DD in the CSVs (unparseable values become NaT)
+DATE_COLUMNS = {
+    'campaigns': ['campaign_date'],
+}
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def table_name(csv_path):
+    """Table name of a CSV file (data/rivers.csv -> rivers)"""
+    return Path(csv_path).stem
+
+
+def parse_dates(df, table):
+    """Convert the date columns of a freshly read table to datetime64"""
+    for col in DATE_COLUMNS.get(table, []):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format=DATE_FORMAT, errors='coerce')
+    return df
+
+
+def read_csv_typed(csv_path, table=None, **kwargs):
+    """Parse a CSV with the table's dtype schema (no cache); extra kwargs go to read_csv"""
+    table = table or table_name(csv_path)
+    result = pd.read_csv(csv_path, dtype=SCHEMA.get(table), **kwargs)
+    if isinstance(result, pd.DataFrame):
+        return parse_dates(result, table)
+    # chunksize/iterator: parse dates chunk by chunk
+    return (parse_dates(chunk, table) for chunk in result)
+
+
+def numeric_columns(table):
+    """Numeric columns of a table's schema"""
+    return [col for col, dtype in SCHEMA.get(table, {}).items() if dtype in ('float32', 'float64')]
+
+
+def lenient_dtypes(table):
+    """The table's schema with its numeric columns read as text"""
+    numeric = numeric_columns(table)
+    return {col: str if col in numeric else dtype for col, dtype in SCHEMA.get(table, {}).items()}
+
+
+def coerce_numbers(df, table):
+    """Convert the numeric columns of a frame read with lenient_dtypes to their schema dtypes,
+    in place: values that are not numbers become NaN. Returns {column: positions of those rows}"""
+    invalid = {}
+    for col in numeric_columns(table):
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors='coerce')
+        bad = (df[col].notna() & values.isna()).to_numpy()
+        if bad.any():
+            invalid[col] = np.flatnonzero(bad)
+        df[col] = values.astype(SCHEMA[table][col])
+    return invalid
+
+
+def read_csv_lenient(csv_path, table=None, **kwargs):
+    """Parse a CSV like read_csv_typed, except that a value that is not a number in a numeric
+    column becomes NaN instead of failing the whole parse (for the validator, which reports
+    it): returns (df, {column: row positions of such values})"""
+    table = table or table_name(csv_path)
+    df = pd.read_csv(csv_path, dtype=lenient_dtypes(table), **kwargs)
+    invalid = coerce_numbers(df, table)
+    return parse_dates(df, table), invalid
+
+
+def cache_path(csv_path):
+    """Location of the parse cache of a CSV file"""
+    csv_path = Path(csv_path)
+    return csv_path.parent / CACHE_DIR_NAME / f'{csv_path.stem}.pkl'
+
+
+def source_signature(csv_path):
+    """(mtime, size) of a CSV file, used to invalidate its cache"""
+    stat = Path(csv_path).stat()
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def read_cached(csv_path):
+    """Return the cached frame of a CSV file, or None if missing or stale"""
+    path = cache_path(csv_path)
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'rb') as f:
+            cached = pickle.load(f)
+    except Exception:
+        return None
+    if cached.get('version') != SCHEMA_VERSION or cached.get('source') != source_signature(csv_path):
+        return None
+    return cached['frame']
+
+
+def write_cache(csv_path, df):
+    """Store a parsed frame in the cache (best effort: a read-only tree just stays uncached)"""
+    path = cache_path(csv_path)
+    try:
+        path.parent.mkdir(exist_ok=True)
+        # Per-process name: concurrent stages (scripts/pipeline.py) may write the same cache
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': SCHEMA_VERSION, 'source': source_signature(csv_path), 'frame': df},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+    except OSError:
+        pass
+
+
+def read_table(csv_path, table=None, use_cache=True):
+    """Load one CSV as a typed DataFrame, from the parse cache when it is fresh"""
+    if use_cache:
+        df = read_cached(csv_path)
+        if df is not None:
+            return df
+
+    df = read_csv_typed(csv_path, table)
+    if use_cache:
+        write_cache(csv_path, df)
+    return df
+
+
+def iter_table_chunks(csv_path, chunksize, table=None):
+    """Yield a typed table in chunks: slices of the cached frame, or streamed from the CSV"""
+    df = read_cached(csv_path)
+    if df is None:
+        yield from read_csv_typed(csv_path, table, chunksize=chunksize)
+        return
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def csv_byte_ranges(csv_path, target_bytes, block_size=1 << 20):
+    """Split the data rows of a CSV into (start, end) byte ranges of about target_bytes
+
+    Ranges end on a newline outside quoted fields, so each one parses on its own.
+    """
+    ranges = []
+    with open(csv_path, 'rb') as f:
+        start = len(f.readline())
+        position = start
+        in_quotes = False
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            offset = 0
+            while offset < len(block):
+                # Jump ahead until the current range reaches its target size
+                target = start + target_bytes - position
+                if offset < target:
+                    skip = min(len(block), target)
+                    in_quotes ^= block.count(b'"', offset, skip) % 2 == 1
+                    offset = skip
+                    continue
+                newline = block.find(b'\n', offset)
+                if newline < 0:
+                    in_quotes ^= block.count(b'"', offset) % 2 == 1
+                    break
+                in_quotes ^= block.count(b'"', offset, newline) % 2 == 1
+                offset = newline + 1
+                if not in_quotes:
+                    ranges.append((start, position + offset))
+                    start = position + offset
+            position += len(block)
+    if position > start:
+        ranges.append((start, position))
+    return ranges
+
+
+def read_csv_range(csv_path, start, end, columns, table=None, lenient=False):
+    """Parse the data rows of a CSV between two byte offsets (from csv_byte_ranges)
+
+    lenient: parsed as read_csv_lenient does, and (df, {column: row positions of values
+    that are not numbers}) is returned.
+    """
+    table = table or table_name(csv_path)
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if lenient:
+        return read_csv_lenient(io.BytesIO(data), table, header=None, names=columns)
+    df = pd.read_csv(io.BytesIO(data), header=None, names=columns, dtype=SCHEMA.get(table))
+    return parse_dates(df, table)
+
+
+def read_csv_lines(csv_path, lines, columns, chunksize=500000):
+    """Rows of a CSV at some sorted line numbers (the first data row is line 2, one line
+    per row), restricted to columns read as text; streamed, so memory is bounded by
+    chunksize"""
+    lines = np.asarray(lines, dtype='int64')
+    parts = []
+    first_line = 2
+    for chunk in pd.read_csv(csv_path, usecols=columns, dtype=str, chunksize=chunksize):
+        wanted = lines[(lines >= first_line) & (lines < first_line + len(chunk))]
+        if len(wanted) > 0:
+            parts.append(chunk.iloc[wanted - first_line])
+        first_line += len(chunk)
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(parts, ignore_index=True)
+
+
+def load_dataset(data_dir='data', use_cache=True):
+    """Load the four tables of a data directory as {table: DataFrame}"""
+    data_path = Path(data_dir)
+    return {table: read_table(data_path / f'{table}.csv', table, use_cache) for table in TABLES}
+
+
+def row_hashes(df):
+    """Content hash of every row, as signed 64-bit integers (storable in SQLite)"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy().view('int64')
+
+
+def widen_float32(series):
+    """float32 column as float64 through its shortest decimal representation (0.1 stays 0.1)"""
+    return series.astype(str).astype('float64')
+
+
+def plain_frame(df):
+    """Copy of a typed frame with plain values for SQLite/JSON output
+
+    Dates become YYYY-MM-DD strings, float32 columns are widened to float64 through
+    their shortest decimal representation (so 0.1 stays 0.1) and categoricals become
+    plain values. Missing values stay NaN.
+    """
+    out = df.copy()
+    for col in out.columns:
+        series = out[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            out[col] = series.dt.strftime(DATE_FORMAT).astype(object)
+        elif series.dtype == 'float32':
+            out[col] = widen_float32(series)
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            out[col] = series.astype(object)
+    return out
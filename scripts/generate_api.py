@@ -4,115 +4,286 @@ Génère des fichiers JSON statiques pour simuler une API REST
 Usage: python generate_api.py
 """
 
+import argparse
+import numpy as np
 import pandas as pd
-import json
+import re
 from pathlib import Path
 
-def generate_api_files():
-    """Génère des fichiers JSON statiques à partir des CSV"""
-    
-    # Chemins
-    data_dir = Path('data')
-    api_dir = Path('api')
-    api_dir.mkdir(exist_ok=True)
+from dataset import load_dataset, plain_frame
+from json_writer import JsonWriter, JsonWriterOptions, RecordEncoder, brotli
+from profiling import NULL_PROFILER, add_profile_arguments, profiler_from_args
+import api_snapshot
+import columnar_export
+import hydraulics
+import rating_curves
+import rollup
+import tiles
+
+API_URL = 'https://geomorphbars.github.io/Global_Bedload_Observatory/api'
+
+# Partitions de all.json : dossier -> colonne de partition
+SHARDS = {
+    'by_country': 'country',
+    'by_river': 'river_id',
+    'by_section': 'section_id',
+}
+
+
+def write_json(api_dir, relative_path, data, options):
+    """Écrit une valeur JSON et retourne son entrée de manifeste (lignes, octets, sha256)"""
+    with JsonWriter(api_dir / relative_path, options) as writer:
+        writer.write_value(data)
+    return {'path': relative_path, **writer.entry}
+
+
+def write_frame_json(api_dir, relative_path, df, options):
+    """Écrit les lignes d'un DataFrame en flux (par lots) et retourne son entrée de manifeste"""
+    with JsonWriter(api_dir / relative_path, options) as writer:
+        writer.write_frame(df)
+    return {'path': relative_path, **writer.entry}
+
+
+def write_records_json(api_dir, name, df, options, changes, changed, encoder=None):
+    """Écrit l'endpoint name (lignes de df) en copiant les enregistrements inchangés depuis
+    la génération précédente ; un fichier inchangé n'est pas réécrit
     
-    print("🔄 Chargement des CSV...")
+    encoder (json_writer.RecordEncoder de df) garde les enregistrements sérialisés pour
+    les autres fichiers qui les contiennent. Retourne (entrée de manifeste, positions de
+    fin des enregistrements).
+    """
+    path = api_dir / f'{name}.json'
+    reuse = changes.reuse(name, path)
+    if not changed and reuse is not None:
+        return changes.old_entry('endpoints', name), reuse[1]
+    with JsonWriter(path, options, record_ends=True) as writer:
+        writer.write_frame(df, reuse=reuse, encoder=encoder)
+    return {'path': f'{name}.json', **writer.entry}, np.frombuffer(writer.record_ends, dtype='int64')
+
+
+def add_entries(stage, entries):
+    """Ajoute à une étape du profil les lignes et octets des entrées de manifeste écrites"""
+    for entry in entries:
+        stage.add(entry.get('rows'), entry['bytes'])
+
+
+def shard_filename(key):
+    """Nom de fichier d'une partition (caractères hors [A-Za-z0-9_.-] remplacés par _)"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(key)) + '.json'
+
+
+def write_shards(api_dir, full_data, options, profiler=NULL_PROFILER, changes=None, encoder=None):
+    """Écrit all.json partitionné par pays, rivière et section
     
-    # Charger CSV
-    rivers = pd.read_csv(data_dir / 'rivers.csv')
-    sections = pd.read_csv(data_dir / 'sections.csv')
-    campaigns = pd.read_csv(data_dir / 'campaigns.csv')
-    measurements = pd.read_csv(data_dir / 'measurements.csv')
+    Retourne {dossier: {clé: entrée de manifeste}}. Les partitions dont la clé a
+    disparu sont supprimées. Avec changes (api_snapshot.ChangeSet), seules les
+    partitions touchées par une ligne ajoutée, modifiée ou supprimée sont réécrites.
+    Chaque ligne est sérialisée une seule fois (encoder, partagé avec all.json), puis
+    recopiée dans ses trois partitions.
+    """
+    encoder = encoder or RecordEncoder(full_data, options)
+    shards = {}
+    for folder, column in SHARDS.items():
+        (api_dir / folder).mkdir(exist_ok=True)
+        entries = {}
+        with profiler.stage(f'{folder}/') as stage:
+            for key, positions in full_data.groupby(column, sort=True, observed=True).indices.items():
+                old = changes.old_entry('shards', folder, key) if changes else None
+                if old is not None and not changes.shard_touched(column, key) and (api_dir / old['path']).exists():
+                    entries[key] = old
+                    continue
+                relative_path = f'{folder}/{shard_filename(key)}'
+                with JsonWriter(api_dir / relative_path, options) as writer:
+                    writer.write_rows(encoder, positions)
+                entries[key] = {'path': relative_path, **writer.entry}
+                add_entries(stage, [entries[key]])
+        
+        # Supprimer les partitions obsolètes
+        current = {shard_filename(key) for key in entries}
+        for stale in (api_dir / folder).glob('*.json*'):
+            if stale.name.split('.json')[0] + '.json' not in current:
+                stale.unlink()
+        
+        shards[folder] = entries
+    return shards
+
+
+def write_tiles(api_dir, sections, section_stats, options):
+    """Écrit la pyramide de tuiles des sections (tiles/{z}/{x}/{y}.json) et tiles/index.json
     
-    print(f"  ✓ {len(rivers)} rivières")
-    print(f"  ✓ {len(sections)} sections")
-    print(f"  ✓ {len(campaigns)} campagnes")
-    print(f"  ✓ {len(measurements)} mesures")
+    Retourne {'z/x/y': entrée de manifeste}. Les tuiles qui ne contiennent plus de
+    section sont supprimées.
+    """
+    tiles_dir = api_dir / 'tiles'
+    entries = {}
+    for (z, x, y), tile in tiles.build_tiles(sections, section_stats).items():
+        (tiles_dir / str(z) / str(x)).mkdir(parents=True, exist_ok=True)
+        entries[f'{z}/{x}/{y}'] = write_json(api_dir, tiles.tile_path(z, x, y), tile, options)
     
-    print("\n📝 Génération des fichiers JSON...")
+    # Supprimer les tuiles obsolètes
+    current = {api_dir / entry['path'] for entry in entries.values()}
+    for stale in tiles_dir.glob('*/*/*.json*'):
+        if stale.with_name(stale.name.split('.json')[0] + '.json') not in current:
+            stale.unlink()
+    for folder in sorted(tiles_dir.glob('*/*'), reverse=True) + sorted(tiles_dir.glob('*'), reverse=True):
+        if folder.is_dir() and not any(folder.iterdir()):
+            folder.rmdir()
     
-    # 1. all.json - Toutes les données jointes
-    print("  → all.json (toutes données)")
-    full_data = measurements.merge(campaigns, on='campaign_id', how='left')
-    full_data = full_data.merge(sections, on='section_id', how='left')
-    full_data = full_data.merge(rivers, on='river_id', how='left')
+    index = {
+        'scheme': 'xyz',
+        'min_zoom': tiles.MIN_ZOOM,
+        'detail_zoom': tiles.DETAIL_ZOOM,
+        'cluster_grid': tiles.CLUSTER_GRID,
+        'url': f'{API_URL}/tiles/{{z}}/{{x}}/{{y}}.json',
+        'tiles': list(entries)
+    }
+    entries['index'] = write_json(api_dir, 'tiles/index.json', index, options)
+    return entries
+
+
+def adjacency(df, key, value):
+    """{clé: [valeurs]} pour chaque valeur de key (ordre des lignes, lignes incomplètes ignorées)"""
+    valid = df[[key, value]].dropna()
+    values = valid[value].astype(object).to_numpy()
+    return {str(k): values[positions].tolist()
+            for k, positions in valid.groupby(key, sort=True, observed=True).indices.items()}
+
+
+def build_filter_index(rivers, sections, campaigns, measurements):
+    """Index des filtres en cascade de l'explorateur (pays → rivière → section → méthode, dates)
     
-    # Nettoyer NaN
-    full_data = full_data.where(pd.notnull(full_data), None)
+    - listes d'adjacence pays → rivières → sections → campagnes, et campagne → positions
+      des mesures (numéro de ligne de données de measurements.csv / measurements.json)
+    - par section : masque de bits des méthodes présentes (bit i = methods[i]) et
+      campagnes par année
+    """
+    methods = sorted(measurements['measurement_method'].dropna().astype(str).unique())
     
-    with open(api_dir / 'all.json', 'w') as f:
-        json.dump(full_data.to_dict('records'), f, indent=2)
+    # Positions des mesures par campagne
+    campaign_measurements = {str(k): positions.tolist() for k, positions
+                             in measurements.groupby('campaign_id', sort=True, observed=True).indices.items()}
     
-    # 2. rivers.json
-    print("  → rivers.json")
-    rivers_clean = rivers.where(pd.notnull(rivers), None)
-    with open(api_dir / 'rivers.json', 'w') as f:
-        json.dump(rivers_clean.to_dict('records'), f, indent=2)
+    # Méthodes présentes dans chaque section
+    located = measurements[['campaign_id', 'measurement_method']].merge(
+        campaigns[['campaign_id', 'section_id']], on='campaign_id', how='inner')
+    pairs = located[['section_id', 'measurement_method']].dropna().astype(str).drop_duplicates()
+    bits = pairs['measurement_method'].map({m: 1 << i for i, m in enumerate(methods)})
+    section_methods = {str(k): int(v) for k, v in bits.groupby(pairs['section_id'], sort=True).sum().items()}
     
-    # 3. sections.json  
-    print("  → sections.json")
-    sections_clean = sections.where(pd.notnull(sections), None)
-    with open(api_dir / 'sections.json', 'w') as f:
-        json.dump(sections_clean.to_dict('records'), f, indent=2)
+    # Campagnes par section et par année
+    dated = campaigns[['section_id', 'campaign_id']].assign(year=campaigns['campaign_date'].dt.year)
+    section_years = {}
+    for (section_id, year), group in dated.dropna().groupby(['section_id', 'year'], sort=True):
+        section_years.setdefault(str(section_id), {})[str(int(year))] = group['campaign_id'].tolist()
     
-    # 4. measurements.json
-    print("  → measurements.json")
-    measurements_clean = measurements.where(pd.notnull(measurements), None)
-    with open(api_dir / 'measurements.json', 'w') as f:
-        json.dump(measurements_clean.to_dict('records'), f, indent=2)
+    return {
+        'version': 1,
+        'counts': {
+            'rivers': len(rivers),
+            'sections': len(sections),
+            'campaigns': len(campaigns),
+            'measurements': len(measurements)
+        },
+        'methods': methods,
+        'country_rivers': adjacency(rivers, 'country', 'river_id'),
+        'river_sections': adjacency(sections, 'river_id', 'section_id'),
+        'section_campaigns': adjacency(campaigns, 'section_id', 'campaign_id'),
+        'campaign_measurements': campaign_measurements,
+        'section_methods': section_methods,
+        'section_years': section_years
+    }
+
+
+def full_join(rivers, sections, campaigns, measurements):
+    """Jointure mesures → campagnes → sections → rivières (lignes de all.json)"""
+    full_data = measurements.merge(campaigns, on='campaign_id', how='left')
+    full_data = full_data.merge(sections, on='section_id', how='left')
+    return full_data.merge(rivers, on='river_id', how='left')
+
+
+def build_summaries(cube, rivers):
+    """Résumés dérivés du cube d'agrégats : {nom de l'endpoint: DataFrame}"""
+    flux = 'bedload_rate_total_kg_s'
+    summaries = {}
     
     # 5. summary_by_country.json
-    print("  → summary_by_country.json")
-    by_country = full_data.groupby('country').agg({
-        'measurement_id': 'count',
-        'bedload_rate_total_kg_s': ['mean', 'min', 'max'],
-        'discharge_m3_s': 'mean',
-        'river_id': 'nunique'
-    }).reset_index()
-    
-    by_country.columns = ['country', 'n_measurements', 'avg_flux', 'min_flux', 'max_flux', 'avg_discharge', 'n_rivers']
-    by_country = by_country.round(4)
-    by_country = by_country.where(pd.notnull(by_country), None)
-    
-    with open(api_dir / 'summary_by_country.json', 'w') as f:
-        json.dump(by_country.to_dict('records'), f, indent=2)
+    by_country = rollup.rollup(cube, ['country'], distinct=['river_id'])
+    by_country = pd.DataFrame({
+        'country': by_country['country'],
+        'n_measurements': by_country['n_measurements'],
+        'avg_flux': rollup.mean(by_country, flux),
+        'min_flux': by_country[f'{flux}_min'],
+        'max_flux': by_country[f'{flux}_max'],
+        'avg_discharge': rollup.mean(by_country, 'discharge_m3_s'),
+        'n_rivers': by_country['n_river_id']
+    }).round(4)
+    summaries['summary_by_country'] = by_country
     
     # 6. summary_by_method.json
-    print("  → summary_by_method.json")
-    by_method = measurements.groupby('measurement_method').agg({
-        'measurement_id': 'count',
-        'bedload_rate_total_kg_s': ['mean', 'min', 'max'],
-        'discharge_m3_s': 'mean',
-        'd50_mm': 'mean'
-    }).reset_index()
+    by_method = rollup.rollup(cube, ['measurement_method'])
+    by_method = pd.DataFrame({
+        'method': by_method['measurement_method'],
+        'n_measurements': by_method['n_measurements'],
+        'avg_flux': rollup.mean(by_method, flux),
+        'min_flux': by_method[f'{flux}_min'],
+        'max_flux': by_method[f'{flux}_max'],
+        'avg_discharge': rollup.mean(by_method, 'discharge_m3_s'),
+        'avg_d50': rollup.mean(by_method, 'd50_mm')
+    }).round(4)
+    summaries['summary_by_method'] = by_method
     
-    by_method.columns = ['method', 'n_measurements', 'avg_flux', 'min_flux', 'max_flux', 'avg_discharge', 'avg_d50']
-    by_method = by_method.round(4)
-    by_method = by_method.where(pd.notnull(by_method), None)
+    # 7. summary_by_river.json
+    by_river = rollup.rollup(cube, ['river_id', 'country'], distinct=['section_id'])
+    by_river = by_river.merge(rivers[['river_id', 'river_name']].dropna(), on='river_id')
+    by_river = pd.DataFrame({
+        'river_id': by_river['river_id'],
+        'river_name': by_river['river_name'],
+        'country': by_river['country'],
+        'n_measurements': by_river['n_measurements'],
+        'n_sections': by_river['n_section_id'],
+        'avg_flux': rollup.mean(by_river, flux),
+        'min_flux': by_river[f'{flux}_min'],
+        'max_flux': by_river[f'{flux}_max'],
+        'first_date': by_river['first_date'],
+        'last_date': by_river['last_date']
+    }).sort_values(['river_id', 'river_name'], kind='stable')
+    by_river = plain_frame(by_river).round(4)
+    summaries['summary_by_river'] = by_river
     
-    with open(api_dir / 'summary_by_method.json', 'w') as f:
-        json.dump(by_method.to_dict('records'), f, indent=2)
+    # Résumés croisés, dérivés du même cube
+    by_country_method = rollup.rollup(cube, ['country', 'measurement_method'], distinct=['river_id'])
+    by_country_method = pd.DataFrame({
+        'country': by_country_method['country'],
+        'method': by_country_method['measurement_method'],
+        'n_measurements': by_country_method['n_measurements'],
+        'avg_flux': rollup.mean(by_country_method, flux),
+        'min_flux': by_country_method[f'{flux}_min'],
+        'max_flux': by_country_method[f'{flux}_max'],
+        'avg_discharge': rollup.mean(by_country_method, 'discharge_m3_s'),
+        'n_rivers': by_country_method['n_river_id']
+    }).round(4)
+    summaries['summary_by_country_method'] = by_country_method
     
-    # 7. summary_by_river.json
-    print("  → summary_by_river.json")
-    by_river = full_data.groupby(['river_id', 'river_name', 'country']).agg({
-        'measurement_id': 'count',
-        'section_id': 'nunique',
-        'bedload_rate_total_kg_s': ['mean', 'min', 'max'],
-        'campaign_date': ['min', 'max']
-    }).reset_index()
-    
-    by_river.columns = ['river_id', 'river_name', 'country', 'n_measurements', 'n_sections', 
-                        'avg_flux', 'min_flux', 'max_flux', 'first_date', 'last_date']
-    by_river = by_river.round(4)
-    by_river = by_river.where(pd.notnull(by_river), None)
-    
-    with open(api_dir / 'summary_by_river.json', 'w') as f:
-        json.dump(by_river.to_dict('records'), f, indent=2)
+    by_river_year = rollup.rollup(cube, ['river_id', 'year'], distinct=['section_id'])
+    by_river_year = pd.DataFrame({
+        'river_id': by_river_year['river_id'],
+        'year': by_river_year['year'],
+        'n_measurements': by_river_year['n_measurements'],
+        'n_sections': by_river_year['n_section_id'],
+        'avg_flux': rollup.mean(by_river_year, flux),
+        'std_flux': rollup.std(by_river_year, flux),
+        'min_flux': by_river_year[f'{flux}_min'],
+        'max_flux': by_river_year[f'{flux}_max'],
+        'avg_discharge': rollup.mean(by_river_year, 'discharge_m3_s')
+    }).round(4)
+    summaries['summary_by_river_year'] = by_river_year
     
-    # 8. stats.json - Statistiques globales
-    print("  → stats.json (statistiques globales)")
-    stats = {
+    return summaries
+
+
+def build_stats(rivers, sections, campaigns, measurements):
+    """Statistiques globales de stats.json"""
+    return {
         'total_measurements': len(measurements),
         'total_rivers': rivers['river_id'].nunique(),
         'total_countries': rivers['country'].nunique(),
@@ -121,8 +292,8 @@ def generate_api_files():
         'methods': measurements['measurement_method'].unique().tolist(),
         'countries': rivers['country'].unique().tolist(),
         'date_range': {
-            'first': campaigns['campaign_date'].min(),
-            'last': campaigns['campaign_date'].max()
+            'first': campaigns['campaign_date'].min().strftime('%Y-%m-%d'),
+            'last': campaigns['campaign_date'].max().strftime('%Y-%m-%d')
         },
         'flux_range': {
             'min': float(measurements['bedload_rate_total_kg_s'].min()),
@@ -130,9 +301,165 @@ def generate_api_files():
             'mean': float(measurements['bedload_rate_total_kg_s'].mean())
         }
     }
+
+
+def generate_api_files(options=None, columnar=True, profiler=NULL_PROFILER, incremental=False):
+    """Génère des fichiers JSON statiques à partir des CSV
+    
+    options (JsonWriterOptions) : format compact, fichiers .gz / .br précompressés et
+        enregistrements sans les clés nulles (omit_null)
+    columnar : écrit aussi les exports Parquet / Arrow (pyarrow requis)
+    profiler (profiling.Profiler) : temps, lignes et octets écrits de chaque endpoint
+    incremental : ne régénère que ce qui dépend des lignes modifiées depuis l'instantané
+        de la génération précédente (api/.snapshot.pkl, voir api_snapshot.py)
+    
+    Dans tous les cas, un fichier dont le contenu n'a pas changé n'est pas réécrit.
+    """
+    options = options or JsonWriterOptions()
+    
+    # Chemins
+    data_dir = Path('data')
+    api_dir = Path('api')
+    api_dir.mkdir(exist_ok=True)
+    
+    print("🔄 Chargement des CSV...")
+    
+    # Charger CSV (typés, depuis le cache partagé si les fichiers n'ont pas changé)
+    with profiler.stage('load CSV') as stage:
+        tables = load_dataset(data_dir)
+        stage.add(rows=sum(len(df) for df in tables.values()))
+    rivers = tables['rivers']
+    sections = tables['sections']
+    campaigns = tables['campaigns']
+    measurements = tables['measurements']
+    
+    print(f"  ✓ {len(rivers)} rivières")
+    print(f"  ✓ {len(sections)} sections")
+    print(f"  ✓ {len(campaigns)} campagnes")
+    print(f"  ✓ {len(measurements)} mesures")
     
-    with open(api_dir / 'stats.json', 'w') as f:
-        json.dump(stats, f, indent=2)
+    # Empreinte de chaque ligne, comparée à l'instantané de la génération précédente
+    columnar = columnar and columnar_export.available()
+    snapshot = None
+    with profiler.stage('row hashes') as stage:
+        hashes = api_snapshot.table_hashes(tables)
+        run_signature = api_snapshot.signature(tables, options, columnar)
+        stage.add(rows=sum(len(df) for df in tables.values()))
+    if incremental:
+        snapshot, reason = api_snapshot.load_snapshot(api_dir, run_signature)
+        if snapshot is None:
+            print(f"\nℹ️  Génération complète ({reason})")
+        elif api_snapshot.unchanged(snapshot, hashes):
+            print("\n✅ Aucune ligne modifiée depuis la génération précédente : api/ est à jour")
+            return
+    
+    print("\n📝 Génération des fichiers JSON...")
+    files = {}
+    record_ends = {}
+    
+    # 1. all.json - Toutes les données jointes
+    print("  → all.json (toutes données)")
+    with profiler.stage('full join') as stage:
+        full_data = full_join(rivers, sections, campaigns, measurements)
+        stage.add(rows=len(full_data))
+    # Grandeurs hydrauliques dérivées (contrainte de cisaillement, Shields, Einstein...),
+    # calculées une fois sur les colonnes entières plutôt que par chaque client
+    with profiler.stage('hydraulics') as stage:
+        hydraulics.add_hydraulics(full_data)
+        stage.add(rows=len(full_data))
+    
+    changes = api_snapshot.ChangeSet(snapshot, hashes, full_data, list(SHARDS.values()))
+    if snapshot is not None and not changes.full:
+        reused = int((changes.sources['all'] >= 0).sum())
+        print(f"  ℹ️  Incrémental : tables modifiées {sorted(changes.changed_tables)}, "
+              f"{reused}/{len(full_data)} enregistrements de all.json recopiés")
+    
+    # Écriture en flux par lots (NaN -> null), les enregistrements inchangés sont recopiés ;
+    # les enregistrements sérialisés sont gardés pour les partitions
+    encoder = RecordEncoder(full_data, options)
+    with profiler.stage('all.json') as stage:
+        files['all'], record_ends['all'] = write_records_json(api_dir, 'all', full_data, options, changes,
+                                                              changes.any_changed(), encoder)
+        add_entries(stage, [files['all']])
+    
+    # Partitions par pays / rivière / section
+    print("  → by_country/, by_river/, by_section/ (partitions de all.json)")
+    shards = write_shards(api_dir, full_data, options, profiler, changes, encoder)
+    
+    # 2. rivers.json, 3. sections.json, 4. measurements.json
+    for name, df in [('rivers', rivers), ('sections', sections), ('measurements', measurements)]:
+        print(f"  → {name}.json")
+        with profiler.stage(f'{name}.json') as stage:
+            files[name], record_ends[name] = write_records_json(api_dir, name, df, options, changes,
+                                                                changes.table_changed(name))
+            add_entries(stage, [files[name]])
+    
+    # Cube d'agrégats (pays × rivière × section × méthode × année) : un seul passage
+    # sur les mesures, tous les résumés en sont dérivés
+    with profiler.stage('rollup cube') as stage:
+        cube = rollup.build_cube(full_data)
+        stage.add(rows=len(full_data))
+    with profiler.stage('summaries'):
+        summaries = build_summaries(cube, rivers)
+    for name, summary in summaries.items():
+        print(f"  → {name}.json")
+        with profiler.stage(f'{name}.json') as stage:
+            files[name] = write_frame_json(api_dir, f'{name}.json', summary, options)
+            add_entries(stage, [files[name]])
+    
+    # Courbes de transport Qs = a·Q^b par section, rivière et méthode : un seul ajustement
+    # log-log groupé, seuls les groupes dont les données ont changé sont réajustés
+    print("  → rating_curves.json (courbes de transport par section, rivière et méthode)")
+    with profiler.stage('rating_curves.json') as stage:
+        curves, refitted = rating_curves.fit_cached(rating_curves.statistics(full_data),
+                                                    rating_curves.cache_path(data_dir))
+        files['rating_curves'] = write_frame_json(api_dir, 'rating_curves.json', curves, options)
+        add_entries(stage, [files['rating_curves']])
+    print(f"    ✓ {len(curves)} courbes, {refitted} groupes réajustés")
+    
+    # 8. stats.json - Statistiques globales
+    print("  → stats.json (statistiques globales)")
+    with profiler.stage('stats.json') as stage:
+        files['stats'] = write_json(api_dir, 'stats.json', build_stats(rivers, sections, campaigns, measurements),
+                                    options)
+        add_entries(stage, [files['stats']])
+    
+    # Pyramide de tuiles des sections (agrégats par section tirés du cube)
+    print("  → tiles/ (pyramide de tuiles des sections)")
+    with profiler.stage('tiles/') as stage:
+        tile_entries = write_tiles(api_dir, sections, rollup.rollup(cube, ['section_id']), options)
+        add_entries(stage, tile_entries.values())
+    
+    # 9. filter_index.json - index des filtres de l'explorateur
+    print("  → filter_index.json (index des filtres)")
+    with profiler.stage('filter_index.json') as stage:
+        filter_index = build_filter_index(rivers, sections, campaigns, measurements)
+        files['filter_index'] = write_json(api_dir, 'filter_index.json', filter_index, options)
+        add_entries(stage, [files['filter_index']])
+    
+    # 10. columnar/ - Parquet et Arrow IPC (jointure complète + tables de base),
+    # réécrits seulement pour les tables modifiées
+    columnar_files = {}
+    if columnar:
+        print("  → columnar/ (Parquet + Arrow IPC)")
+        frames = {
+            'all': full_data,
+            'rivers': rivers,
+            'sections': sections,
+            'campaigns': campaigns,
+            'measurements': measurements,
+        }
+        kept = {}
+        for name in frames:
+            old = changes.old_entry('columnar', name)
+            changed = changes.any_changed() if name == 'all' else changes.table_changed(name)
+            if old is not None and not changed and all((api_dir / e['path']).exists() for e in old.values()):
+                kept[name] = old
+        with profiler.stage('columnar/') as stage:
+            written = columnar_export.write_columnar(api_dir, {name: df for name, df in frames.items()
+                                                               if name not in kept})
+            add_entries(stage, [entry for formats in written.values() for entry in formats.values()])
+        columnar_files = {name: kept[name] if name in kept else written[name] for name in frames}
     
     # Créer index.json listant tous les endpoints
     print("  → index.json (liste endpoints)")
@@ -140,26 +467,65 @@ def generate_api_files():
         'version': '1.0',
         'description': 'Global Bedload Transport Database - Static JSON API',
         'endpoints': {
-            'all': 'https://geomorphbars.github.io/Global_Bedload_Observatory/api/all.json',
-            'rivers': 'https://geomorphbars.github.io/Global_Bedload_Observatory/api/rivers.json',
-            'sections': 'https://geomorphbars.github.io/Global_Bedload_Observatory/api/sections.json',
-            'measurements': 'https://geomorphbars.github.io/Global_Bedload_Observatory/api/measurements.json',
-            'summary_by_country': 'https://geomorphbars.github.io/Global_Bedload_Observatory/api/summary_by_country.json',
-            'summary_by_method': 'https://geomorphbars.github.io/Global_Bedload_Observatory/api/summary_by_method.json',
-            'summary_by_river': 'https://geomorphbars.github.io/Global_Bedload_Observatory/api/summary_by_river.json',
-            'stats': 'https://geomorphbars.github.io/Global_Bedload_Observatory/api/stats.json'
+            'all': f'{API_URL}/all.json',
+            'rivers': f'{API_URL}/rivers.json',
+            'sections': f'{API_URL}/sections.json',
+            'measurements': f'{API_URL}/measurements.json',
+            'summary_by_country': f'{API_URL}/summary_by_country.json',
+            'summary_by_method': f'{API_URL}/summary_by_method.json',
+            'summary_by_river': f'{API_URL}/summary_by_river.json',
+            'summary_by_country_method': f'{API_URL}/summary_by_country_method.json',
+            'summary_by_river_year': f'{API_URL}/summary_by_river_year.json',
+            'stats': f'{API_URL}/stats.json',
+            'rating_curves': f'{API_URL}/rating_curves.json',
+            'filter_index': f'{API_URL}/filter_index.json',
+            'manifest': f'{API_URL}/manifest.json',
+            'by_country': f'{API_URL}/by_country/{{country}}.json',
+            'by_river': f'{API_URL}/by_river/{{river_id}}.json',
+            'by_section': f'{API_URL}/by_section/{{section_id}}.json',
+            'tiles': f'{API_URL}/tiles/{{z}}/{{x}}/{{y}}.json'
         },
         'usage': 'Access any endpoint URL directly in your browser or via HTTP GET request'
     }
     
-    with open(api_dir / 'index.json', 'w') as f:
-        json.dump(endpoints, f, indent=2)
+    if columnar:
+        endpoints['endpoints']['parquet'] = f'{API_URL}/columnar/{{table}}.parquet'
+        endpoints['endpoints']['arrow'] = f'{API_URL}/columnar/{{table}}.arrow'
+    
+    files['index'] = write_json(api_dir, 'index.json', endpoints, options)
+    
+    # manifest.json - lignes, tailles et empreintes de chaque fichier et partition
+    print("  → manifest.json (fichiers et partitions)")
+    manifest = {
+        'version': '1.0',
+        'description': 'Row counts, byte sizes and SHA-256 of every endpoint and shard',
+        'endpoints': files,
+        'shards': shards,
+        'tiles': tile_entries
+    }
+    if columnar:
+        manifest['columnar'] = columnar_files
+    with profiler.stage('manifest.json') as stage:
+        manifest_entry = write_json(api_dir, 'manifest.json', manifest, options)
+        add_entries(stage, [manifest_entry])
+    
+    # Instantané pour la prochaine génération incrémentale
+    with profiler.stage('snapshot'):
+        api_snapshot.save_snapshot(api_dir, {
+            'signature': run_signature,
+            'hashes': hashes,
+            'shard_keys': full_data[list(SHARDS.values())].astype('category'),
+            'record_ends': record_ends,
+            'manifest': manifest,
+            'manifest_sha256': manifest_entry['sha256'],
+        })
+    n_shards = sum(len(entries) for entries in shards.values())
     
     print("\n" + "="*60)
     print("✅ API STATIQUE GÉNÉRÉE AVEC SUCCÈS")
     print("="*60)
     print(f"📁 Dossier : {api_dir.absolute()}")
-    print(f"📊 Fichiers créés : 9")
+    print(f"📊 Fichiers créés : {len(files) + 1} (+ {n_shards} partitions, {len(tile_entries)} tuiles)")
     print("\n🌐 Endpoints disponibles (après push sur GitHub) :")
     for name, url in endpoints['endpoints'].items():
         print(f"  • {name:20} → {url}")
@@ -172,8 +538,34 @@ def generate_api_files():
     print("="*60)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Génère l'API JSON statique à partir des CSV")
+    parser.add_argument('--compact', action='store_true',
+                        help='JSON compact, sans indentation')
+    parser.add_argument('--gzip', action='store_true',
+                        help='écrit aussi des fichiers .json.gz précompressés')
+    parser.add_argument('--brotli', action='store_true',
+                        help='écrit aussi des fichiers .json.br précompressés (module brotli requis)')
+    parser.add_argument('--sparse', action='store_true',
+                        help="omet les champs vides des enregistrements (colonnes des autres méthodes) au lieu d'écrire null")
+    parser.add_argument('--no-columnar', action='store_true',
+                        help="n'écrit pas les exports Parquet / Arrow de columnar/")
+    parser.add_argument('--incremental', action='store_true',
+                        help="ne régénère que les fichiers et partitions qui dépendent des lignes modifiées "
+                             "depuis la génération précédente")
+    add_profile_arguments(parser, 'generate_api_profile.json')
+    args = parser.parse_args()
+    
+    if args.brotli and brotli is None:
+        print("⚠️  Module brotli non installé (pip install brotli) : fichiers .br ignorés")
+    if not args.no_columnar and not columnar_export.available():
+        print("⚠️  Module pyarrow non installé (pip install pyarrow) : exports columnar/ ignorés")
+    
+    profiler, trace_path = profiler_from_args(args, 'generate_api', 'generate_api_profile.json')
+    
     try:
-        generate_api_files()
+        generate_api_files(JsonWriterOptions(args.compact, args.gzip, args.brotli, args.sparse), not args.no_columnar,
+                           profiler, args.incremental)
+        profiler.finish(trace_path)
     except Exception as e:
         print(f"\n❌ ERREUR : {e}")
         import traceback
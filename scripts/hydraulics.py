@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Derived hydraulic quantities of the measurements, computed over whole columns
+
+After the measurements are joined to their section, one vectorized pass derives:
+- unit_bedload_rate_kg_s_m: bedload rate per metre of bankfull width, qs = Qs / W
+- bed_shear_stress_pa: depth-slope product, tau = rho g h S
+- shear_velocity_m_s: u* = sqrt(tau / rho)
+- shields_number: tau* = tau / ((rho_s - rho) g D50)
+- einstein_phi: Einstein's dimensionless transport rate, phi = qs / (rho_s sqrt(R g D50^3))
+  with R = rho_s / rho - 1
+
+A missing, zero or negative input (a negative bedload rate) gives NaN for every
+quantity that depends on it, never an error. build_database.py stores the result in
+the measurement_hydraulics table (and measurements_full); generate_api.py appends the
+columns to all.json, its shards and the columnar exports.
+
+    derived = derive(full_data)   # DataFrame of COLUMNS, same index as full_data
+"""
+
+import numpy as np
+import pandas as pd
+
+from dataset import widen_float32
+
+RHO_WATER = 1000.0      # kg/m3
+RHO_SEDIMENT = 2650.0   # kg/m3, quartz
+GRAVITY = 9.81          # m/s2
+
+# Joined columns the derivation reads
+INPUT_COLUMNS = ['bedload_rate_total_kg_s', 'water_depth_mean_m', 'd50_mm', 'bankfull_width_m', 'channel_slope']
+
+# Derived columns, in output order
+COLUMNS = ['unit_bedload_rate_kg_s_m', 'bed_shear_stress_pa', 'shear_velocity_m_s', 'shields_number',
+           'einstein_phi']
+
+
+def column_values(series):
+    """float64 array of a column, NaN where missing
+
+    float32 columns (bankfull_width_m) are widened through their shortest decimal
+    representation, like the JSON and SQLite outputs, once per distinct value.
+    """
+    if series.dtype == 'float32':
+        codes, uniques = pd.factorize(series)
+        widened = np.append(widen_float32(pd.Series(uniques)).to_numpy(), np.nan)
+        return widened[codes]  # code -1 (missing) picks the trailing NaN
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+
+def derive(df):
+    """Derived hydraulic columns of a frame holding INPUT_COLUMNS, with the same index"""
+    values = {col: column_values(df[col]) for col in INPUT_COLUMNS}
+    # Only physically meaningful inputs: zero transport is valid, zero depth or grain size is not
+    rate = np.where(values['bedload_rate_total_kg_s'] >= 0, values['bedload_rate_total_kg_s'], np.nan)
+    width, depth, d50_mm, slope = (np.where(values[col] > 0, values[col], np.nan)
+                                   for col in ['bankfull_width_m', 'water_depth_mean_m', 'd50_mm', 'channel_slope'])
+
+    unit_rate = rate / width
+    shear_stress = RHO_WATER * GRAVITY * depth * slope
+    d50 = d50_mm / 1000
+    relative_density = RHO_SEDIMENT / RHO_WATER - 1
+    return pd.DataFrame({
+        'unit_bedload_rate_kg_s_m': unit_rate,
+        'bed_shear_stress_pa': shear_stress,
+        'shear_velocity_m_s': np.sqrt(shear_stress / RHO_WATER),
+        'shields_number': shear_stress / ((RHO_SEDIMENT - RHO_WATER) * GRAVITY * d50),
+        'einstein_phi': unit_rate / RHO_SEDIMENT / np.sqrt(relative_density * GRAVITY * d50 ** 3),
+    }, index=df.index)
+
+
+def add_hydraulics(df):
+    """Append the derived columns to a joined frame (in place, no copy of the frame) and return it"""
+    derived = derive(df)
+    for col in COLUMNS:
+        df[col] = derived[col]
+    return df
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Streaming JSON writer for the static API
+
+Records are written to disk batch by batch instead of building the whole list of dicts
+in memory, in pretty (indent=2, same bytes as json.dump) or compact form, with
+optional precompressed .gz / .br siblings. Missing values are written as null (or the
+key is left out of records with omit_null): NaN is never emitted (allow_nan=False).
+
+Files are written under a temporary name and renamed when complete. A file whose new
+content is identical to the one on disk is left untouched (same mtime), so static
+hosting and CDN caches keep it. The end offset of every record can be kept, so that a
+later run can copy unchanged records from the previous file instead of serializing
+them again (write_frame(..., reuse=...)). Files holding the same rows in different
+groupings (all.json and its shards) share a RecordEncoder, so each row is converted
+and serialized once.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from array import array
+
+import numpy as np
+
+from dataset import plain_frame
+
+try:
+    import brotli
+except ImportError:  # optional dependency, only needed for .br siblings
+    brotli = None
+
+# Rows converted to dicts at a time
+BATCH_SIZE = 10000
+
+# Bytes copied at a time from a previous version of a file
+COPY_BLOCK = 1 << 20
+
+
+def frame_records(df, omit_null=False):
+    """Rows of a (typed) DataFrame as JSON-ready dicts, missing values as None
+    (or left out of each dict with omit_null)"""
+    df = plain_frame(df).astype(object)
+    records = df.where(df.notna(), None).to_dict('records')
+    if omit_null:
+        return [{key: value for key, value in record.items() if value is not None} for record in records]
+    return records
+
+
+def encode_record(record, options):
+    """JSON bytes of one record as it appears inside an array written with these options"""
+    if options.compact:
+        return json.dumps(record, separators=(',', ':'), allow_nan=False).encode('utf-8')
+    # Same layout as json.dump(list, indent=2): items indented by two spaces
+    return json.dumps(record, indent=2, allow_nan=False).replace('\n', '\n  ').encode('utf-8')
+
+
+class RecordEncoder:
+    """Encoded records of the rows of a DataFrame, converted and serialized on first use
+    and kept, for files that write the same rows (all.json and its shards)
+
+        encoder = RecordEncoder(full_data, options)
+        writer.write_frame(full_data, encoder=encoder)
+        shard_writer.write_rows(encoder, positions)   # no row serialized twice
+    """
+
+    def __init__(self, df, options, batch_size=BATCH_SIZE):
+        self.df = df
+        self.options = options
+        self.batch_size = batch_size
+        self.encoded = np.empty(len(df), dtype=object)
+        self.done = np.zeros(len(df), dtype=bool)
+
+    def records(self, positions):
+        """Encoded records of the rows at these positions, in that order"""
+        positions = np.asarray(positions, dtype='int64')
+        missing = np.unique(positions[~self.done[positions]])
+        for start in range(0, len(missing), self.batch_size):
+            rows = missing[start:start + self.batch_size]
+            for row, record in zip(rows.tolist(), frame_records(self.df.iloc[rows], self.options.omit_null)):
+                self.encoded[row] = encode_record(record, self.options)
+            self.done[rows] = True
+        return self.encoded[positions]
+
+
+class JsonWriterOptions:
+    """Output format shared by every file of a run"""
+
+    def __init__(self, compact=False, gzip=False, brotli=False, omit_null=False):
+        self.compact = compact
+        self.gzip = gzip
+        self.brotli = brotli
+        # Sparse records: keys with a missing value are left out (e.g. the columns of the
+        # other measurement methods) instead of written as null
+        self.omit_null = omit_null
+
+
+class JsonWriter:
+    """Writes one JSON document to disk incrementally, plus its compressed siblings
+
+    Usage:
+        with JsonWriter(path, options) as writer:
+            writer.write_frame(df)          # JSON array of the rows of df, in batches
+        entry = writer.entry                # bytes, sha256, rows, compressed sizes
+        writer.record_ends                  # end offset of each record (record_ends=True)
+    """
+
+    def __init__(self, path, options=None, record_ends=False):
+        self.path = path
+        self.options = options or JsonWriterOptions()
+        self.rows = None
+        self.bytes = 0
+        self.sha256 = hashlib.sha256()
+        self.entry = None
+        self.record_ends = array('q') if record_ends else None
+        # Whether the file on disk was replaced (False: identical content, left untouched)
+        self.changed = None
+
+    def temporary(self, path):
+        return path.with_name(f'.{path.name}.tmp')
+
+    def __enter__(self):
+        self.file = open(self.temporary(self.path), 'wb')
+        self.gzip_file = None
+        self.brotli_file = None
+        self.brotli_compressor = None
+        if self.options.gzip:
+            # mtime=0 and no file name: identical input gives identical .gz bytes
+            self.gzip_file = gzip.GzipFile(filename='', mode='wb', mtime=0,
+                                           fileobj=open(self.temporary(self.sibling('.gz')), 'wb'))
+        if self.options.brotli and brotli is not None:
+            self.brotli_file = open(self.temporary(self.sibling('.br')), 'wb')
+            self.brotli_compressor = brotli.Compressor()
+        return self
+
+    def sibling(self, suffix):
+        return self.path.with_name(self.path.name + suffix)
+
+    def write_bytes(self, data):
+        self.file.write(data)
+        self.bytes += len(data)
+        self.sha256.update(data)
+        if self.gzip_file is not None:
+            self.gzip_file.write(data)
+        if self.brotli_compressor is not None:
+            self.brotli_file.write(self.brotli_compressor.process(data))
+
+    def write_text(self, text):
+        self.write_bytes(text.encode('utf-8'))
+
+    def dumps(self, value):
+        if self.options.compact:
+            return json.dumps(value, separators=(',', ':'), allow_nan=False)
+        return json.dumps(value, indent=2, allow_nan=False)
+
+    def write_value(self, value):
+        """Write a whole (small) JSON value"""
+        if isinstance(value, list):
+            self.rows = len(value)
+        self.write_text(self.dumps(value))
+
+    def separator(self):
+        """Text before the next record: opens the array or separates it from the previous one
+        (same length in both cases)"""
+        if self.options.compact:
+            return '[' if self.rows == 0 else ','
+        return '[\n  ' if self.rows == 0 else ',\n  '
+
+    def append_records(self, records):
+        self.append_encoded(encode_record(record, self.options) for record in records)
+        
+    def append_encoded(self, encoded):
+        """Append records already serialized by encode_record"""
+        for data in encoded:
+            self.write_bytes(self.separator().encode('utf-8') + data)
+            if self.record_ends is not None:
+                self.record_ends.append(self.bytes)
+            self.rows += 1
+
+    def copy_records(self, source, ends, first, last):
+        """Copy records first..last (inclusive) of a previous version of this file, opened in
+        source, whose record end offsets are ends"""
+        first, last = int(first), int(last)
+        separator = len(self.separator())
+        start = int(ends[first - 1]) + separator if first > 0 else separator
+        end = int(ends[last])
+        offset = self.bytes + separator - start
+        self.write_text(self.separator())
+        source.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = source.read(min(COPY_BLOCK, remaining))
+            if not block:
+                raise ValueError(f'{self.path} is shorter than its snapshot')
+            self.write_bytes(block)
+            remaining -= len(block)
+        if self.record_ends is not None:
+            self.record_ends.extend((np.asarray(ends[first:last + 1]) + offset).tolist())
+        self.rows += last - first + 1
+
+    def close_array(self):
+        if self.rows == 0:
+            self.write_text('[]')
+        else:
+            self.write_text(']' if self.options.compact else '\n]')
+
+    def write_records(self, batches):
+        """Write a JSON array from an iterable of lists of records"""
+        self.rows = 0
+        for records in batches:
+            self.append_records(records)
+        self.close_array()
+
+    def encoded_rows(self, df, start, stop, encoder):
+        """Encoded records of rows start..stop (exclusive) of df, from the encoder if given"""
+        if encoder is not None:
+            return encoder.records(np.arange(start, stop))
+        return (encode_record(record, self.options)
+                for record in frame_records(df.iloc[start:stop], self.options.omit_null))
+
+    def write_rows(self, encoder, positions):
+        """Write the rows of the encoder's frame at these positions as a JSON array"""
+        self.rows = 0
+        for start in range(0, len(positions), encoder.batch_size):
+            self.append_encoded(encoder.records(positions[start:start + encoder.batch_size]))
+        self.close_array()
+
+    def write_frame(self, df, batch_size=BATCH_SIZE, reuse=None, encoder=None):
+        """Write the rows of a DataFrame as a JSON array, converting batch_size rows at a time
+
+        reuse = (source, ends): row i of df is the record source[i] of the current file,
+        whose record end offsets are ends, or must be serialized when source[i] is -1.
+        Runs of consecutive reused records are copied as one block of bytes.
+        encoder (RecordEncoder of df): rows are serialized through it, and kept there for
+        the other files that write them.
+        """
+        if reuse is None:
+            self.rows = 0
+            for start in range(0, len(df), batch_size):
+                self.append_encoded(self.encoded_rows(df, start, min(start + batch_size, len(df)), encoder))
+            self.close_array()
+            return
+
+        source, ends = reuse
+        source = np.asarray(source, dtype='int64')
+        self.rows = 0
+        # Boundaries of the runs: a new run starts where reuse starts or stops, or where the
+        # reused records stop being consecutive in the old file
+        reused = source >= 0
+        breaks = np.flatnonzero((reused[1:] != reused[:-1])
+                                | (reused[1:] & (source[1:] != source[:-1] + 1))) + 1
+        bounds = np.concatenate([[0], breaks, [len(source)]])
+        with open(self.path, 'rb') as old:
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                if reused[start]:
+                    self.copy_records(old, ends, source[start], source[stop - 1])
+                    continue
+                for batch in range(start, stop, batch_size):
+                    self.append_encoded(self.encoded_rows(df, batch, min(batch + batch_size, stop), encoder))
+        self.close_array()
+
+    def same_as_disk(self, path, digest):
+        """Whether path already holds content with this size and SHA-256"""
+        if not path.exists() or path.stat().st_size != self.bytes:
+            return False
+        existing = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(COPY_BLOCK), b''):
+                existing.update(block)
+        return existing.hexdigest() == digest
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if self.gzip_file is not None:
+            gzip_fileobj = self.gzip_file.fileobj
+            self.gzip_file.close()
+            gzip_fileobj.close()
+        if self.brotli_file is not None:
+            self.brotli_file.write(self.brotli_compressor.finish())
+            self.brotli_file.close()
+
+        written = [(self.path, True), (self.sibling('.gz'), self.gzip_file is not None),
+                   (self.sibling('.br'), self.brotli_file is not None)]
+        if exc_type is not None:
+            for path, was_written in written:
+                if was_written:
+                    os.remove(self.temporary(path))
+            return False
+
+        digest = self.sha256.hexdigest()
+        self.entry = {'rows': self.rows, 'bytes': self.bytes, 'sha256': digest}
+        self.changed = not self.same_as_disk(self.path, digest)
+        for (path, was_written), key in zip(written[1:], ['gzip_bytes', 'br_bytes']):
+            if was_written:
+                self.entry[key] = self.temporary(path).stat().st_size
+            elif path.exists():
+                # Left over from a previous run with compression: would be stale
+                path.unlink()
+        # Siblings first: the JSON file is the last one to change
+        for path, was_written in reversed(written):
+            if not was_written:
+                continue
+            if self.changed or not path.exists():
+                os.replace(self.temporary(path), path)
+            else:
+                os.remove(self.temporary(path))
+        return False
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Single entry point for validate -> build -> publish, with cached and concurrent stages
+
+The stages form a DAG: validate.py first, then build_database.py (SQLite) and
+generate_api.py (JSON / columnar API) side by side, each in its own process. Every
+stage is keyed by a hash of its inputs: the size and modification time of the CSVs,
+the source of the script and of the local modules it imports, and its arguments. A
+stage whose key matches its last successful run, and whose outputs are still the ones
+it wrote, is skipped; a stage that fails stops the stages that depend on it.
+
+    python scripts/pipeline.py                          # run what changed
+    python scripts/pipeline.py --force build            # rerun a stage (and what follows)
+    python scripts/pipeline.py --dry-run                # show what would run
+    python scripts/pipeline.py --build-args "--schema optimized" --api-args "--incremental"
+
+This script imports neither pandas nor the stage scripts, so a no-op run only costs
+a few stat() calls and the hashing of the scripts.
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+DATA_DIR = Path('data')
+TABLES = ['rivers', 'sections', 'campaigns', 'measurements']
+
+# Stage keys and logs, next to the parse cache of scripts/dataset.py
+STATE_DIR = DATA_DIR / '.cache'
+STATE_FILE = STATE_DIR / 'pipeline.json'
+
+# Bump when the key computation changes
+STATE_VERSION = 1
+
+# Lines of a failed stage's log shown on the terminal
+LOG_TAIL = 20
+
+
+class Stage:
+    """One script of the pipeline, run after the stages in after"""
+
+    def __init__(self, name, script, after=(), outputs=()):
+        self.name = name
+        self.script = script
+        self.after = list(after)
+        self.outputs = list(outputs)
+
+
+STAGES = {
+    'validate': Stage('validate', 'validate.py'),
+    'build': Stage('build', 'build_database.py', after=['validate'], outputs=['bedload_transport.db']),
+    'api': Stage('api', 'generate_api.py', after=['validate'], outputs=['api/manifest.json']),
+}
+
+
+def local_modules(script):
+    """The script and the modules of scripts/ it imports, directly or not"""
+    found = set()
+    pending = [script[:-len('.py')]]
+    while pending:
+        name = pending.pop()
+        path = SCRIPTS_DIR / f'{name}.py'
+        if name in found or not path.exists():
+            continue
+        found.add(name)
+        for node in ast.walk(ast.parse(path.read_bytes())):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                pending.append(node.module.split('.')[0])
+    return sorted(found)
+
+
+def file_stat(path):
+    """(size, mtime_ns) of a file, None if it does not exist"""
+    try:
+        stat = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def stage_key(stage, args):
+    """Hash of everything the stage's result depends on"""
+    key = hashlib.sha256()
+    key.update(json.dumps({
+        'version': STATE_VERSION,
+        'python': sys.version,
+        'inputs': {table: file_stat(DATA_DIR / f'{table}.csv') for table in TABLES},
+        'args': args,
+    }, sort_keys=True).encode())
+    for module in local_modules(stage.script):
+        key.update(module.encode())
+        key.update((SCRIPTS_DIR / f'{module}.py').read_bytes())
+    return key.hexdigest()
+
+
+def load_state():
+    try:
+        with open(STATE_FILE) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if state.get('version') == STATE_VERSION else {}
+
+
+def save_state(state):
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = STATE_FILE.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    tmp_path.replace(STATE_FILE)
+
+
+def up_to_date(stage, key, state):
+    """Whether the last successful run of the stage had this key and its outputs are untouched"""
+    previous = state.get('stages', {}).get(stage.name)
+    if previous is None or previous['key'] != key:
+        return False
+    return all(file_stat(path) == previous['outputs'].get(path) for path in stage.outputs)
+
+
+def run_stage(stage, args):
+    """Run a stage script with its output in a log file; returns (return code, seconds, log path)"""
+    log_path = STATE_DIR / f'pipeline_{stage.name}.log'
+    start = time.perf_counter()
+    with open(log_path, 'w') as log:
+        returncode = subprocess.call([sys.executable, str(SCRIPTS_DIR / stage.script)] + args,
+                                     stdout=log, stderr=subprocess.STDOUT)
+    return returncode, time.perf_counter() - start, log_path
+
+
+def print_log_tail(log_path):
+    lines = Path(log_path).read_text(errors='replace').splitlines()
+    for line in lines[-LOG_TAIL:]:
+        print(f"     {line}")
+
+
+def plan(stage_args, force):
+    """{stage: key} of the stages to run: out of date, forced, or after one that runs"""
+    state = load_state()
+    keys = {name: stage_key(stage, stage_args[name]) for name, stage in STAGES.items()}
+    to_run = {}
+    for name, stage in STAGES.items():  # STAGES is in dependency order
+        if (name in force or any(dep in to_run for dep in stage.after)
+                or not up_to_date(stage, keys[name], state)):
+            to_run[name] = keys[name]
+    return to_run
+
+
+def run_pipeline(stage_args, force=(), jobs=2, dry_run=False):
+    """Run the out-of-date stages, independent ones concurrently; returns True on success"""
+    start = time.perf_counter()
+    to_run = plan(stage_args, set(force))
+    for name in STAGES:
+        if name not in to_run:
+            print(f"⏭️  {name:10s} up to date")
+    if dry_run:
+        for name in to_run:
+            print(f"▶️  {name:10s} would run: {STAGES[name].script} {' '.join(stage_args[name])}")
+        return True
+    if not to_run:
+        print(f"\n✅ Nothing to do ({time.perf_counter() - start:.2f} s)")
+        return True
+
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    done, failed = set(), set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while len(done) + len(failed) < len(to_run):
+            # Stages whose dependencies succeeded (or were up to date) start as workers free up
+            for name, key in to_run.items():
+                stage = STAGES[name]
+                if name in done or name in failed or name in running.values() or len(running) >= jobs:
+                    continue
+                if any(dep in failed for dep in stage.after):
+                    print(f"⛔ {name:10s} skipped: {', '.join(d for d in stage.after if d in failed)} failed")
+                    failed.add(name)
+                    continue
+                if all(dep in done or dep not in to_run for dep in stage.after):
+                    print(f"▶️  {name:10s} {stage.script} {' '.join(stage_args[name])}")
+                    running[pool.submit(run_stage, stage, stage_args[name])] = name
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                returncode, elapsed, log_path = future.result()
+                if returncode != 0:
+                    print(f"❌ {name:10s} failed in {elapsed:.1f} s (exit {returncode}), log: {log_path}")
+                    print_log_tail(log_path)
+                    failed.add(name)
+                    continue
+                print(f"✅ {name:10s} done in {elapsed:.1f} s")
+                done.add(name)
+                # Recorded as soon as the stage succeeds, so an interrupted run keeps it
+                state = load_state()
+                state['version'] = STATE_VERSION
+                state.setdefault('stages', {})[name] = {
+                    'key': to_run[name],
+                    'outputs': {path: file_stat(path) for path in STAGES[name].outputs},
+                    'seconds': round(elapsed, 3),
+                }
+                save_state(state)
+
+    print(f"\n{'❌ Pipeline failed' if failed else '✅ Pipeline done'} in {time.perf_counter() - start:.1f} s")
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run validate -> build / api, skipping up-to-date stages')
+    parser.add_argument('--force', nargs='*', choices=list(STAGES), metavar='STAGE',
+                        help=f'rerun these stages even if up to date (all without a name; '
+                             f'choices: {", ".join(STAGES)})')
+    parser.add_argument('--jobs', type=int, default=2, help='stages run at the same time (default: 2)')
+    parser.add_argument('--dry-run', action='store_true', help='only show which stages would run')
+    for name, stage in STAGES.items():
+        parser.add_argument(f'--{name}-args', default='', help=f'extra arguments of {stage.script}, quoted')
+    args = parser.parse_args()
+
+    if not all((DATA_DIR / f'{table}.csv').exists() for table in TABLES):
+        print(f"❌ ERROR: the four CSV files must be in '{DATA_DIR}/' (run from the project root)")
+        sys.exit(1)
+
+    force = list(STAGES) if args.force == [] else (args.force or [])
+    stage_args = {name: shlex.split(getattr(args, f'{name}_args')) for name in STAGES}
+    sys.exit(0 if run_pipeline(stage_args, force, max(args.jobs, 1), args.dry_run) else 1)
+
+
+if __name__ == '__main__':
+    main()
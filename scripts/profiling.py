@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Stage instrumentation shared by validate.py, build_database.py and generate_api.py
+
+A Profiler records, for each named stage (a CSV load, a validation rule group, a JSON
+endpoint...), the wall time, CPU time, rows processed, rows/s, bytes written and the
+peak resident memory of the process when the stage ended. Stages nest, and stages
+entered several times under the same name (chunks, shards, tiles) are merged into one
+record with a call count. The trace is written as JSON; a cProfile dump can be taken
+over the same run.
+
+    profiler = Profiler()
+    with profiler.stage('load measurements') as stage:
+        ...
+        stage.add(rows=n_rows, bytes_written=size)
+    profiler.write('profile.json')
+
+When profiling is off, NULL_PROFILER takes the same calls and records nothing.
+"""
+
+import cProfile
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB, or None if unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+class Stage:
+    """Totals of one named stage (all its calls)"""
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.rows = None
+        self.bytes_written = None
+        self.peak_rss_mb = None
+        self.rss_growth_mb = 0.0
+
+    def add(self, rows=None, bytes_written=None):
+        """Count rows processed / bytes written by the current call"""
+        if rows is not None:
+            self.rows = (self.rows or 0) + int(rows)
+        if bytes_written is not None:
+            self.bytes_written = (self.bytes_written or 0) + int(bytes_written)
+
+    def to_dict(self):
+        record = {
+            'stage': self.name,
+            'depth': self.depth,
+            'calls': self.calls,
+            'wall_s': round(self.wall, 6),
+            'cpu_s': round(self.cpu, 6),
+            'rows': self.rows,
+            'rows_per_s': round(self.rows / self.wall, 1) if self.rows is not None and self.wall > 0 else None,
+            'bytes_written': self.bytes_written,
+            'peak_rss_mb': None if self.peak_rss_mb is None else round(self.peak_rss_mb, 1),
+            # Growth of the process peak during the stage: the stages that set the high-water mark
+            'rss_growth_mb': round(self.rss_growth_mb, 1),
+        }
+        return record
+
+
+class StageTimer:
+    """Context manager of one call of a stage"""
+
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self):
+        self.profiler.stack.append(self.stage.name)
+        self.peak_before = peak_memory_mb()
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        return self.stage
+
+    def __exit__(self, exc_type, exc, tb):
+        stage = self.stage
+        stage.wall += time.perf_counter() - self.wall_start
+        stage.cpu += time.process_time() - self.cpu_start
+        stage.calls += 1
+        stage.peak_rss_mb = peak_memory_mb()
+        if stage.peak_rss_mb is not None:
+            stage.rss_growth_mb += stage.peak_rss_mb - self.peak_before
+        self.profiler.stack.pop()
+        return False
+
+
+class NullStage:
+    """Stage of the disabled profiler: accepts the same calls, records nothing"""
+
+    def add(self, rows=None, bytes_written=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class Profiler:
+    """Named stage timings of one run, written as a JSON trace"""
+
+    enabled = True
+
+    def __init__(self, name='run', cprofile_path=None):
+        self.name = name
+        self.stages = {}
+        self.stack = []
+        self.started = datetime.now(timezone.utc)
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.cprofile_path = cprofile_path
+        self.cprofile = None
+        if cprofile_path:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def stage(self, name):
+        """Context manager timing one call of a stage; yields the Stage to add rows and bytes to.
+        A stage entered inside another one is recorded under 'outer / name'."""
+        path = ' / '.join(self.stack + [name])
+        if path not in self.stages:
+            self.stages[path] = Stage(path, len(self.stack))
+        return StageTimer(self, self.stages[path])
+
+    def trace(self):
+        """JSON-ready trace: run totals and the stages in the order they were first entered"""
+        return {
+            'name': self.name,
+            'started': self.started.isoformat(timespec='seconds'),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'wall_s': round(time.perf_counter() - self.wall_start, 6),
+            'cpu_s': round(time.process_time() - self.cpu_start, 6),
+            'peak_rss_mb': peak_memory_mb(),
+            'stages': [stage.to_dict() for stage in self.stages.values()],
+        }
+
+    def finish(self, trace_path):
+        """Stop cProfile, write the JSON trace (and the .prof dump) and print the slowest stages"""
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_path)
+        trace = self.trace()
+        with open(trace_path, 'w') as f:
+            json.dump(trace, f, indent=2)
+
+        print(f"\n⏱️  Profile: {trace['wall_s']:.2f} s wall, {trace['cpu_s']:.2f} s CPU → {trace_path}")
+        top = sorted((s for s in trace['stages'] if s['depth'] == 0), key=lambda s: s['wall_s'], reverse=True)
+        for s in top[:10]:
+            rate = f"{s['rows_per_s']:>12,.0f} rows/s" if s['rows_per_s'] is not None else ' ' * 19
+            print(f"  {s['stage'][:40]:40s} {s['wall_s']:8.3f} s  {rate}")
+        if self.cprofile is not None:
+            print(f"   cProfile dump: {self.cprofile_path} (python -m pstats {self.cprofile_path})")
+
+
+class NullProfiler:
+    """Profiler used when profiling is off"""
+
+    enabled = False
+    null_stage = NullStage()
+
+    def stage(self, name):
+        return self.null_stage
+
+    def finish(self, trace_path):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def add_profile_arguments(parser, default_trace):
+    """--profile [TRACE] and --cprofile DUMP options of a command-line script"""
+    parser.add_argument('--profile', nargs='?', const=default_trace, metavar='TRACE',
+                        help=f'record per-stage timings, rows/s, memory and bytes written '
+                             f'to a JSON trace (default: {default_trace})')
+    parser.add_argument('--cprofile', metavar='DUMP',
+                        help='also dump cProfile statistics of the whole run (implies --profile)')
+
+
+def profiler_from_args(args, name, default_trace):
+    """(profiler, trace path) for the parsed --profile / --cprofile options"""
+    if args.profile is None and args.cprofile is None:
+        return NULL_PROFILER, None
+    return Profiler(name, args.cprofile), args.profile or default_trace
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Read-only query library over bedload_transport.db
+
+Typed calls for the common dashboard queries (by river, section, method, date range,
+bounding box, flux-discharge pairs) that work on every schema and layout built by
+build_database.py. Connections come from a thread-safe pool of read-only connections,
+each keeping its compiled statements (the SQL of a call depends only on which filters
+are given), and results are kept in a bounded LRU cache that is emptied as soon as
+a new database generation is published (see GenerationWatcher).
+
+    from queries import QueryLibrary
+    db = QueryLibrary('bedload_transport.db')
+    db.measurements_by_section('FRA_ARC_S01', start='2023-01-01', end='2023-12-31')
+    db.flux_discharge_pairs(river_id='ARC')
+    db.cache_info()
+
+Returned DataFrames are copies: callers may modify them without affecting the cache.
+tables() loads the four tables as load_dataset() does from the CSVs.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+import hydraulics
+import spatial
+from build_database import LOOKUPS, SIDE_TABLES, database_generation
+from dataset import METHOD_COLUMNS, SCHEMA, TABLES, parse_dates
+
+POOL_SIZE = 4
+CACHE_SIZE = 256
+# Compiled statements kept per connection (sqlite3 statement cache)
+STATEMENT_CACHE = 256
+
+# Context columns added to every measurement row
+CONTEXT_COLUMNS = ['section_id', 'river_id', 'country', 'campaign_date']
+
+# campaign_date stored as a YYYYMMDD integer (optimized schema) back to YYYY-MM-DD
+ISO_DATE = "printf('%04d-%02d-%02d', {0} / 10000, {0} / 100 % 100, {0} % 100)"
+
+
+def database_signature(db_path):
+    """Identity of the database file and of its WAL: changes when the file is replaced
+    (new inode), written to or checkpointed. None if the database is missing"""
+    signature = []
+    for path in [db_path, f'{db_path}-wal']:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            if path == db_path:
+                return None
+            signature.append(None)
+            continue
+        signature.append((stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+class GenerationWatcher:
+    """Cheap detection of a new database generation, for long-lived readers
+
+    current() stats the database and its WAL (a few microseconds) and only reads the
+    generation from build_info when they changed. Databases built before build_info
+    fall back to the file signature itself.
+
+        watcher = GenerationWatcher('bedload_transport.db')
+        generation = watcher.current()
+        ...
+        if watcher.current() != generation:   # rebuilt or updated: reopen
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.signature = None
+        self.generation = None
+
+    def current(self):
+        signature = database_signature(self.db_path)
+        if signature is None:
+            raise FileNotFoundError(f"{self.db_path} not found (run build_database.py)")
+        if signature != self.signature:
+            self.generation = database_generation(self.db_path) or repr(signature)
+            self.signature = signature
+        return self.generation
+
+
+class ConnectionPool:
+    """Thread-safe pool of read-only SQLite connections, opened on demand
+
+    reset() retires the open connections: idle ones are closed at once, busy ones when
+    they are released, so the next queries see the new database file.
+    """
+
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.epoch = 0
+
+    def open(self):
+        uri = f'{Path(self.db_path).resolve().as_uri()}?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """A connection for the duration of the with block (waits if all are busy)"""
+        self.slots.acquire()
+        try:
+            with self.lock:
+                epoch = self.epoch
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = self.open()
+            try:
+                yield conn
+            finally:
+                with self.lock:
+                    if epoch == self.epoch:
+                        self.idle.put(conn)
+                    else:
+                        conn.close()
+        finally:
+            self.slots.release()
+
+    def reset(self):
+        with self.lock:
+            self.epoch += 1
+            while True:
+                try:
+                    self.idle.get_nowait().close()
+                except queue.Empty:
+                    break
+
+    def close(self):
+        self.reset()
+
+
+class LRUCache:
+    """Bounded, thread-safe least-recently-used cache with hit / miss counters"""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return self.data[key]
+            self.misses += 1
+            return None
+
+    def peek(self, key):
+        """Cached value without counting a hit or a miss"""
+        with self.lock:
+            return self.data.get(key)
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def info(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.data), 'maxsize': self.maxsize}
+
+
+class QueryLibrary:
+    """Typed, cached queries on a bedload_transport.db built by build_database.py
+
+    Dates are 'YYYY-MM-DD' strings (start and end inclusive) whatever the schema;
+    every measurement row carries its section_id, river_id, country and campaign_date.
+    """
+
+    def __init__(self, db_path='bedload_transport.db', pool_size=POOL_SIZE, cache_size=CACHE_SIZE):
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, pool_size)
+        self.cache = LRUCache(cache_size)
+        self.lock = threading.Lock()
+        self.watcher = GenerationWatcher(db_path)
+        self.generation = None
+        self.sources = None
+        # key -> lock held while the result is computed, so concurrent misses run it once
+        self.pending = {}
+
+    def check_database(self):
+        """Empty the cache and retire the connections if a new database generation was
+        published (rebuild or incremental update); returns the current generation"""
+        with self.lock:
+            generation = self.watcher.current()
+            if generation != self.generation:
+                self.pool.reset()
+                self.cache.clear()
+                self.sources = None
+                self.generation = generation
+        return generation
+
+    def cached(self, key, run):
+        """Result of run(conn, sources) for key, from the cache when the database has not changed"""
+        # The generation is part of the key: a result computed while the file was being
+        # replaced can never be served for the new one
+        generation = self.check_database()
+        key = (generation,) + key
+        result = self.cache.get(key)
+        if result is None:
+            with self.lock:
+                pending = self.pending.setdefault(key, threading.Lock())
+            with pending:
+                result = self.cache.peek(key)
+                if result is None:
+                    result = self.uncached(run, generation)
+                    self.cache.put(key, result)
+            with self.lock:
+                self.pending.pop(key, None)
+        if isinstance(result, dict):
+            return {name: value.copy() for name, value in result.items()}
+        return result.copy()
+
+    def uncached(self, run, generation=None):
+        """Result of run(conn, sources) on a pooled connection, bypassing the cache"""
+        generation = generation or self.check_database()
+        with self.pool.connection() as conn:
+            with self.lock:
+                described, sources = self.sources or (None, None)
+            if described != generation:
+                sources = self.describe(conn)
+                with self.lock:
+                    self.sources = (generation, sources)
+            return run(conn, sources)
+
+    def cache_info(self):
+        return self.cache.info()
+
+    def clear_cache(self):
+        self.cache.clear()
+
+    def close(self):
+        self.pool.close()
+        self.cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def describe(self, conn):
+        """FROM clause, column expressions, date column and insertion order (rowid) of each
+        kind of row (rivers, sections, campaigns, measurements with context, all = the full
+        join of all.json) for this database's schema"""
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+        optimized = 'measurements_full' in names
+        measurement_columns = list(SCHEMA['measurements'])
+
+        # all: measurement columns, then those of campaigns, sections and rivers without the
+        # join keys, notes suffixed as pandas merges them (notes_x, notes_y, notes)
+        joined = [(col, 'measurements', col) for col in measurement_columns]
+        for table, key, notes in [('campaigns', 'campaign_id', 'notes_x'), ('sections', 'section_id', 'notes_y'),
+                                  ('rivers', 'river_id', 'notes')]:
+            joined += [(notes if col == 'notes' else col, table, col) for col in SCHEMA[table] if col != key]
+
+        if optimized:
+            # Materialized join with decoded enumerations and integer dates
+            full = {name: f'{table[:-1]}_notes' if col == 'notes' else col for name, table, col in joined}
+            full['campaign_date'] = ISO_DATE.format('campaign_date')
+            if 'measurement_hydraulics' in names:
+                full.update({col: col for col in hydraulics.COLUMNS})
+            measurements = {col: full[col] for col in measurement_columns + CONTEXT_COLUMNS}
+            sources = {'measurements': ('measurements_full', measurements, 'campaign_date', 'rowid'),
+                       'all': ('measurements_full', full, 'campaign_date', 'rowid')}
+            join_terms = {}
+        else:
+            aliases = {'measurements': 'm', 'campaigns': 'c', 'sections': 's', 'rivers': 'r'}
+            full = {name: f'{aliases[table]}.{col}' for name, table, col in joined}
+            # Left joins, like the merges of generate_api.py and measurements_full: a
+            # measurement whose campaign, section or river is missing keeps its row
+            source = '''measurements m
+                LEFT JOIN campaigns c ON c.campaign_id = m.campaign_id
+                LEFT JOIN sections s ON s.section_id = c.section_id
+                LEFT JOIN rivers r ON r.river_id = s.river_id'''
+            # Sparse layout: method-specific columns from the side tables
+            for i, (method, side_table) in enumerate(SIDE_TABLES.items()):
+                if side_table in names:
+                    source += f'\n                LEFT JOIN {side_table} x{i} ON x{i}.measurement_id = m.measurement_id'
+                    full.update({col: f'x{i}.{col}' for col in METHOD_COLUMNS[method]})
+            # Derived hydraulic columns, last as in all.json (databases built before them have none)
+            if 'measurement_hydraulics' in names:
+                source += '\n                LEFT JOIN measurement_hydraulics h ON h.measurement_id = m.measurement_id'
+                full.update({col: f'h.{col}' for col in hydraulics.COLUMNS})
+            measurements = {col: full[col] for col in measurement_columns + CONTEXT_COLUMNS}
+            sources = {'measurements': (source, measurements, 'c.campaign_date', 'm.rowid'),
+                       'all': (source, full, 'c.campaign_date', 'm.rowid')}
+            # A filter on a parent column only matches joined rows, but SQLite only turns the
+            # left join of the filtered table itself into an inner join: the join terms up
+            # to it are repeated in WHERE, so the plan can start from its index (e.g.
+            # idx_sections_river) instead of scanning measurements
+            chain = [('c', 'c.campaign_id = m.campaign_id'), ('s', 's.section_id = c.section_id'),
+                     ('r', 'r.river_id = s.river_id')]
+            terms = {alias: [term for _, term in chain[:i + 1]] for i, (alias, _) in enumerate(chain)}
+            join_terms = {'measurements': terms, 'all': terms}
+
+        sources['optimized'] = optimized
+        sources['join_terms'] = join_terms
+        for table, alias in [('rivers', 'r'), ('sections', 's'), ('campaigns', 'c')]:
+            columns = {}
+            for col in SCHEMA[table]:
+                if optimized and col in LOOKUPS:
+                    lookup, id_column = LOOKUPS[col]
+                    columns[col] = f'(SELECT {col} FROM {lookup} WHERE {id_column} = {alias}.{id_column})'
+                elif optimized and col == 'campaign_date':
+                    columns[col] = ISO_DATE.format(f'{alias}.{col}')
+                else:
+                    columns[col] = f'{alias}.{col}'
+            date_column = f'{alias}.campaign_date' if table == 'campaigns' else None
+            sources[table] = (f'{table} {alias}', columns, date_column, f'{alias}.rowid')
+        return sources
+
+    @staticmethod
+    def select(conn, sources, kind, filters, columns=None, order_by=None, limit=None):
+        """SELECT on a source of describe() with equality filters {column: value} (None = not
+        filtered), the 'start' / 'end' date bounds, the 'not_null' columns and 'after', the
+        keyset cursor (rows whose first order_by column is greater). order_by=['rowid']
+        keeps the insertion order"""
+        source, expressions, date_column, rowid = sources[kind]
+        expressions = {**expressions, 'rowid': rowid}
+        columns = columns or list(expressions)
+        order_by = order_by or columns[:1]
+        conditions, params, filtered = [], [], []
+        for col, value in filters.items():
+            if value is None:
+                continue
+            if col in ('start', 'end'):
+                conditions.append(f"{date_column} {'>=' if col == 'start' else '<='} ?")
+                params.append(int(value.replace('-', '')) if sources['optimized'] else value)
+                filtered.append(date_column)
+            elif col == 'not_null':
+                conditions += [f'{expressions[c]} IS NOT NULL' for c in value]
+            elif col == 'after':
+                conditions.append(f'{expressions[order_by[0]]} > ?')
+                params.append(value)
+            else:
+                conditions.append(f'{expressions[col]} = ?')
+                params.append(value)
+                filtered.append(expressions[col])
+        join_terms = sources['join_terms'].get(kind, {})
+        for expression in filtered:
+            conditions += [term for term in join_terms.get(expression.split('.')[0], []) if term not in conditions]
+        sql = f"SELECT {', '.join(f'{expressions[c]} AS {c}' for c in columns)} FROM {source}"
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        sql += f" ORDER BY {', '.join(expressions[c] for c in order_by)}"
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return pd.read_sql_query(sql, conn, params=params)
+
+    def tables(self):
+        """The four tables as typed DataFrames (SCHEMA dtypes, dates as datetime64), as
+        load_dataset() returns them from the CSVs"""
+        def load(conn, sources):
+            frames = {}
+            for table in TABLES:
+                df = self.select(conn, sources, table, {}, list(SCHEMA[table]), ['rowid'])
+                # str columns keep None for missing values, as read_csv keeps NaN
+                dtypes = {col: dtype for col, dtype in SCHEMA[table].items() if dtype is not str}
+                frames[table] = parse_dates(df.astype(dtypes), table)
+            return frames
+        return self.cached(('tables',), load)
+
+    def rivers(self, country=None):
+        """Rivers, optionally of one country"""
+        return self.cached(('rivers', country),
+                           lambda conn, sources: self.select(conn, sources, 'rivers', {'country': country}))
+
+    def sections(self, river_id=None):
+        """Sections, optionally of one river"""
+        return self.cached(('sections', river_id),
+                           lambda conn, sources: self.select(conn, sources, 'sections', {'river_id': river_id}))
+
+    def measurements(self, river_id=None, section_id=None, method=None, start=None, end=None):
+        """Measurements matching every given filter, by date then measurement_id"""
+        filters = {'river_id': river_id, 'section_id': section_id, 'measurement_method': method,
+                   'start': start, 'end': end}
+        return self.cached(('measurements',) + tuple(filters.values()),
+                           lambda conn, sources: self.select(conn, sources, 'measurements', filters,
+                                                    order_by=['campaign_date', 'measurement_id']))
+
+    def measurements_by_river(self, river_id, start=None, end=None):
+        return self.measurements(river_id=river_id, start=start, end=end)
+
+    def measurements_by_section(self, section_id, start=None, end=None):
+        return self.measurements(section_id=section_id, start=start, end=end)
+
+    def measurements_by_method(self, method, start=None, end=None):
+        return self.measurements(method=method, start=start, end=end)
+
+    def measurements_by_date_range(self, start=None, end=None):
+        return self.measurements(start=start, end=end)
+
+    def sections_in_bbox(self, min_lat, min_lon, max_lat, max_lon, with_measurements=False):
+        """Sections inside a bounding box (see spatial.sections_in_bbox)"""
+        return self.cached(('bbox', min_lat, min_lon, max_lat, max_lon, with_measurements),
+                           lambda conn, sources: spatial.sections_in_bbox(conn, min_lat, min_lon, max_lat, max_lon,
+                                                                 with_measurements))
+
+    def flux_discharge_pairs(self, river_id=None, section_id=None, method=None, start=None, end=None):
+        """(discharge_m3_s, bedload_rate_total_kg_s) of the measurements having both, with
+        their identifiers, for rating curves and scatter plots"""
+        filters = {'river_id': river_id, 'section_id': section_id, 'measurement_method': method,
+                   'start': start, 'end': end,
+                   'not_null': ('discharge_m3_s', 'bedload_rate_total_kg_s')}
+        columns = ['measurement_id', 'section_id', 'river_id', 'measurement_method', 'campaign_date',
+                   'discharge_m3_s', 'bedload_rate_total_kg_s']
+        return self.cached(('pairs', river_id, section_id, method, start, end),
+                           lambda conn, sources: self.select(conn, sources, 'measurements', filters, columns,
+                                                    order_by=['campaign_date', 'measurement_id']))
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Sediment rating curves Qs = a Q^b, fitted per section, per river and per method
+
+Each curve is an ordinary least-squares line in log space, log Qs = log a + b log Q,
+over the measurements where both the bedload rate and the discharge are positive.
+The fit only needs six sums per group (n, Σx, Σy, Σx², Σxy, Σy²), so every group of
+every scope is fitted in one vectorized batch: one pass accumulates the sums, which
+are mergeable like the rollup cube (build_database.py accumulates them chunk by
+chunk), and the coefficients, r², and 95 % confidence bounds of a and b (Student t
+with n - 2 degrees of freedom) are derived from them for all groups at once.
+
+The sums can also be kept per cell, one campaign and method (CELL_COLUMNS): every group
+of every scope is a union of cells, so build_database.py stores the cells and, after
+an incremental update, only recomputes those of the campaigns whose measurements
+changed before merging them into the scopes (scope_statistics).
+
+Fits are cached per group (data/.cache/rating_curves.pkl) with an order-independent
+hash of the group's (Q, Qs) pairs: only groups whose data changed are refitted.
+
+    stats = statistics(full_data)          # or merge_statistics([statistics(chunk), ...])
+    curves, refitted = fit_cached(stats, cache_path('data'))
+"""
+
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset import CACHE_DIR_NAME
+
+# Bump when the fit or the cache layout changes
+CACHE_VERSION = 1
+CACHE_NAME = 'rating_curves.pkl'
+
+# Scope -> group column of the joined rows, in output order
+SCOPES = {
+    'section': 'section_id',
+    'river': 'river_id',
+    'method': 'measurement_method',
+}
+
+# Finest grouping of the sums: a campaign uses one method, and belongs to one section
+CELL_COLUMNS = ['campaign_id', 'measurement_method']
+
+# Fewer points leave no degree of freedom for the confidence bounds
+MIN_POINTS = 3
+CONFIDENCE = 0.95
+
+# Two-sided 95 % Student t quantiles for 1 to 10 degrees of freedom; beyond, the
+# Cornish-Fisher expansion around the normal quantile (error < 1e-4)
+T_TABLE = [12.7062, 4.3027, 3.1824, 2.7764, 2.5706, 2.4469, 2.3646, 2.3060, 2.2622, 2.2281]
+Z_975 = 1.959963984540054
+
+# How each per-group sum combines when statistics are merged (the hash is a sum mod 2^64)
+MERGE = {
+    'n': 'sum',
+    'sum_x': 'sum',
+    'sum_y': 'sum',
+    'sum_xx': 'sum',
+    'sum_xy': 'sum',
+    'sum_yy': 'sum',
+    'discharge_min_m3_s': 'min',
+    'discharge_max_m3_s': 'max',
+    'data_hash': 'sum',
+}
+
+# Columns of the published curves
+CURVE_COLUMNS = ['scope', 'group_id', 'n', 'a', 'b', 'r2', 'a_ci_low', 'a_ci_high', 'b_ci_low', 'b_ci_high',
+                 'residual_std_log', 'discharge_min_m3_s', 'discharge_max_m3_s']
+
+
+def t_quantile(dof):
+    """Two-sided 95 % Student t quantile for an array of degrees of freedom (>= 1)"""
+    dof = np.asarray(dof, dtype='float64')
+    z = Z_975
+    expansion = (z + (z ** 3 + z) / 4 / dof
+                 + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96 / dof ** 2
+                 + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384 / dof ** 3
+                 + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160 / dof ** 4)
+    table = np.asarray(T_TABLE)
+    small = (dof >= 1) & (dof <= len(table))
+    return np.where(small, table[np.clip(dof, 1, len(table)).astype(int) - 1], expansion)
+
+
+def point_sums(df):
+    """(rows kept, per-point terms of the sums) of a frame holding discharge_m3_s and
+    bedload_rate_total_kg_s: only points where both are positive are kept"""
+    discharge = pd.to_numeric(df['discharge_m3_s'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    bedload = pd.to_numeric(df['bedload_rate_total_kg_s'], errors='coerce').to_numpy(dtype='float64',
+                                                                                     na_value=np.nan)
+    keep = (discharge > 0) & (bedload > 0)
+    discharge, bedload = discharge[keep], bedload[keep]
+    x, y = np.log(discharge), np.log(bedload)
+    pairs = pd.DataFrame({'q': discharge, 'qs': bedload})
+    return keep, pd.DataFrame({
+        'n': np.ones(len(x), dtype='int64'),
+        'sum_x': x,
+        'sum_y': y,
+        'sum_xx': x * x,
+        'sum_xy': x * y,
+        'sum_yy': y * y,
+        'discharge_min_m3_s': discharge,
+        'discharge_max_m3_s': discharge,
+        'data_hash': pd.util.hash_pandas_object(pairs, index=False).to_numpy(),
+    })
+
+
+def statistics(df):
+    """Per-group sums of one frame of joined rows (discharge_m3_s, bedload_rate_total_kg_s
+    and the SCOPES columns): one row per (scope, group_id), rows with a missing group dropped"""
+    keep, terms = point_sums(df)
+    frames = []
+    for scope, column in SCOPES.items():
+        keys = df[column].to_numpy(dtype=object)[keep]
+        grouped = terms.groupby(pd.Series(keys, name='group_id'), sort=False, dropna=True).agg(MERGE)
+        frames.append(grouped.reset_index().assign(scope=scope))
+    return pd.concat(frames, ignore_index=True)[['scope', 'group_id'] + list(MERGE)]
+
+
+def cell_statistics(df):
+    """Per-cell sums of a frame holding the CELL_COLUMNS and the two rates: one row per cell,
+    a missing campaign or method being a cell of its own"""
+    keep, terms = point_sums(df)
+    keys = [pd.Series(df[col].to_numpy(dtype=object)[keep], name=col) for col in CELL_COLUMNS]
+    grouped = terms.groupby(keys, sort=False, dropna=False).agg(MERGE)
+    return grouped.reset_index()[CELL_COLUMNS + list(MERGE)]
+
+
+def scope_statistics(cells):
+    """Per-group statistics (as statistics() returns them) merged from cells that carry
+    the SCOPES columns of their campaign"""
+    frames = []
+    for scope, column in SCOPES.items():
+        grouped = cells.groupby(cells[column].rename('group_id'), sort=False, dropna=True)[list(MERGE)].agg(MERGE)
+        frames.append(grouped.reset_index().assign(scope=scope))
+    return pd.concat(frames, ignore_index=True)[['scope', 'group_id'] + list(MERGE)]
+
+
+def merge_statistics(frames, keys=('scope', 'group_id')):
+    """Combine the statistics of separate pieces of the data (e.g. chunks), per group
+    (or per cell, with keys=CELL_COLUMNS)"""
+    keys = list(keys)
+    if not frames:
+        return pd.DataFrame({col: [] for col in keys + list(MERGE)})
+    merged = pd.concat(frames, ignore_index=True).groupby(keys, sort=False, dropna=False).agg(MERGE)
+    return merged.reset_index()
+
+
+def fit(stats):
+    """Least-squares fit of every group of a statistics frame, in one vectorized batch.
+    Groups with fewer than MIN_POINTS points or a single discharge value get NaN coefficients."""
+    n = stats['n'].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = stats['sum_x'].to_numpy() / n
+        mean_y = stats['sum_y'].to_numpy() / n
+        sxx = stats['sum_xx'].to_numpy() - n * mean_x * mean_x
+        sxy = stats['sum_xy'].to_numpy() - n * mean_x * mean_y
+        syy = stats['sum_yy'].to_numpy() - n * mean_y * mean_y
+        fitted = (n >= MIN_POINTS) & (sxx > 0)
+        sxx = np.where(fitted, sxx, np.nan)
+
+        b = sxy / sxx
+        log_a = mean_y - b * mean_x
+        r2 = np.where(syy > 0, sxy * sxy / (sxx * syy), np.nan)
+        residual_var = np.maximum(syy - b * sxy, 0) / (n - 2)
+        t = t_quantile(np.maximum(n - 2, 1))
+        b_half = t * np.sqrt(residual_var / sxx)
+        log_a_half = t * np.sqrt(residual_var * (1 / n + mean_x * mean_x / sxx))
+
+    return pd.DataFrame({
+        'scope': stats['scope'].to_numpy(),
+        'group_id': stats['group_id'].to_numpy(),
+        'n': stats['n'].to_numpy(),
+        'a': np.exp(log_a),
+        'b': b,
+        'r2': np.clip(r2, 0, 1),
+        'a_ci_low': np.exp(log_a - log_a_half),
+        'a_ci_high': np.exp(log_a + log_a_half),
+        'b_ci_low': b - b_half,
+        'b_ci_high': b + b_half,
+        'residual_std_log': np.sqrt(residual_var),
+        'discharge_min_m3_s': stats['discharge_min_m3_s'].to_numpy(),
+        'discharge_max_m3_s': stats['discharge_max_m3_s'].to_numpy(),
+    })
+
+
+def cache_path(data_dir):
+    return Path(data_dir) / CACHE_DIR_NAME / CACHE_NAME
+
+
+def load_cache(path):
+    """Fits of the previous run with their group hashes, or None"""
+    try:
+        with open(path, 'rb') as f:
+            cached = pickle.load(f)
+    except Exception:
+        return None
+    return cached['fits'] if cached.get('version') == CACHE_VERSION else None
+
+
+def save_cache(path, fits):
+    try:
+        path.parent.mkdir(exist_ok=True)
+        # Per-process name: build_database.py and generate_api.py may run concurrently
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': CACHE_VERSION, 'fits': fits}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # the cache is an optimization only
+
+
+def fit_cached(stats, path):
+    """(curves, number of groups refitted): the published curves of a statistics frame,
+    reusing the cached fit of every group whose data hash did not change"""
+    stats = stats.set_index(['scope', 'group_id'])
+    cached = load_cache(path)
+    if cached is not None:
+        previous = cached['data_hash'].reindex(stats.index)
+        reuse = (previous == stats['data_hash']).to_numpy()
+    else:
+        reuse = np.zeros(len(stats), dtype=bool)
+
+    refitted = fit(stats[~reuse].reset_index())
+    refitted['data_hash'] = stats.loc[~reuse, 'data_hash'].to_numpy()
+    fits = refitted.set_index(['scope', 'group_id'])
+    if reuse.any():
+        fits = pd.concat([cached.loc[stats.index[reuse]], fits])
+    save_cache(path, fits)
+    return published(fits.reset_index()), int((~reuse).sum())
+
+
+def published(fits):
+    """Curves of the fitted groups, by scope (SCOPES order) then group_id"""
+    curves = fits[fits['b'].notna()]
+    order = curves['scope'].map({scope: i for i, scope in enumerate(SCOPES)})
+    curves = curves.assign(order=order).sort_values(['order', 'group_id'], kind='stable')
+    return curves[CURVE_COLUMNS].reset_index(drop=True)
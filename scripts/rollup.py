@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Rollup cube of the measurements, from which the summary endpoints are derived
+
+One pass over the joined dataset aggregates the measurements into cells over
+(country, river_id, section_id, measurement_method, year). Each cell keeps, per
+measure, the count of values, their sum, sum of squares, minimum and maximum, plus
+the first and last campaign date. These are all mergeable, so cubes of separate
+pieces of the data combine with merge_cubes(), and any summary over a subset of the
+dimensions is a rollup of the cube instead of a new scan of the measurements:
+
+    cube = build_cube(full_data)
+    by_country = rollup(cube, ['country'], distinct=['river_id'])
+    by_country['avg_flux'] = mean(by_country, 'bedload_rate_total_kg_s')
+"""
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ['country', 'river_id', 'section_id', 'measurement_method', 'year']
+
+MEASURES = ['bedload_rate_total_kg_s', 'discharge_m3_s', 'd50_mm']
+
+# How each stored column combines when cells are merged
+MERGE = {'n_measurements': 'sum', 'first_date': 'min', 'last_date': 'max'}
+for _measure in MEASURES:
+    MERGE.update({f'{_measure}_n': 'sum', f'{_measure}_sum': 'sum', f'{_measure}_sumsq': 'sum',
+                  f'{_measure}_min': 'min', f'{_measure}_max': 'max'})
+
+
+def build_cube(full_data):
+    """Aggregate the joined dataset (measurements + campaigns + sections + rivers) into cells
+
+    Rows with a missing dimension value (e.g. a campaign without a date) keep a cell
+    of their own, so rolling up over other dimensions still counts them.
+    """
+    columns = {
+        'country': full_data['country'],
+        'river_id': full_data['river_id'],
+        'section_id': full_data['section_id'],
+        'measurement_method': full_data['measurement_method'],
+        'year': full_data['campaign_date'].dt.year.astype('Int64'),
+        'n_measurements': full_data['measurement_id'].notna().astype('int64'),
+        'first_date': full_data['campaign_date'],
+        'last_date': full_data['campaign_date'],
+    }
+    for measure in MEASURES:
+        values = full_data[measure].astype('float64')
+        columns.update({f'{measure}_n': values.notna().astype('int64'), f'{measure}_sum': values,
+                        f'{measure}_sumsq': values * values, f'{measure}_min': values,
+                        f'{measure}_max': values})
+    return aggregate(pd.DataFrame(columns), DIMENSIONS, dropna=False)
+
+
+def aggregate(cells, by, dropna):
+    """Group cells (or raw rows shaped like cells) by some dimensions and combine them"""
+    grouped = cells.groupby(by, sort=True, observed=True, dropna=dropna)
+    return grouped.agg(MERGE).reset_index()
+
+
+def merge_cubes(cubes):
+    """Combine cubes built from disjoint pieces of the data into one"""
+    return aggregate(pd.concat(cubes, ignore_index=True), DIMENSIONS, dropna=False)
+
+
+def rollup(cube, by, distinct=()):
+    """Summary of the cube over the dimensions in by (rows with a missing key are left out,
+    as in a pandas groupby), with n_<dim> distinct counts for the dimensions in distinct"""
+    result = aggregate(cube, by, dropna=True)
+    for dim in distinct:
+        counts = cube.groupby(by, observed=True)[dim].nunique().rename(f'n_{dim}').reset_index()
+        result = result.merge(counts, on=by, how='left')
+    return result
+
+
+def mean(rolled, measure):
+    """Mean of a measure in each row of a rollup (NaN without values)"""
+    return rolled[f'{measure}_sum'] / rolled[f'{measure}_n'].where(rolled[f'{measure}_n'] > 0)
+
+
+def std(rolled, measure):
+    """Sample standard deviation of a measure in each row of a rollup (NaN below two values)"""
+    n = rolled[f'{measure}_n'].where(rolled[f'{measure}_n'] > 1)
+    total = rolled[f'{measure}_sum']
+    variance = (rolled[f'{measure}_sumsq'] - total * total / n) / (n - 1)
+    return np.sqrt(variance.clip(lower=0))
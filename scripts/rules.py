@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Declarative validation rules for the database CSV files
+
+Checks are declared as rules (required, range, enum, pattern, ordering, conditional,
+foreign key, uniqueness, method columns) and grouped in a RuleSet per table. A RuleSet
+evaluates all its row-level rules in one vectorized pass into a boolean error matrix
+(rows x rules) and reports violations as CSV line numbers instead of id lists.
+
+Checking is split in two steps so a table can be checked in pieces (chunks, worker
+processes) and the pieces merged afterwards:
+    partial = rule_set.check(df, context, first_line)   # one per chunk
+    errors, warnings = rule_set.report([partial, ...], read_rows)   # in chunk order
+
+read_rows(lines, columns) returns the rows at some CSV lines, for the aggregate rules
+that confirm their candidates on the values themselves (Unique).
+"""
+
+import numpy as np
+import pandas as pd
+
+from profiling import NULL_PROFILER
+
+# Line number of the first data row in a CSV file (line 1 is the header)
+FIRST_DATA_LINE = 2
+
+# Maximum number of line numbers listed in a message
+MAX_LISTED_LINES = 20
+
+
+def format_lines(lines):
+    """'3 rows (lines 4, 7, 9)' with the list truncated after MAX_LISTED_LINES"""
+    listed = ', '.join(str(line) for line in lines[:MAX_LISTED_LINES])
+    if len(lines) > MAX_LISTED_LINES:
+        listed += f', ... (+{len(lines) - MAX_LISTED_LINES} more)'
+    return f"{len(lines)} row{'s' if len(lines) > 1 else ''} (line{'s' if len(lines) > 1 else ''} {listed})"
+
+
+def category_mask(series, category_test):
+    """Evaluate a per-value test on the categories of a categorical only, then map by codes"""
+    categories = series.cat.categories
+    bad = np.append(np.asarray(category_test(pd.Series(categories)), dtype=bool), False)
+    # code -1 (missing) picks the trailing False
+    return bad[series.cat.codes.to_numpy()]
+
+
+class Rule:
+    """Row-level rule: mask() returns True for every row that violates it"""
+
+    aggregate = False
+
+    def __init__(self, columns, message, severity='error'):
+        self.columns = [columns] if isinstance(columns, str) else list(columns)
+        self.message = message
+        self.severity = severity
+
+    def applies(self, df, context):
+        """Whether the columns (and parent keys) this rule needs are available"""
+        return all(col in df.columns for col in self.columns)
+
+    def mask(self, df, context):
+        raise NotImplementedError
+
+    def describe(self):
+        return f"{self.message} [{', '.join(self.columns)}]"
+
+    def shift_partial(self, partial, offset):
+        """Aggregate partial with its line numbers moved by offset"""
+        return partial
+
+
+class Required(Rule):
+    """Value must be present"""
+
+    def __init__(self, column, message=None, severity='error'):
+        super().__init__(column, message or f"Column '{column}' has empty values (required field)", severity)
+
+    def mask(self, df, context):
+        return df[self.columns[0]].isna().to_numpy()
+
+
+class Range(Rule):
+    """Numeric value must lie within [minimum, maximum] (missing values pass)"""
+
+    def __init__(self, column, message, minimum=None, maximum=None, severity='error'):
+        super().__init__(column, message, severity)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def mask(self, df, context):
+        values = df[self.columns[0]].to_numpy(dtype='float64', na_value=np.nan)
+        bad = np.zeros(len(values), dtype=bool)
+        if self.minimum is not None:
+            bad |= values < self.minimum
+        if self.maximum is not None:
+            bad |= values > self.maximum
+        return bad
+
+
+class Enum(Rule):
+    """Value must be one of the allowed values (missing values pass unless allow_missing=False)"""
+
+    def __init__(self, column, allowed, message, allow_missing=True, severity='error'):
+        super().__init__(column, message, severity)
+        self.allowed = list(allowed)
+        self.allow_missing = allow_missing
+
+    def mask(self, df, context):
+        series = df[self.columns[0]]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            bad = category_mask(series, lambda cats: ~cats.isin(self.allowed))
+        else:
+            bad = (series.notna() & ~series.isin(self.allowed)).to_numpy()
+        if not self.allow_missing:
+            bad = bad | series.isna().to_numpy()
+        return bad
+
+    def describe(self):
+        return f"{self.message} (allowed: {self.allowed}) [{self.columns[0]}]"
+
+
+class Pattern(Rule):
+    """Text value must match a regular expression (missing values pass)"""
+
+    def __init__(self, column, pattern, message, severity='error'):
+        super().__init__(column, message, severity)
+        self.pattern = pattern
+
+    def mask(self, df, context):
+        series = df[self.columns[0]]
+        test = lambda values: ~values.astype(str).str.match(self.pattern)
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return category_mask(series, test)
+        present = series.notna().to_numpy()
+        bad = np.zeros(len(series), dtype=bool)
+        bad[present] = test(series[present]).to_numpy(dtype=bool)
+        return bad
+
+
+class Ordering(Rule):
+    """Columns must be strictly increasing, e.g. d10 < d50 < d84 (pairs with a missing value pass)"""
+
+    def mask(self, df, context):
+        values = [df[col].to_numpy(dtype='float64', na_value=np.nan) for col in self.columns]
+        bad = np.zeros(len(df), dtype=bool)
+        for lower, upper in zip(values, values[1:]):
+            bad |= lower >= upper
+        return bad
+
+
+class Conditional(Rule):
+    """Column may only be filled when another column has a given value"""
+
+    def __init__(self, column, when_column, when_value, message, severity='error'):
+        super().__init__([column, when_column], message, severity)
+        self.when_value = when_value
+
+    def mask(self, df, context):
+        column, when_column = self.columns
+        return (df[column].notna() & (df[when_column] != self.when_value)).to_numpy()
+
+
+class ForeignKey(Rule):
+    """Value must exist in the key set of a parent table, given in context[parent]"""
+
+    def __init__(self, column, parent, message, severity='error'):
+        super().__init__(column, message, severity)
+        self.parent = parent
+
+    def applies(self, df, context):
+        return super().applies(df, context) and context.get(self.parent) is not None
+
+    def mask(self, df, context):
+        return ~df[self.columns[0]].isin(context[self.parent]).to_numpy()
+
+
+class Unique(Rule):
+    """Value must not be repeated anywhere in the table (all occurrences are reported)
+
+    Aggregate rule: each piece of the table contributes the 64-bit hashes of its keys
+    with their line numbers, so memory stays at 16 bytes per row whatever the key size.
+    Equal hashes only make candidates: once all pieces are merged, confirm() compares
+    the values of the candidate lines, re-read from the table, so a hash collision
+    between different keys is not reported.
+    """
+
+    aggregate = True
+
+    def collect(self, df, context, lines):
+        keys = df[self.columns[0]]
+        present = keys.notna().to_numpy()
+        # Keys are nearly all distinct, so skip hash_array's factorize step
+        hashes = pd.util.hash_array(keys[present].to_numpy(dtype=object), categorize=False)
+        return hashes, lines[present]
+
+    def shift_partial(self, partial, offset):
+        return partial[0], partial[1] + offset
+
+    def finish(self, partials):
+        """Candidate lines: those whose key hash is shared with another line"""
+        hashes = np.concatenate([p[0] for p in partials]) if partials else np.empty(0, 'uint64')
+        lines = np.concatenate([p[1] for p in partials]) if partials else np.empty(0, 'int64')
+        order = np.argsort(hashes, kind='stable')
+        hashes = hashes[order]
+        same_as_next = hashes[1:] == hashes[:-1]
+        duplicated = np.zeros(len(hashes), dtype=bool)
+        duplicated[1:] |= same_as_next
+        duplicated[:-1] |= same_as_next
+        return np.sort(lines[order][duplicated])
+
+    def confirm(self, lines, rows):
+        """Candidate lines whose key is really repeated, given their rows (in lines order)"""
+        repeated = rows[self.columns[0]].duplicated(keep=False).to_numpy()
+        return lines[repeated]
+
+
+class MethodColumns(Rule):
+    """When a measurement method is used, at least one of its specific columns must be filled
+
+    Aggregate rule over the whole table: reported once, without line numbers.
+    """
+
+    aggregate = True
+
+    def __init__(self, method, method_columns, severity='warning'):
+        super().__init__('measurement_method',
+                         f"Method '{method}' used but no {method}-specific columns filled", severity)
+        self.method = method
+        self.method_columns = list(method_columns)
+
+    def collect(self, df, context, lines):
+        rows = (df['measurement_method'] == self.method).to_numpy()
+        if not rows.any():
+            return False, False
+        cols = [col for col in self.method_columns if col in df.columns]
+        return True, bool(df.loc[rows, cols].notna().to_numpy().any())
+
+    def finish(self, partials):
+        used = any(p[0] for p in partials)
+        filled = any(p[1] for p in partials)
+        return used and not filled
+
+    def describe(self):
+        return self.message
+
+
+class TableCheck:
+    """Result of checking one piece of a table: violating lines per row rule and aggregate partials"""
+
+    def __init__(self, n_rows, rule_lines, aggregate_partials):
+        self.n_rows = n_rows
+        self.rule_lines = rule_lines
+        self.aggregate_partials = aggregate_partials
+
+
+class RuleSet:
+    """The rules of one table, evaluated together"""
+
+    def __init__(self, filename, rules):
+        self.filename = filename
+        self.rules = list(rules)
+
+    def active_rules(self, df, context):
+        """Rules that can be evaluated on this frame (columns present, parent keys given)"""
+        return [rule for rule in self.rules if rule.applies(df, context)]
+
+    def error_matrix(self, df, context=None, profiler=NULL_PROFILER):
+        """Boolean matrix (rows x active row rules), True where a row violates a rule
+
+        With a profiler, the time of each rule type (Range, Enum...) is recorded as a stage.
+        """
+        context = context or {}
+        row_rules = [rule for rule in self.active_rules(df, context) if not rule.aggregate]
+        matrix = np.zeros((len(df), len(row_rules)), dtype=bool)
+        for j, rule in enumerate(row_rules):
+            with profiler.stage(type(rule).__name__) as stage:
+                matrix[:, j] = rule.mask(df, context)
+                stage.add(rows=len(df))
+        return row_rules, matrix
+
+    def check(self, df, context=None, first_line=FIRST_DATA_LINE, profiler=NULL_PROFILER):
+        """Check one piece of a table whose first row is at CSV line first_line"""
+        context = context or {}
+        lines = np.arange(first_line, first_line + len(df))
+        row_rules, matrix = self.error_matrix(df, context, profiler)
+
+        rule_lines = {}
+        for j, rule in enumerate(row_rules):
+            rule_lines[self.rules.index(rule)] = lines[matrix[:, j]]
+
+        aggregate_partials = {}
+        for rule in self.active_rules(df, context):
+            if rule.aggregate:
+                with profiler.stage(type(rule).__name__) as stage:
+                    aggregate_partials[self.rules.index(rule)] = rule.collect(df, context, lines)
+                    stage.add(rows=len(df))
+
+        return TableCheck(len(df), rule_lines, aggregate_partials)
+
+    def shift(self, check, offset):
+        """Move the line numbers of a check by offset (for pieces checked before their
+        position in the file was known)"""
+        rule_lines = {i: lines + offset for i, lines in check.rule_lines.items()}
+        aggregate_partials = {i: self.rules[i].shift_partial(partial, offset)
+                              for i, partial in check.aggregate_partials.items()}
+        return TableCheck(check.n_rows, rule_lines, aggregate_partials)
+
+    def report(self, checks, read_rows=None):
+        """Merge the checks of all pieces (in order) into (errors, warnings) messages
+
+        read_rows(lines, columns): rows of the table at these CSV lines, to confirm the
+        candidates of rules that have a confirm() step (without it, they are reported
+        as candidates).
+        """
+        errors, warnings = [], []
+        for i, rule in enumerate(self.rules):
+            target = errors if rule.severity == 'error' else warnings
+
+            if rule.aggregate:
+                partials = [c.aggregate_partials[i] for c in checks if i in c.aggregate_partials]
+                if not partials:
+                    continue
+                result = rule.finish(partials)
+                if hasattr(rule, 'confirm') and read_rows is not None and len(result) > 0:
+                    result = rule.confirm(result, read_rows(result, rule.columns))
+                if isinstance(result, np.ndarray):
+                    if len(result) > 0:
+                        target.append(f"{self.filename}: {rule.describe()}: {format_lines(result)}")
+                elif result:
+                    target.append(f"{self.filename}: {rule.describe()}")
+                continue
+
+            parts = [c.rule_lines[i] for c in checks if i in c.rule_lines]
+            if parts:
+                lines = np.concatenate(parts)
+                if len(lines) > 0:
+                    target.append(f"{self.filename}: {rule.describe()}: {format_lines(lines)}")
+
+        return errors, warnings
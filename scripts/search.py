@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Full-text search over names, notes, data providers and references
+
+Queries the search_index FTS5 table built by build_database.py and returns ranked
+matches with the table and primary key of each record and a highlighted snippet.
+
+Usage:
+    python scripts/search.py "acoustic calibration"
+    python scripts/search.py "isère" --table sections --limit 5
+
+    import sqlite3, search
+    search.search(sqlite3.connect('bedload_transport.db'), 'upstream reach')
+"""
+
+import argparse
+import re
+import sqlite3
+import pandas as pd
+
+# bm25 weight per search_index column (table_name, row_key, name, data_provider, reference, notes)
+COLUMN_WEIGHTS = (0.0, 0.0, 10.0, 5.0, 5.0, 1.0)
+
+SNIPPET_TOKENS = 12
+
+
+def match_expression(text, prefix=True):
+    """FTS5 query matching records containing every word of text (the last one as a prefix
+    when prefix=True, for search-as-you-type), with FTS5 operators and punctuation ignored"""
+    words = re.findall(r'\w+', text)
+    terms = [f'"{word}"' for word in words]
+    if prefix and terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search(conn, text, tables=None, limit=20, prefix=True, raw=False):
+    """Ranked matches of text as a DataFrame (table_name, row_key, score, snippet)
+
+    tables restricts the results to some tables (e.g. ['sections']); raw=True passes
+    text to FTS5 unchanged (NEAR, OR, column filters such as 'notes: gravel').
+    Lower scores rank first.
+    """
+    query = text if raw else match_expression(text, prefix)
+    if not query:
+        return pd.DataFrame(columns=['table_name', 'row_key', 'score', 'snippet'])
+
+    weights = ', '.join(str(w) for w in COLUMN_WEIGHTS)
+    sql = f'''
+        SELECT table_name, row_key, bm25(search_index, {weights}) AS score,
+               snippet(search_index, -1, '[', ']', '…', {SNIPPET_TOKENS}) AS snippet
+        FROM search_index
+        WHERE search_index MATCH ?
+    '''
+    params = [query]
+    if tables:
+        sql += f" AND table_name IN ({', '.join('?' for _ in tables)})"
+        params += list(tables)
+    sql += ' ORDER BY score LIMIT ?'
+    params.append(limit)
+    return pd.read_sql_query(sql, conn, params=params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full-text search in bedload_transport.db')
+    parser.add_argument('text', help='words to search for')
+    parser.add_argument('--db', default='bedload_transport.db', help='database file (default: bedload_transport.db)')
+    parser.add_argument('--table', action='append', choices=['rivers', 'sections', 'campaigns'],
+                        help='only search this table (repeatable)')
+    parser.add_argument('--limit', type=int, default=20, help='maximum number of results (default: 20)')
+    parser.add_argument('--raw', action='store_true', help='pass the text to FTS5 as a raw query')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        results = search(conn, args.text, args.table, args.limit, raw=args.raw)
+    except sqlite3.OperationalError as e:
+        print(f"❌ ERROR: {e} (database built without the search index? rerun build_database.py)")
+        return
+    finally:
+        conn.close()
+
+    if results.empty:
+        print("No match")
+    for row in results.itertuples(index=False):
+        print(f"{row.table_name:10s} {row.row_key:25s} {row.score:8.2f}  {row.snippet}")
+
+
+if __name__ == '__main__':
+    main()
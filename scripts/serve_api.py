@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Local HTTP server for the API, read from bedload_transport.db
+
+Serves the endpoint names of the static API (all, rivers, sections, measurements,
+by_country/{country}, by_river/{river_id}, by_section/{section_id}, the summaries,
+stats and rating_curves) straight from the database, with no external dependency:
+    - filters: any column as a query parameter (?country=FRA&measurement_method=...),
+      plus start / end on campaign_date
+    - field selection: ?fields=measurement_id,discharge_m3_s
+    - cursor pagination: ?limit=500, then the cursor of the Link / X-Next-Cursor headers
+    - strong ETags derived from the database generation, answered with 304 Not
+      Modified on If-None-Match without running the query
+    - gzip (and brotli when installed) response compression
+
+Usage:
+    python scripts/serve_api.py [--db bedload_transport.db] [--port 8000]
+    curl 'http://127.0.0.1:8000/api/by_river/ARC.json?fields=measurement_id,d50_mm&limit=2'
+"""
+
+import argparse
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import traceback
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit
+
+import rating_curves
+import rollup
+from dataset import SCHEMA
+from generate_api import SHARDS, build_stats, build_summaries, full_join
+from json_writer import brotli, frame_records
+from queries import POOL_SIZE, LRUCache, QueryLibrary
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+# Encoded responses kept by ETag (least recently used dropped first)
+RESPONSE_CACHE = 128
+# Smaller bodies are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 15
+MAX_HEADER_BYTES = 65536
+
+# Endpoint -> (row source of queries.describe(), key column used by the cursor, default fields)
+TABLE_ENDPOINTS = {
+    'all': ('all', 'measurement_id', None),
+    'rivers': ('rivers', 'river_id', None),
+    'sections': ('sections', 'section_id', None),
+    'measurements': ('measurements', 'measurement_id', list(SCHEMA['measurements'])),
+}
+
+SUMMARY_ENDPOINTS = ['summary_by_country', 'summary_by_method', 'summary_by_river',
+                     'summary_by_country_method', 'summary_by_river_year', 'stats', 'rating_curves']
+
+# Parameters that are not column filters
+RESERVED_PARAMETERS = {'fields', 'limit', 'cursor', 'start', 'end'}
+
+STATUS_TEXT = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 431: 'Request Header Fields Too Large',
+               500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPError(400, 'invalid cursor')
+
+
+def dumps(value):
+    return json.dumps(value, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+
+def accepted_encodings(header):
+    """Content codings of an Accept-Encoding header with a non-zero quality"""
+    encodings = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q=') and float(quality[2:] or 0) == 0:
+            continue
+        encodings.add(coding.strip().lower())
+    return encodings
+
+
+def negotiate_encoding(header):
+    encodings = accepted_encodings(header or '')
+    if brotli is not None and 'br' in encodings:
+        return 'br'
+    if 'gzip' in encodings or '*' in encodings:
+        return 'gzip'
+    return 'identity'
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body)
+    if encoding == 'gzip':
+        return gzip.compress(body, mtime=0)
+    return body
+
+
+class ApiServer:
+    """Endpoints of the static API answered from a database, for asyncio.start_server"""
+
+    def __init__(self, db_path='bedload_transport.db', page_size=DEFAULT_PAGE_SIZE, pool_size=POOL_SIZE):
+        self.library = QueryLibrary(db_path, pool_size)
+        self.page_size = page_size
+        self.responses = LRUCache(RESPONSE_CACHE)
+        self.summaries = (None, None)
+
+    def generation(self):
+        """Token of the current database generation (build_info): part of every ETag"""
+        return hashlib.sha256(repr(self.library.check_database()).encode()).hexdigest()[:16]
+
+    def summary_frames(self, generation):
+        """Summaries and stats of the current database, computed once per generation"""
+        built, frames = self.summaries
+        if built != generation:
+            tables = self.library.tables()
+            full_data = full_join(tables['rivers'], tables['sections'], tables['campaigns'], tables['measurements'])
+            frames = build_summaries(rollup.build_cube(full_data), tables['rivers'])
+            frames['stats'] = build_stats(tables['rivers'], tables['sections'], tables['campaigns'],
+                                          tables['measurements'])
+            frames['rating_curves'] = rating_curves.published(rating_curves.fit(rating_curves.statistics(full_data)))
+            self.summaries = (generation, frames)
+        return frames
+
+    def endpoint(self, path):
+        """(name, shard filter) of a request path, /api prefix and .json suffix optional"""
+        path = unquote(path).strip('/')
+        if path == 'api' or path.startswith('api/'):
+            path = path[4:]
+        if path.endswith('.json'):
+            path = path[:-5]
+        folder, _, key = path.partition('/')
+        if key and folder in SHARDS:
+            return 'all', {SHARDS[folder]: key}
+        return path or 'index', {}
+
+    def table_page(self, name, shard, params):
+        """JSON rows of a table endpoint and the cursor of the next page"""
+        kind, key, default_fields = TABLE_ENDPOINTS[name]
+        _, expressions, date_column, _ = self.library.uncached(lambda conn, sources: sources[kind])
+
+        filters = dict(shard)
+        for param, value in params.items():
+            if param in ('start', 'end'):
+                if date_column is None:
+                    raise HTTPError(400, f'{name} has no date to filter on')
+                filters[param] = value
+            elif param not in RESERVED_PARAMETERS:
+                if param not in expressions:
+                    raise HTTPError(400, f'unknown column: {param}')
+                filters[param] = value
+
+        fields = params['fields'].split(',') if params.get('fields') else default_fields or list(expressions)
+        unknown = [field for field in fields if field not in expressions]
+        if unknown:
+            raise HTTPError(400, f"unknown fields: {', '.join(unknown)}")
+        try:
+            limit = int(params.get('limit', self.page_size))
+        except ValueError:
+            raise HTTPError(400, 'limit must be an integer')
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise HTTPError(400, f'limit must be between 1 and {MAX_PAGE_SIZE}')
+        if 'cursor' in params:
+            filters['after'] = decode_cursor(params['cursor'])
+
+        # The key is always read: it is the cursor of the next page
+        columns = fields if key in fields else [key] + fields
+        rows = self.library.uncached(
+            lambda conn, sources: self.library.select(conn, sources, kind, filters, columns, [key], limit + 1))
+        next_cursor = encode_cursor(rows[key].iloc[limit - 1]) if len(rows) > limit else None
+        return dumps(frame_records(rows.iloc[:limit][fields])), next_cursor
+
+    def summary(self, name, frames, params):
+        """JSON rows of a summary, filtered on its columns and restricted to fields"""
+        df = frames[name]
+        for param, value in params.items():
+            if param == 'fields':
+                continue
+            if param not in df.columns:
+                raise HTTPError(400, f'unknown column: {param}')
+            df = df[df[param].astype(str) == value]
+        if params.get('fields'):
+            fields = params['fields'].split(',')
+            unknown = [field for field in fields if field not in df.columns]
+            if unknown:
+                raise HTTPError(400, f"unknown fields: {', '.join(unknown)}")
+            df = df[fields]
+        return dumps(frame_records(df))
+
+    def index(self, base_url):
+        endpoints = {name: f'{base_url}/{name}.json' for name in TABLE_ENDPOINTS}
+        endpoints.update({name: f'{base_url}/{name}.json' for name in SUMMARY_ENDPOINTS})
+        endpoints.update({folder: f'{base_url}/{folder}/{{{column}}}.json' for folder, column in SHARDS.items()})
+        return dumps({
+            'version': '1.0',
+            'description': 'Global Bedload Transport Database - local API server',
+            'endpoints': endpoints,
+            'parameters': {
+                'filters': '<column>=<value>, start=YYYY-MM-DD, end=YYYY-MM-DD',
+                'fields': 'comma-separated columns',
+                'limit': f'rows per page (default {self.page_size}, max {MAX_PAGE_SIZE})',
+                'cursor': 'next page, from the Link or X-Next-Cursor header',
+            },
+        })
+
+    def respond(self, method, target, headers):
+        """(status, headers, body) of a request (runs in a worker thread)"""
+        if method not in ('GET', 'HEAD'):
+            raise HTTPError(405, 'only GET and HEAD are supported')
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        name, shard = self.endpoint(url.path)
+
+        # Strong ETag: same database generation + same request = same bytes, one per coding
+        encoding = negotiate_encoding(headers.get('accept-encoding'))
+        generation = self.generation()
+        canonical = f'{url.path}?{urlencode(sorted(params.items()))}'
+        tag = hashlib.sha256(f'{generation} {canonical}'.encode('utf-8')).hexdigest()[:32]
+        candidates = {f'"{tag}"', f'"{tag}-{encoding}"'}
+        if_none_match = {value.strip() for value in headers.get('if-none-match', '').split(',')}
+        matched = candidates & if_none_match
+        if matched or '*' in if_none_match:
+            etag = matched.pop() if matched else f'"{tag}"'
+            return 304, {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}, b''
+
+        cached = self.responses.get((tag, encoding))
+        if cached is not None:
+            return 200, *cached
+
+        extra = {}
+        if name == 'index':
+            host = headers.get('host', 'localhost')
+            body = self.index(f'http://{host}/api')
+        elif name in TABLE_ENDPOINTS:
+            body, next_cursor = self.table_page(name, shard, params)
+            if next_cursor:
+                next_params = {**params, 'cursor': next_cursor}
+                extra['Link'] = f'<{quote(url.path)}?{urlencode(next_params)}>; rel="next"'
+                extra['X-Next-Cursor'] = next_cursor
+        elif name in SUMMARY_ENDPOINTS:
+            frames = self.summary_frames(generation)
+            if name == 'stats':
+                if params:
+                    raise HTTPError(400, 'stats takes no parameters')
+                body = dumps(frames['stats'])
+            else:
+                body = self.summary(name, frames, params)
+        else:
+            raise HTTPError(404, f'no endpoint {url.path}')
+
+        # Cached under the negotiated coding, even when the body is too small to compress
+        negotiated = encoding
+        if len(body) < MIN_COMPRESS_BYTES:
+            encoding = 'identity'
+        body = compress(body, encoding)
+        response_headers = {
+            'Content-Type': 'application/json; charset=utf-8',
+            'ETag': f'"{tag}"' if encoding == 'identity' else f'"{tag}-{encoding}"',
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding',
+            **extra,
+        }
+        if encoding != 'identity':
+            response_headers['Content-Encoding'] = encoding
+        self.responses.put((tag, negotiated), (response_headers, body))
+        return 200, response_headers, body
+
+    async def dispatch(self, method, target, headers):
+        try:
+            return await asyncio.to_thread(self.respond, method, target, headers)
+        except HTTPError as e:
+            return e.status, {'Content-Type': 'application/json; charset=utf-8'}, dumps({'error': e.message})
+        except Exception:
+            traceback.print_exc()
+            return 500, {'Content-Type': 'application/json; charset=utf-8'}, dumps({'error': 'internal error'})
+
+    async def handle(self, reader, writer):
+        """One client connection: HTTP/1.1 requests with keep-alive"""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send(writer, 'GET', 431, {}, b'', False)
+                    break
+
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                except ValueError:
+                    await self.send(writer, 'GET', 400, {}, b'', False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    field, _, value = line.partition(':')
+                    if field:
+                        headers[field.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0) or 0)
+                if length:
+                    await reader.readexactly(length)  # request bodies are ignored
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+                status, response_headers, body = await self.dispatch(method, target, headers)
+                await self.send(writer, method, status, response_headers, body, keep_alive)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def send(self, writer, method, status, headers, body, keep_alive):
+        head = [f'HTTP/1.1 {status} {STATUS_TEXT[status]}',
+                f'Content-Length: {len(body)}',
+                'Access-Control-Allow-Origin: *',
+                'Access-Control-Expose-Headers: ETag, Link, X-Next-Cursor',
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f'{field}: {value}' for field, value in headers.items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        if method != 'HEAD' and status != 304:
+            writer.write(body)
+        await writer.drain()
+
+    def close(self):
+        self.library.close()
+
+
+async def serve(db_path, host, port, page_size, pool_size):
+    api = ApiServer(db_path, page_size, pool_size)
+    api.generation()  # fails early if the database is missing
+    server = await asyncio.start_server(api.handle, host, port, limit=MAX_HEADER_BYTES)
+    address = server.sockets[0].getsockname()
+    print(f"🌐 Serving {db_path} on http://{address[0]}:{address[1]}/api/index.json", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the API from bedload_transport.db')
+    parser.add_argument('--db', default='bedload_transport.db', help='database file (default: bedload_transport.db)')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='port, 0 for any free port (default: 8000)')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f'rows per page without ?limit= (default: {DEFAULT_PAGE_SIZE})')
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE,
+                        help=f'read-only database connections (default: {POOL_SIZE})')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.db, args.host, args.port, args.page_size, args.pool_size))
+    except FileNotFoundError as e:
+        print(f"❌ ERROR: {e}")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
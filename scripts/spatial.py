@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Spatial queries on the sections of bedload_transport.db
+
+Sections inside a bounding box or within a radius of a point, optionally with their
+aggregated measurements. Candidates come from the sections_rtree R*Tree built by
+build_database.py (a plain scan of sections is used if the database has none), and
+are then checked against the exact coordinates.
+
+    import sqlite3, spatial
+    conn = sqlite3.connect('bedload_transport.db')
+    spatial.sections_in_bbox(conn, 45.0, 6.0, 46.0, 7.5)
+    spatial.sections_within_radius(conn, 45.6, 6.8, 50, with_measurements=True)
+"""
+
+import numpy as np
+import pandas as pd
+
+import queries
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Per-section aggregates joined by with_measurements=True ({first_date} / {last_date}:
+# date expressions, see measurement_aggregates)
+MEASUREMENT_AGGREGATES = '''
+    COUNT(DISTINCT c.campaign_id) AS n_campaigns,
+    COUNT(m.measurement_id) AS n_measurements,
+    AVG(m.bedload_rate_total_kg_s) AS avg_flux,
+    MIN(m.bedload_rate_total_kg_s) AS min_flux,
+    MAX(m.bedload_rate_total_kg_s) AS max_flux,
+    {first_date} AS first_date,
+    {last_date} AS last_date
+'''
+
+
+def measurement_aggregates(conn):
+    """MEASUREMENT_AGGREGATES with first / last_date as YYYY-MM-DD strings on every schema:
+    the optimized one stores campaign_date as YYYYMMDD integers, decoded as QueryLibrary does"""
+    types = {row[1]: row[2] for row in conn.execute('PRAGMA table_info(campaigns)')}
+    dates = {'first_date': 'MIN(c.campaign_date)', 'last_date': 'MAX(c.campaign_date)'}
+    if types.get('campaign_date', '').upper() == 'INTEGER':
+        # Sections without campaigns keep a NULL date
+        dates = {name: f'CASE WHEN {value} IS NULL THEN NULL ELSE {queries.ISO_DATE.format(value)} END'
+                 for name, value in dates.items()}
+    return MEASUREMENT_AGGREGATES.format(**dates)
+
+
+def has_rtree(conn):
+    """Whether the database has the section R*Tree"""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sections_rtree'").fetchone() is not None
+
+
+def longitude_ranges(min_lon, max_lon):
+    """[(min, max)] longitude ranges of a box, split in two when it crosses the antimeridian
+    (min_lon > max_lon, e.g. 170 -> -170)"""
+    if min_lon <= max_lon:
+        return [(min_lon, max_lon)]
+    return [(min_lon, 180.0), (-180.0, max_lon)]
+
+
+def bbox_query(min_lat, min_lon, max_lat, max_lon, use_index):
+    """SQL and parameters selecting the sections inside a box"""
+    conditions, params = [], []
+    for lon_start, lon_end in longitude_ranges(min_lon, max_lon):
+        if use_index:
+            # R*Tree coordinates are float32 rounded outwards: exact bounds re-checked on sections
+            conditions.append('(r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ? '
+                              'AND s.latitude BETWEEN ? AND ? AND s.longitude BETWEEN ? AND ?)')
+            params += [max_lat, min_lat, lon_end, lon_start, min_lat, max_lat, lon_start, lon_end]
+        else:
+            conditions.append('(s.latitude BETWEEN ? AND ? AND s.longitude BETWEEN ? AND ?)')
+            params += [min_lat, max_lat, lon_start, lon_end]
+
+    source = 'sections_rtree r JOIN sections s ON s.rowid = r.id' if use_index else 'sections s'
+    return f'SELECT s.* FROM {source} WHERE {" OR ".join(conditions)}', params
+
+
+def query_sections(conn, min_lat, min_lon, max_lat, max_lon, with_measurements, use_index):
+    sql, params = bbox_query(min_lat, min_lon, max_lat, max_lon,
+                             has_rtree(conn) if use_index is None else use_index)
+    if with_measurements:
+        sql = f'''
+            SELECT s.*, {measurement_aggregates(conn)}
+            FROM ({sql}) s
+            LEFT JOIN campaigns c ON c.section_id = s.section_id
+            LEFT JOIN measurements m ON m.campaign_id = c.campaign_id
+            GROUP BY s.section_id
+        '''
+    return pd.read_sql_query(f'{sql} ORDER BY s.section_id', conn, params=params)
+
+
+def sections_in_bbox(conn, min_lat, min_lon, max_lat, max_lon, with_measurements=False, use_index=None):
+    """Sections with min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon
+
+    A box with min_lon > max_lon crosses the antimeridian. with_measurements adds
+    n_campaigns, n_measurements, avg/min/max_flux and first/last_date per section.
+    use_index: None uses the R*Tree when present, False forces a scan of sections.
+    """
+    return query_sections(conn, min_lat, min_lon, max_lat, max_lon, with_measurements, use_index)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (vectorized over numpy arrays)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype='float64')) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    """Bounding box (min_lat, min_lon, max_lat, max_lon) of a circle, whole longitudes near a pole"""
+    delta_lat = np.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = latitude - delta_lat, latitude + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0
+
+    delta_lon = np.degrees(np.arcsin(min(1.0, np.sin(radius_km / EARTH_RADIUS_KM) / np.cos(np.radians(latitude)))))
+    if delta_lon >= 180:
+        return min_lat, -180.0, max_lat, 180.0
+    # Wrap into [-180, 180]: a box crossing the antimeridian ends up with min_lon > max_lon
+    min_lon = (longitude - delta_lon + 180) % 360 - 180
+    max_lon = (longitude + delta_lon + 180) % 360 - 180
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def sections_within_radius(conn, latitude, longitude, radius_km, with_measurements=False, use_index=None):
+    """Sections within radius_km of a point, nearest first, with their distance_km
+
+    Same options as sections_in_bbox; the bounding box of the circle is queried, then
+    sections are filtered on their great-circle distance.
+    """
+    min_lat, min_lon, max_lat, max_lon = radius_bbox(latitude, longitude, radius_km)
+    df = query_sections(conn, min_lat, min_lon, max_lat, max_lon, with_measurements, use_index)
+    df['distance_km'] = haversine_km(latitude, longitude, df['latitude'], df['longitude'])
+    df = df[df['distance_km'] <= radius_km]
+    return df.sort_values(['distance_km', 'section_id'], kind='stable').reset_index(drop=True)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tile pyramid of the sections for viewport-based map loading (api/tiles/{z}/{x}/{y}.json)
+
+Tiles follow the Web Mercator XYZ scheme used by Leaflet / OpenStreetMap. Below
+DETAIL_ZOOM each tile is divided in a grid of CLUSTER_GRID x CLUSTER_GRID cells (about
+32 px at 256 px per tile): cells holding several sections are published as one
+cluster with counts and flux statistics, a section alone in its cell is published
+individually. From DETAIL_ZOOM on every section is individual; deeper zoom levels
+reuse the DETAIL_ZOOM tiles (over-zoom), so no tile is written beyond it.
+"""
+
+import numpy as np
+import pandas as pd
+
+from json_writer import frame_records
+
+MIN_ZOOM = 0
+DETAIL_ZOOM = 10
+
+# Cluster cells per tile side below DETAIL_ZOOM (power of two)
+CLUSTER_GRID = 8
+
+# Web Mercator latitude limit
+MAX_LATITUDE = 85.0511287798
+
+SECTION_COLUMNS = ['section_id', 'river_id', 'section_name', 'latitude', 'longitude']
+
+
+def world_coordinates(latitude, longitude):
+    """Web Mercator coordinates in [0, 1) (x eastward, y southward) of WGS84 positions"""
+    lat = np.radians(np.clip(latitude, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(longitude, dtype='float64') + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0
+    return np.clip(x, 0.0, np.nextafter(1.0, 0.0)), np.clip(y, 0.0, np.nextafter(1.0, 0.0))
+
+
+def section_frame(sections, section_stats):
+    """Sections with a position and their measurement statistics (from a rollup by section_id)"""
+    flux = 'bedload_rate_total_kg_s'
+    located = sections.dropna(subset=['latitude', 'longitude'])[SECTION_COLUMNS]
+    stats = section_stats[['section_id', 'n_measurements', f'{flux}_n', f'{flux}_sum',
+                           f'{flux}_min', f'{flux}_max']]
+    df = located.merge(stats, on='section_id', how='left')
+    for col in ['n_measurements', f'{flux}_n']:
+        df[col] = df[col].fillna(0).astype('int64')
+    df[f'{flux}_sum'] = df[f'{flux}_sum'].fillna(0.0)
+    df = df.rename(columns={f'{flux}_n': 'flux_n', f'{flux}_sum': 'flux_sum',
+                            f'{flux}_min': 'min_flux', f'{flux}_max': 'max_flux'})
+    df['x'], df['y'] = world_coordinates(df['latitude'].to_numpy(), df['longitude'].to_numpy())
+    return df.reset_index(drop=True)
+
+
+def avg_flux(flux_sum, flux_n):
+    return (flux_sum / flux_n.where(flux_n > 0)).round(4)
+
+
+def section_records(df):
+    """Records of individually shown sections"""
+    out = df[SECTION_COLUMNS + ['n_measurements']].copy()
+    out['avg_flux'] = avg_flux(df['flux_sum'], df['flux_n'])
+    out['min_flux'] = df['min_flux'].round(4)
+    out['max_flux'] = df['max_flux'].round(4)
+    return frame_records(out)
+
+
+def cluster_records(groups):
+    """Records of clusters: centroid, extent (bbox), counts and flux statistics"""
+    out = pd.DataFrame({
+        'latitude': groups['latitude'].round(6),
+        'longitude': groups['longitude'].round(6),
+        'bbox': list(zip(groups['lon_min'].round(6), groups['lat_min'].round(6),
+                         groups['lon_max'].round(6), groups['lat_max'].round(6))),
+        'n_sections': groups['n_sections'],
+        'n_measurements': groups['n_measurements'],
+        'avg_flux': avg_flux(groups['flux_sum'], groups['flux_n']),
+        'min_flux': groups['min_flux'].round(4),
+        'max_flux': groups['max_flux'].round(4),
+    })
+    records = frame_records(out)
+    for record in records:
+        record['bbox'] = list(record['bbox'])
+    return records
+
+
+def build_tiles(sections, section_stats, min_zoom=MIN_ZOOM, detail_zoom=DETAIL_ZOOM):
+    """{(z, x, y): tile} for every non-empty tile from min_zoom to detail_zoom
+
+    A tile is {'z', 'x', 'y', 'clusters': [...], 'sections': [...]}.
+    """
+    df = section_frame(sections, section_stats)
+    tiles = {}
+    for z in range(min_zoom, detail_zoom + 1):
+        df['tile_x'] = np.floor(df['x'] * 2 ** z).astype('int64')
+        df['tile_y'] = np.floor(df['y'] * 2 ** z).astype('int64')
+        if z < detail_zoom:
+            df['cell_x'] = np.floor(df['x'] * 2 ** z * CLUSTER_GRID).astype('int64')
+            df['cell_y'] = np.floor(df['y'] * 2 ** z * CLUSTER_GRID).astype('int64')
+        else:
+            # Every section in its own cell
+            df['cell_x'] = df.index
+            df['cell_y'] = 0
+
+        cells = df.groupby(['tile_x', 'tile_y', 'cell_x', 'cell_y'], sort=True).agg(
+            n_sections=('section_id', 'size'),
+            n_measurements=('n_measurements', 'sum'),
+            flux_n=('flux_n', 'sum'),
+            flux_sum=('flux_sum', 'sum'),
+            min_flux=('min_flux', 'min'),
+            max_flux=('max_flux', 'max'),
+            latitude=('latitude', 'mean'),
+            longitude=('longitude', 'mean'),
+            lat_min=('latitude', 'min'),
+            lat_max=('latitude', 'max'),
+            lon_min=('longitude', 'min'),
+            lon_max=('longitude', 'max'),
+        ).reset_index()
+
+        single = df.groupby(['tile_x', 'tile_y', 'cell_x', 'cell_y'])['section_id'].transform('size') == 1
+        singles = df[single]
+        clusters = cells[cells['n_sections'] > 1]
+
+        # Records converted once per zoom level, then distributed to their tiles
+        for kind, rows, records in [('clusters', clusters, cluster_records(clusters)),
+                                    ('sections', singles, section_records(singles))]:
+            for x, y, record in zip(rows['tile_x'].tolist(), rows['tile_y'].tolist(), records):
+                tile = tiles.get((z, x, y))
+                if tile is None:
+                    tile = tiles[(z, x, y)] = {'z': z, 'x': x, 'y': y, 'clusters': [], 'sections': []}
+                tile[kind].append(record)
+    return dict(sorted(tiles.items()))
+
+
+def tile_path(z, x, y):
+    return f'tiles/{z}/{x}/{y}.json'
@@ -4,336 +4,451 @@ Validation script for Global Bedload Transport Database CSV files
 Validates data structure, required fields, data types, and hierarchical consistency
 """
 
+import argparse
+import numpy as np
 import pandas as pd
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import re
+
+from dataset import (METHOD_COLUMNS, csv_byte_ranges, read_csv_lenient, read_csv_lines, read_csv_range,
+                     read_table)
+from profiling import NULL_PROFILER, add_profile_arguments, profiler_from_args
+from rules import (FIRST_DATA_LINE, format_lines, RuleSet, Required, Range, Enum, Pattern, Ordering, Conditional,
+                   ForeignKey, Unique, MethodColumns)
+
+# Rows per chunk when streaming measurements.csv
+CHUNK_SIZE = 100000
+
+ALLOWED_METHODS = list(METHOD_COLUMNS)
+
+ALLOWED_SOURCES = ['hydrometric_station', 'adcp_measurement', 'rating_curve',
+                   'current_meter', 'model', 'estimated', 'other']
+
+EMAIL_PATTERN = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+
+# Required / optional columns of each file
+COLUMNS = {
+    'rivers': (['river_id', 'river_name', 'country'],
+               ['watershed_area_km2', 'notes']),
+    'sections': (['section_id', 'river_id', 'section_name', 'latitude', 'longitude'],
+                 ['elevation_m', 'bankfull_width_m', 'channel_slope', 'morphology_type', 'notes']),
+    'campaigns': (['campaign_id', 'section_id', 'campaign_date'],
+                  ['data_provider', 'contact_email', 'reference', 'notes']),
+    'measurements': (['measurement_id', 'campaign_id', 'measurement_method', 'bedload_rate_total_kg_s'],
+                     ['discharge_m3_s', 'discharge_source', 'discharge_station_code',
+                      'discharge_station_name', 'd50_mm', 'd84_mm', 'd10_mm',
+                      'water_depth_mean_m', 'flow_velocity_mean_m_s']
+                     + [col for cols in METHOD_COLUMNS.values() for col in cols]),
+}
+
+# Content rules of each file (parent key sets for foreign keys are passed as context)
+RULES = {
+    'rivers': RuleSet('rivers.csv', [
+        Required('river_id'),
+        Required('river_name'),
+        Required('country'),
+        Unique('river_id', 'Duplicate river_id'),
+        Pattern('country', r'^[A-Z]{3}$', 'Invalid country code (should be 3 uppercase letters)'),
+        Range('watershed_area_km2', 'Negative watershed_area_km2', minimum=0),
+    ]),
+    'sections': RuleSet('sections.csv', [
+        Required('section_id'),
+        Required('river_id'),
+        Required('section_name'),
+        Required('latitude'),
+        Required('longitude'),
+        Unique('section_id', 'Duplicate section_id'),
+        Range('latitude', 'Invalid latitude (must be -90 to 90)', minimum=-90, maximum=90),
+        Range('longitude', 'Invalid longitude (must be -180 to 180)', minimum=-180, maximum=180),
+        ForeignKey('river_id', 'rivers', 'river_id not found in rivers.csv'),
+        Range('bankfull_width_m', 'Negative bankfull_width_m', minimum=0),
+        Range('channel_slope', 'Invalid channel_slope (must be 0-1)', minimum=0, maximum=1),
+    ]),
+    'campaigns': RuleSet('campaigns.csv', [
+        Required('campaign_id'),
+        Required('section_id'),
+        # The loader parses dates, so empty and malformed dates are both missing here
+        Required('campaign_date', 'Missing or invalid campaign_date (use YYYY-MM-DD)'),
+        Unique('campaign_id', 'Duplicate campaign_id'),
+        ForeignKey('section_id', 'sections', 'section_id not found in sections.csv'),
+        Pattern('contact_email', EMAIL_PATTERN, 'Invalid email format', severity='warning'),
+    ]),
+    'measurements': RuleSet('measurements.csv', [
+        Required('measurement_id'),
+        Required('campaign_id'),
+        Required('measurement_method'),
+        Required('bedload_rate_total_kg_s'),
+        Unique('measurement_id', 'Duplicate measurement_id'),
+        Enum('measurement_method', ALLOWED_METHODS, 'Invalid measurement_method'),
+        Enum('discharge_source', ALLOWED_SOURCES, 'Invalid discharge_source'),
+        Conditional('discharge_station_code', 'discharge_source', 'hydrometric_station',
+                    'discharge_station_code filled but source != hydrometric_station', severity='warning'),
+        ForeignKey('campaign_id', 'campaigns', 'campaign_id not found in campaigns.csv'),
+        Range('bedload_rate_total_kg_s', 'Negative bedload_rate_total_kg_s', minimum=0),
+        Range('discharge_m3_s', 'Negative discharge_m3_s', minimum=0),
+        Ordering(['d10_mm', 'd50_mm', 'd84_mm'], 'Grain size not in order d10 < d50 < d84', severity='warning'),
+    ] + [MethodColumns(method, cols) for method, cols in METHOD_COLUMNS.items()]),
+}
+
+# Primary key of each table, used as the parent key set of its children
+PRIMARY_KEYS = {
+    'rivers': 'river_id',
+    'sections': 'section_id',
+    'campaigns': 'campaign_id',
+    'measurements': 'measurement_id',
+}
+
+
+# Parent table of each table, for foreign-key checks
+PARENTS = {
+    'rivers': None,
+    'sections': 'rivers',
+    'campaigns': 'sections',
+    'measurements': 'campaigns',
+}
+
+# Rule contexts (parent key sets) of the current worker process, set by init_worker()
+WORKER_CONTEXTS = {}
+
+
+def init_worker(contexts):
+    """Process pool initializer: receive the parent key sets once per worker"""
+    global WORKER_CONTEXTS
+    WORKER_CONTEXTS = contexts
+
+
+def read_checked(filepath, table):
+    """(typed frame, {column: CSV lines of values that are not numbers}) of a whole table
+
+    The strict (cached) parse is tried first. A value it rejects, such as text in a
+    numeric column, makes the table reload leniently: that cell becomes missing and is
+    reported, and the other rules still run on the table.
+    """
+    try:
+        return read_table(filepath), {}
+    except ValueError:
+        df, invalid = read_csv_lenient(filepath, table)
+        return df, {col: positions + FIRST_DATA_LINE for col, positions in invalid.items()}
+
+
+def read_range_checked(filepath, start, end, columns):
+    """Same as read_checked for the measurements between two byte offsets, with positions
+    relative to the range (first row = 0)"""
+    try:
+        return read_csv_range(filepath, start, end, columns, 'measurements'), {}
+    except ValueError:
+        return read_csv_range(filepath, start, end, columns, 'measurements', lenient=True)
+
+
+def merge_invalid(parts):
+    """{column: lines} of values that are not numbers, from the pieces of a table (in order)"""
+    merged = {}
+    for invalid in parts:
+        for col, lines in invalid.items():
+            merged.setdefault(col, []).append(lines)
+    return {col: np.concatenate(lines) for col, lines in merged.items()}
+
+
+def validate_table_job(table, filepath):
+    """Worker job: load a whole table and run its column checks and rules"""
+    validator = BedloadDatabaseValidator()
+    try:
+        df, invalid = read_checked(filepath, table)
+    except Exception as e:
+        validator.errors.append(f"Cannot read {filepath}: {e}")
+        return validator.errors, validator.warnings, None, 0
+    if not validator.check_columns(table, list(df.columns)):
+        return validator.errors, validator.warnings, None, 0
+    validator.add_number_errors(table, invalid)
+    check = RULES[table].check(df, WORKER_CONTEXTS[table])
+    return validator.errors, validator.warnings, check, len(df)
+
+
+def check_measurements_job(filepath, start, end, columns):
+    """Worker job: check the measurements between two byte offsets
+    
+    Line numbers are relative to the chunk (first row = 0) and are shifted once the
+    number of rows of the previous chunks is known.
+    """
+    df, invalid = read_range_checked(filepath, start, end, columns)
+    check = RULES['measurements'].check(df, WORKER_CONTEXTS['measurements'], first_line=0)
+    return check, df['measurement_method'].value_counts(), invalid
+
+
+def estimate_row_bytes(filepath, sample_bytes=1 << 16):
+    """Average size of a CSV row, from the beginning of the file"""
+    with open(filepath, 'rb') as f:
+        sample = f.read(sample_bytes)
+    return max(len(sample) // max(sample.count(b'\n'), 1), 1)
+
 
 class BedloadDatabaseValidator:
     """Validator for bedload transport database CSV files"""
     
-    def __init__(self):
+    def __init__(self, profiler=NULL_PROFILER):
         self.errors = []
         self.warnings = []
+        self.profiler = profiler
         
-    def validate_rivers(self, filepath):
-        """Validate rivers.csv"""
+    def print_header(self, table, filepath):
         print(f"\n{'='*60}")
-        print(f"Validating RIVERS: {filepath}")
+        print(f"Validating {table.upper()}: {filepath}")
         print(f"{'='*60}")
         
-        # Required columns
-        required_cols = ['river_id', 'river_name', 'country']
-        optional_cols = ['watershed_area_km2', 'notes']
+    def check_columns(self, table, columns):
+        """Check the columns of a CSV, returns False if required columns are missing"""
+        required_cols, optional_cols = COLUMNS[table]
         all_cols = required_cols + optional_cols
         
-        # Load CSV
-        try:
-            df = pd.read_csv(filepath)
-        except Exception as e:
-            self.errors.append(f"Cannot read {filepath}: {e}")
-            return None
-        
         # Check required columns
-        missing_cols = [col for col in required_cols if col not in df.columns]
+        missing_cols = [col for col in required_cols if col not in columns]
         if missing_cols:
-            self.errors.append(f"Missing required columns in rivers.csv: {missing_cols}")
-            return None
+            self.errors.append(f"Missing required columns in {table}.csv: {missing_cols}")
+            return False
         
         # Check for unexpected columns
-        unexpected_cols = [col for col in df.columns if col not in all_cols]
+        unexpected_cols = [col for col in columns if col not in all_cols]
         if unexpected_cols:
-            self.warnings.append(f"Unexpected columns in rivers.csv: {unexpected_cols}")
-        
-        # Check required fields are not empty
-        for col in required_cols:
-            empty_count = df[col].isna().sum()
-            if empty_count > 0:
-                self.errors.append(f"Column '{col}' has {empty_count} empty values (required field)")
-        
-        # Check country codes (should be 3 letters)
-        if 'country' in df.columns:
-            invalid_countries = df[~df['country'].str.match(r'^[A-Z]{3}$', na=False)]['country'].unique()
-            if len(invalid_countries) > 0:
-                self.errors.append(f"Invalid country codes (should be 3 letters): {invalid_countries.tolist()}")
-        
-        # Check for duplicate river_id
-        duplicates = df[df.duplicated(subset=['river_id'], keep=False)]
-        if len(duplicates) > 0:
-            self.errors.append(f"Duplicate river_id found: {duplicates['river_id'].tolist()}")
-        
-        # Check watershed_area_km2 is positive
-        if 'watershed_area_km2' in df.columns:
-            negative = df[df['watershed_area_km2'] < 0]
-            if len(negative) > 0:
-                self.errors.append(f"Negative watershed_area_km2 for: {negative['river_id'].tolist()}")
+            self.warnings.append(f"Unexpected columns in {table}.csv: {unexpected_cols}")
         
-        print(f"✓ Loaded {len(df)} rivers")
-        return df
-    
-    def validate_sections(self, filepath, rivers_df):
-        """Validate sections.csv"""
-        print(f"\n{'='*60}")
-        print(f"Validating SECTIONS: {filepath}")
-        print(f"{'='*60}")
+        return True
         
-        # Required columns
-        required_cols = ['section_id', 'river_id', 'section_name', 'latitude', 'longitude']
-        optional_cols = ['elevation_m', 'bankfull_width_m', 'channel_slope', 'morphology_type', 'notes']
-        all_cols = required_cols + optional_cols
+    def load_table(self, table, filepath):
+        """Load a CSV and check its columns, returns the DataFrame or None if unusable"""
+        self.print_header(table, filepath)
         
         # Load CSV
         try:
-            df = pd.read_csv(filepath)
+            with self.profiler.stage(f'load {table}') as stage:
+                df, invalid = read_checked(filepath, table)
+                stage.add(rows=len(df))
         except Exception as e:
             self.errors.append(f"Cannot read {filepath}: {e}")
             return None
         
-        # Check required columns
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if missing_cols:
-            self.errors.append(f"Missing required columns in sections.csv: {missing_cols}")
+        if not self.check_columns(table, list(df.columns)):
             return None
         
-        # Check for unexpected columns
-        unexpected_cols = [col for col in df.columns if col not in all_cols]
-        if unexpected_cols:
-            self.warnings.append(f"Unexpected columns in sections.csv: {unexpected_cols}")
-        
-        # Check required fields are not empty
-        for col in required_cols:
-            empty_count = df[col].isna().sum()
-            if empty_count > 0:
-                self.errors.append(f"Column '{col}' has {empty_count} empty values (required field)")
-        
-        # Check for duplicate section_id
-        duplicates = df[df.duplicated(subset=['section_id'], keep=False)]
-        if len(duplicates) > 0:
-            self.errors.append(f"Duplicate section_id found: {duplicates['section_id'].tolist()}")
-        
-        # Check latitude range (-90 to 90)
-        if 'latitude' in df.columns:
-            invalid_lat = df[(df['latitude'] < -90) | (df['latitude'] > 90)]
-            if len(invalid_lat) > 0:
-                self.errors.append(f"Invalid latitude (must be -90 to 90): {invalid_lat['section_id'].tolist()}")
-        
-        # Check longitude range (-180 to 180)
-        if 'longitude' in df.columns:
-            invalid_lon = df[(df['longitude'] < -180) | (df['longitude'] > 180)]
-            if len(invalid_lon) > 0:
-                self.errors.append(f"Invalid longitude (must be -180 to 180): {invalid_lon['section_id'].tolist()}")
-        
-        # Check river_id exists in rivers.csv
-        if rivers_df is not None:
-            missing_rivers = df[~df['river_id'].isin(rivers_df['river_id'])]
-            if len(missing_rivers) > 0:
-                self.errors.append(f"river_id not found in rivers.csv: {missing_rivers['section_id'].tolist()}")
-        
-        # Check bankfull_width_m is positive
-        if 'bankfull_width_m' in df.columns:
-            negative = df[df['bankfull_width_m'] < 0]
-            if len(negative) > 0:
-                self.errors.append(f"Negative bankfull_width_m for: {negative['section_id'].tolist()}")
-        
-        # Check channel_slope is between 0 and 1
-        if 'channel_slope' in df.columns:
-            invalid_slope = df[(df['channel_slope'] < 0) | (df['channel_slope'] > 1)]
-            if len(invalid_slope) > 0:
-                self.errors.append(f"Invalid channel_slope (must be 0-1): {invalid_slope['section_id'].tolist()}")
-        
-        print(f"✓ Loaded {len(df)} sections")
+        self.add_number_errors(table, invalid)
         return df
     
-    def validate_campaigns(self, filepath, sections_df):
-        """Validate campaigns.csv"""
-        print(f"\n{'='*60}")
-        print(f"Validating CAMPAIGNS: {filepath}")
-        print(f"{'='*60}")
-        
-        # Required columns
-        required_cols = ['campaign_id', 'section_id', 'campaign_date']
-        optional_cols = ['data_provider', 'contact_email', 'reference', 'notes']
-        all_cols = required_cols + optional_cols
+    def add_number_errors(self, table, invalid):
+        """Report the values of numeric columns that are not numbers ({column: CSV lines})"""
+        for col, lines in invalid.items():
+            self.errors.append(f"{table}.csv: Column '{col}' has values that are not numbers: "
+                               f"{format_lines(np.sort(lines))}")
+    
+    def parent_context(self, parent_df, parent):
+        """Rule context holding the key set of a parent table (if it could be loaded)"""
+        if parent_df is None:
+            return {}
+        return {parent: parent_df[PRIMARY_KEYS[parent]].dropna().unique()}
+    
+    def add_report(self, table, checks, filepath=None, df=None):
+        """Merge the rule checks of a table (one per piece, in order) into errors and warnings
+        
+        Candidate duplicates are confirmed on the rows of df when the table is loaded,
+        otherwise on their lines re-read from filepath.
+        """
+        def read_rows(lines, columns):
+            if df is not None:
+                return df.iloc[lines - FIRST_DATA_LINE][columns].reset_index(drop=True)
+            return read_csv_lines(filepath, lines, columns)
+        
+        errors, warnings = RULES[table].report(checks, read_rows)
+        self.errors.extend(errors)
+        self.warnings.extend(warnings)
+        
+    def check_rules(self, table, df, parent_df=None, parent=None):
+        """Run the compiled rule set of a table and collect its errors and warnings"""
+        context = self.parent_context(parent_df, parent)
+        with self.profiler.stage(f'rules {table}') as stage:
+            self.add_report(table, [RULES[table].check(df, context, profiler=self.profiler)], df=df)
+            stage.add(rows=len(df))
         
-        # Load CSV
-        try:
-            df = pd.read_csv(filepath)
-        except Exception as e:
-            self.errors.append(f"Cannot read {filepath}: {e}")
+    def validate_rivers(self, filepath):
+        """Validate rivers.csv"""
+        df = self.load_table('rivers', filepath)
+        if df is None:
             return None
         
-        # Check required columns
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if missing_cols:
-            self.errors.append(f"Missing required columns in campaigns.csv: {missing_cols}")
-            return None
+        self.check_rules('rivers', df)
         
-        # Check for unexpected columns
-        unexpected_cols = [col for col in df.columns if col not in all_cols]
-        if unexpected_cols:
-            self.warnings.append(f"Unexpected columns in campaigns.csv: {unexpected_cols}")
+        print(f"✓ Loaded {len(df)} rivers")
+        return df
+    
+    def validate_sections(self, filepath, rivers_df):
+        """Validate sections.csv"""
+        df = self.load_table('sections', filepath)
+        if df is None:
+            return None
         
-        # Check required fields are not empty
-        for col in required_cols:
-            empty_count = df[col].isna().sum()
-            if empty_count > 0:
-                self.errors.append(f"Column '{col}' has {empty_count} empty values (required field)")
+        self.check_rules('sections', df, rivers_df, 'rivers')
         
-        # Check for duplicate campaign_id
-        duplicates = df[df.duplicated(subset=['campaign_id'], keep=False)]
-        if len(duplicates) > 0:
-            self.errors.append(f"Duplicate campaign_id found: {duplicates['campaign_id'].tolist()}")
+        print(f"✓ Loaded {len(df)} sections")
+        return df
+    
+    def validate_campaigns(self, filepath, sections_df):
+        """Validate campaigns.csv"""
+        df = self.load_table('campaigns', filepath)
+        if df is None:
+            return None
         
-        # Check date format (YYYY-MM-DD)
-        if 'campaign_date' in df.columns:
-            try:
-                pd.to_datetime(df['campaign_date'], format='%Y-%m-%d', errors='coerce')
-                invalid_dates = df[pd.to_datetime(df['campaign_date'], format='%Y-%m-%d', errors='coerce').isna()]
-                if len(invalid_dates) > 0:
-                    self.errors.append(f"Invalid date format (use YYYY-MM-DD): {invalid_dates['campaign_id'].tolist()}")
-            except:
-                self.errors.append(f"Cannot parse campaign_date")
-        
-        # Check section_id exists in sections.csv
-        if sections_df is not None:
-            missing_sections = df[~df['section_id'].isin(sections_df['section_id'])]
-            if len(missing_sections) > 0:
-                self.errors.append(f"section_id not found in sections.csv: {missing_sections['campaign_id'].tolist()}")
-        
-        # Check email format (if provided)
-        if 'contact_email' in df.columns:
-            email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-            invalid_emails = df[df['contact_email'].notna() & ~df['contact_email'].str.match(email_pattern, na=False)]
-            if len(invalid_emails) > 0:
-                self.warnings.append(f"Invalid email format: {invalid_emails['campaign_id'].tolist()}")
+        self.check_rules('campaigns', df, sections_df, 'sections')
         
         print(f"✓ Loaded {len(df)} campaigns")
         return df
     
     def validate_measurements(self, filepath, campaigns_df):
         """Validate measurements.csv"""
-        print(f"\n{'='*60}")
-        print(f"Validating MEASUREMENTS: {filepath}")
-        print(f"{'='*60}")
-        
-        # Required columns
-        required_cols = ['measurement_id', 'campaign_id', 'measurement_method', 'bedload_rate_total_kg_s']
-        
-        # Optional general columns
-        optional_general = ['discharge_m3_s', 'discharge_source', 'discharge_station_code', 
-                           'discharge_station_name', 'd50_mm', 'd84_mm', 'd10_mm', 
-                           'water_depth_mean_m', 'flow_velocity_mean_m_s']
-        
-        # Method-specific columns
-        passive_acoustic_cols = ['acoustic_hydrophone_type', 'acoustic_recorder_type', 
-                                'acoustic_sensitivity_db', 'acoustic_calibration', 
-                                'acoustic_calibration_a', 'acoustic_calibration_b']
+        df = self.load_table('measurements', filepath)
+        if df is None:
+            return None
         
-        active_acoustic_cols = ['adcp_type', 'adcp_equation_type', 'adcp_measurement_duration_s']
+        self.check_rules('measurements', df, campaigns_df, 'campaigns')
         
-        sampler_cols = ['sampler_type']
+        print(f"✓ Loaded {len(df)} measurements")
+        self.print_method_counts(df['measurement_method'].value_counts())
         
-        dune_cols = ['dune_survey_method', 'dune_echosounder_type', 
-                     'dune_equation_type', 'dune_interval_hours']
+        return df
+    
+    def validate_measurements_streaming(self, filepath, campaigns_df, chunksize=CHUNK_SIZE):
+        """Validate measurements.csv chunk by chunk, without loading the whole file
         
-        all_cols = (required_cols + optional_general + passive_acoustic_cols + 
-                   active_acoustic_cols + sampler_cols + dune_cols)
+        Row rules run on each chunk; uniqueness is checked from the 64-bit hashes of the
+        ids collected across chunks (only the lines whose hashes collide are re-read to
+        compare the ids themselves) and foreign keys against the campaign key set, so
+        the messages are the same as validate_measurements().
+        """
+        self.print_header('measurements', filepath)
         
-        # Load CSV
         try:
-            df = pd.read_csv(filepath)
+            columns = list(pd.read_csv(filepath, nrows=0).columns)
         except Exception as e:
             self.errors.append(f"Cannot read {filepath}: {e}")
             return None
+        if not self.check_columns('measurements', columns):
+            return None
         
-        # Check required columns
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if missing_cols:
-            self.errors.append(f"Missing required columns in measurements.csv: {missing_cols}")
+        context = self.parent_context(campaigns_df, 'campaigns')
+        checks = []
+        invalid = []
+        counts = pd.Series(dtype='int64')
+        first_line = FIRST_DATA_LINE
+        
+        try:
+            # Chunk reads are the difference between 'stream measurements' and its rules.
+            # Chunks are byte ranges of about chunksize rows, so that a chunk holding a value
+            # the strict parse rejects can be re-read leniently on its own
+            with self.profiler.stage('stream measurements') as stream_stage:
+                target_bytes = chunksize * estimate_row_bytes(filepath)
+                for start, end in csv_byte_ranges(filepath, target_bytes):
+                    chunk, chunk_invalid = read_range_checked(filepath, start, end, columns)
+                    with self.profiler.stage('rules measurements') as stage:
+                        checks.append(RULES['measurements'].check(chunk, context, first_line, self.profiler))
+                        stage.add(rows=len(chunk))
+                    invalid.append({col: positions + first_line for col, positions in chunk_invalid.items()})
+                    counts = counts.add(chunk['measurement_method'].value_counts(), fill_value=0)
+                    first_line += len(chunk)
+                stream_stage.add(rows=first_line - FIRST_DATA_LINE)
+        except Exception as e:
+            self.errors.append(f"Cannot read {filepath} (near line {first_line}): {e}")
             return None
         
-        # Check for unexpected columns
-        unexpected_cols = [col for col in df.columns if col not in all_cols]
-        if unexpected_cols:
-            self.warnings.append(f"Unexpected columns in measurements.csv: {unexpected_cols}")
-        
-        # Check required fields are not empty
-        for col in required_cols:
-            empty_count = df[col].isna().sum()
-            if empty_count > 0:
-                self.errors.append(f"Column '{col}' has {empty_count} empty values (required field)")
-        
-        # Check for duplicate measurement_id
-        duplicates = df[df.duplicated(subset=['measurement_id'], keep=False)]
-        if len(duplicates) > 0:
-            self.errors.append(f"Duplicate measurement_id found: {duplicates['measurement_id'].tolist()}")
-        
-        # Check measurement_method values
-        allowed_methods = ['passive_acoustic', 'active_acoustic', 'physical_sampler', 'dune_tracking']
-        if 'measurement_method' in df.columns:
-            invalid_methods = df[~df['measurement_method'].isin(allowed_methods)]
-            if len(invalid_methods) > 0:
-                self.errors.append(f"Invalid measurement_method (allowed: {allowed_methods}): {invalid_methods['measurement_id'].tolist()}")
-        
-        # Check discharge_source values
-        allowed_sources = ['hydrometric_station', 'adcp_measurement', 'rating_curve', 
-                          'current_meter', 'model', 'estimated', 'other']
-        if 'discharge_source' in df.columns:
-            invalid_sources = df[df['discharge_source'].notna() & ~df['discharge_source'].isin(allowed_sources)]
-            if len(invalid_sources) > 0:
-                self.errors.append(f"Invalid discharge_source (allowed: {allowed_sources}): {invalid_sources['measurement_id'].tolist()}")
-        
-        # Check that discharge_station_code/name are filled only when source=hydrometric_station
-        if 'discharge_source' in df.columns and 'discharge_station_code' in df.columns:
-            has_station_without_source = df[(df['discharge_station_code'].notna()) & 
-                                           (df['discharge_source'] != 'hydrometric_station')]
-            if len(has_station_without_source) > 0:
-                self.warnings.append(f"discharge_station_code filled but source != hydrometric_station: {has_station_without_source['measurement_id'].tolist()}")
-        
-        # Check campaign_id exists in campaigns.csv
-        if campaigns_df is not None:
-            missing_campaigns = df[~df['campaign_id'].isin(campaigns_df['campaign_id'])]
-            if len(missing_campaigns) > 0:
-                self.errors.append(f"campaign_id not found in campaigns.csv: {missing_campaigns['measurement_id'].tolist()}")
-        
-        # Check bedload_rate is positive
-        negative_flux = df[df['bedload_rate_total_kg_s'] < 0]
-        if len(negative_flux) > 0:
-            self.errors.append(f"Negative bedload_rate_total_kg_s: {negative_flux['measurement_id'].tolist()}")
-        
-        # Check discharge is positive
-        if 'discharge_m3_s' in df.columns:
-            negative_q = df[df['discharge_m3_s'] < 0]
-            if len(negative_q) > 0:
-                self.errors.append(f"Negative discharge_m3_s: {negative_q['measurement_id'].tolist()}")
-        
-        # Check grain sizes are positive and logical (d10 < d50 < d84)
-        if all(col in df.columns for col in ['d10_mm', 'd50_mm', 'd84_mm']):
-            invalid_grain = df[(df['d10_mm'] >= df['d50_mm']) | (df['d50_mm'] >= df['d84_mm'])]
-            if len(invalid_grain) > 0:
-                self.warnings.append(f"Grain size not in order d10 < d50 < d84: {invalid_grain['measurement_id'].tolist()}")
-        
-        # Method-specific validation
-        for method, method_cols in [
-            ('passive_acoustic', passive_acoustic_cols),
-            ('active_acoustic', active_acoustic_cols),
-            ('physical_sampler', sampler_cols),
-            ('dune_tracking', dune_cols)
-        ]:
-            method_rows = df[df['measurement_method'] == method]
-            if len(method_rows) > 0:
-                # Check that at least some method-specific columns are filled
-                filled_cols = sum([method_rows[col].notna().any() for col in method_cols if col in df.columns])
-                if filled_cols == 0:
-                    self.warnings.append(f"Method '{method}' used but no {method}-specific columns filled")
+        self.add_number_errors('measurements', merge_invalid(invalid))
+        with self.profiler.stage('report measurements'):
+            self.add_report('measurements', checks, filepath)
         
-        print(f"✓ Loaded {len(df)} measurements")
-        print(f"  - passive_acoustic: {len(df[df['measurement_method'] == 'passive_acoustic'])}")
-        print(f"  - active_acoustic: {len(df[df['measurement_method'] == 'active_acoustic'])}")
-        print(f"  - physical_sampler: {len(df[df['measurement_method'] == 'physical_sampler'])}")
-        print(f"  - dune_tracking: {len(df[df['measurement_method'] == 'dune_tracking'])}")
+        print(f"✓ Streamed {first_line - FIRST_DATA_LINE} measurements in {len(checks)} chunks")
+        self.print_method_counts(counts)
         
-        return df
+        return None
+    
+    def read_parent_keys(self, table, filepath):
+        """Key set of a parent table, or None when the table is unusable (as in the serial mode)"""
+        try:
+            df, _ = read_checked(filepath, table)
+        except Exception:
+            return None
+        if any(col not in df.columns for col in COLUMNS[table][0]):
+            return None
+        return df[PRIMARY_KEYS[table]].dropna().unique()
+    
+    def validate_parallel(self, files, jobs, chunksize=CHUNK_SIZE):
+        """Validate all tables in a process pool
+        
+        The parent key sets are extracted up front, then each table and each chunk of
+        measurements.csv is checked in a worker. Results are merged in the same order
+        as the serial mode (tables in hierarchical order, chunks in file order).
+        """
+        with self.profiler.stage('parent keys'):
+            keys = {table: self.read_parent_keys(table, files[table]) for table in ['rivers', 'sections', 'campaigns']}
+        contexts = {}
+        for table, parent in PARENTS.items():
+            contexts[table] = {} if parent is None or keys[parent] is None else {parent: keys[parent]}
+        
+        measurements_file = files['measurements']
+        try:
+            columns = list(pd.read_csv(measurements_file, nrows=0).columns)
+        except Exception as e:
+            columns = None
+            header_error = f"Cannot read {measurements_file}: {e}"
+        
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(contexts,)) as pool:
+            table_futures = {table: pool.submit(validate_table_job, table, files[table])
+                             for table in ['rivers', 'sections', 'campaigns']}
+            
+            chunk_futures = []
+            column_validator = BedloadDatabaseValidator()
+            if columns is not None and column_validator.check_columns('measurements', columns):
+                target_bytes = chunksize * estimate_row_bytes(measurements_file)
+                chunk_futures = [pool.submit(check_measurements_job, measurements_file, start, end, columns)
+                                 for start, end in csv_byte_ranges(measurements_file, target_bytes)]
+            
+            # Merge in a deterministic order
+            for table, future in table_futures.items():
+                errors, warnings, check, n_rows = future.result()
+                self.print_header(table, files[table])
+                self.errors.extend(errors)
+                self.warnings.extend(warnings)
+                if check is not None:
+                    self.add_report(table, [check], files[table])
+                    print(f"✓ Loaded {n_rows} {table}")
+            
+            self.print_header('measurements', measurements_file)
+            if columns is None:
+                self.errors.append(header_error)
+                return
+            self.errors.extend(column_validator.errors)
+            self.warnings.extend(column_validator.warnings)
+            if not chunk_futures:
+                return
+            
+            checks = []
+            invalid = []
+            counts = pd.Series(dtype='int64')
+            first_line = FIRST_DATA_LINE
+            try:
+                for future in chunk_futures:
+                    check, chunk_counts, chunk_invalid = future.result()
+                    checks.append(RULES['measurements'].shift(check, first_line))
+                    invalid.append({col: positions + first_line for col, positions in chunk_invalid.items()})
+                    counts = counts.add(chunk_counts, fill_value=0)
+                    first_line += check.n_rows
+            except Exception as e:
+                self.errors.append(f"Cannot read {measurements_file} (near line {first_line}): {e}")
+                return
+            
+            self.add_number_errors('measurements', merge_invalid(invalid))
+            self.add_report('measurements', checks, measurements_file)
+            print(f"✓ Loaded {first_line - FIRST_DATA_LINE} measurements in {len(checks)} chunks ({jobs} jobs)")
+            self.print_method_counts(counts)
+    
+    def print_method_counts(self, counts):
+        """Print the number of measurements per allowed method"""
+        for method in ALLOWED_METHODS:
+            print(f"  - {method}: {int(counts.get(method, 0))}")
     
     def print_summary(self):
         """Print validation summary"""
@@ -368,6 +483,17 @@ class BedloadDatabaseValidator:
 
 def main():
     """Main validation function"""
+    parser = argparse.ArgumentParser(description='Validate the database CSV files')
+    parser.add_argument('--stream', action='store_true',
+                        help='validate measurements.csv chunk by chunk (bounded memory, for very large files)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='validate tables and measurement chunks in N worker processes')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'rows per chunk in --stream and --jobs modes (default: {CHUNK_SIZE})')
+    add_profile_arguments(parser, 'validate_profile.json')
+    args = parser.parse_args()
+    profiler, trace_path = profiler_from_args(args, 'validate', 'validate_profile.json')
+    
     # File paths
     data_dir = Path('data')
     
@@ -385,16 +511,27 @@ def main():
             sys.exit(1)
     
     # Create validator
-    validator = BedloadDatabaseValidator()
+    validator = BedloadDatabaseValidator(profiler)
     
-    # Validate in hierarchical order
-    rivers_df = validator.validate_rivers(rivers_file)
-    sections_df = validator.validate_sections(sections_file, rivers_df)
-    campaigns_df = validator.validate_campaigns(campaigns_file, sections_df)
-    measurements_df = validator.validate_measurements(measurements_file, campaigns_df)
+    if args.jobs > 1:
+        files = {'rivers': rivers_file, 'sections': sections_file,
+                 'campaigns': campaigns_file, 'measurements': measurements_file}
+        # Rules run in the workers: only the whole parallel run is timed
+        with profiler.stage(f'validate ({args.jobs} jobs)'):
+            validator.validate_parallel(files, args.jobs, args.chunk_size)
+    else:
+        # Validate in hierarchical order
+        rivers_df = validator.validate_rivers(rivers_file)
+        sections_df = validator.validate_sections(sections_file, rivers_df)
+        campaigns_df = validator.validate_campaigns(campaigns_file, sections_df)
+        if args.stream:
+            validator.validate_measurements_streaming(measurements_file, campaigns_df, args.chunk_size)
+        else:
+            validator.validate_measurements(measurements_file, campaigns_df)
     
     # Print summary
     success = validator.print_summary()
+    profiler.finish(trace_path)
     
     # Exit with appropriate code
     sys.exit(0 if success else 1)